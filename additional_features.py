@@ -2,117 +2,130 @@
 
 import os
 import sys
-import json
 import time
 import uuid
 import shutil
+import tempfile
 import subprocess
 from datetime import datetime, timedelta
 import ffmpeg
-import yt_dlp
-from threading import Thread
+from threading import Lock, Semaphore
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from download_engine import EngineSaturated, HostLimiter
+from download_scheduler import DownloadScheduler
+from metadata_cache import normalize_video_id
+from batch_operations import validate_chain, split_chain, chain_output_path, build_chain_stream
+from keyframe_index import KeyframeIndex
+from compression_planner import normalize_codec
+from compression_profiles import available_encoders
+
+# Codecs smart trim can re-encode so the cut ends match the copied middle.
+# The encoder is told to repeat its parameter sets at every keyframe and the
+# copied part gets the source's in-band, so each part decodes with its own.
+SMART_TRIM_ENCODERS = {
+    'h264': {'encoder': 'libx264', 'params': 'x264-params', 'bsf': 'h264_mp4toannexb'},
+    'hevc': {'encoder': 'libx265', 'params': 'x265-params', 'bsf': 'hevc_mp4toannexb'}
+}
+
+# Quality of the re-encoded frames at each cut, close to the source
+SMART_TRIM_CRF = 18
+
+# Playlist entries checked against the download history per query
+PLAYLIST_HISTORY_SLICE = 50
 
 class AdditionalFeatures:
     def __init__(self, app_config, downloader):
         self.app_config = app_config
         self.downloader = downloader
-        self.scheduled_downloads = {}
         self.batch_downloads = {}
+        self.batch_processes = {}
+        self._batch_lock = Lock()
+        
+        # Batch items run side by side, with a cap per host shared by all batches
+        self.batch_parallelism = app_config.get('BATCH_PARALLELISM', 3)
+        # Clients may ask for more, up to MAX_BATCH_PARALLELISM (the download workers by default)
+        self.max_batch_parallelism = (app_config.get('MAX_BATCH_PARALLELISM')
+                                      or downloader.engine.pools['download'].workers)
+        self.host_limiter = HostLimiter(app_config.get('BATCH_PER_HOST_LIMIT', 2))
+        
+        # A batch item may take BATCH_ITEM_TIMEOUT seconds plus the time its
+        # size needs at BATCH_ITEM_MIN_RATE bytes per second
+        self.batch_item_timeout = app_config.get('BATCH_ITEM_TIMEOUT', 600)
+        self.batch_item_min_rate = app_config.get('BATCH_ITEM_MIN_RATE', 256 * 1024)
         
         # Create necessary directories
         self.temp_dir = os.path.join(os.path.dirname(app_config['DOWNLOAD_HISTORY_FILE']), 'temp')
         os.makedirs(self.temp_dir, exist_ok=True)
         
-        # Load scheduled downloads
+        # Keyframe positions per file, used to find the cut points of a smart trim
+        self.keyframes = KeyframeIndex()
+        
+        # Scheduled downloads start when due, the old scheduled.json is
+        # imported on first start
         self.scheduled_file = os.path.join(os.path.dirname(app_config['DOWNLOAD_HISTORY_FILE']), 'scheduled.json')
-        self.load_scheduled_downloads()
+        self.scheduler = DownloadScheduler(
+            app_config.get('SCHEDULE_DB', os.path.splitext(self.scheduled_file)[0] + '.db'),
+            self._start_scheduled_download,
+            legacy_json_path=self.scheduled_file,
+            off_peak_window=app_config.get('OFF_PEAK_WINDOW', '01:00-06:00'),
+            sync_interval=app_config.get('SCHEDULE_SYNC_INTERVAL', 30)
+        )
         
-        # Start scheduler thread
-        self.scheduler_running = True
-        self.scheduler_thread = Thread(target=self._scheduler_loop)
-        self.scheduler_thread.daemon = True
-        self.scheduler_thread.start()
+        # Batches interrupted by a restart continue from their cursor, after
+        # the downloader has restored their downloads
+        if downloader.journal:
+            downloader.journal.register('batch', self._restore_batch)
+            downloader.resume_journaled_jobs()
     
-    def load_scheduled_downloads(self):
-        """Load scheduled downloads from file"""
-        if os.path.exists(self.scheduled_file):
-            try:
-                with open(self.scheduled_file, 'r') as f:
-                    self.scheduled_downloads = json.load(f)
-            except:
-                self.scheduled_downloads = {}
-    
-    def save_scheduled_downloads(self):
-        """Save scheduled downloads to file"""
-        with open(self.scheduled_file, 'w') as f:
-            json.dump(self.scheduled_downloads, f)
-    
-    def _scheduler_loop(self):
-        """Background thread to check and process scheduled downloads"""
-        while self.scheduler_running:
-            now = datetime.now()
-            to_remove = []
-            
-            for download_id, download in self.scheduled_downloads.items():
-                scheduled_time = datetime.fromisoformat(download['scheduled_time'])
-                if now >= scheduled_time:
-                    # Time to start this download
-                    print(f"Starting scheduled download: {download['url']}")
-                    
-                    # Start the download
-                    self.downloader.download_video(
-                        download['url'],
-                        download['format_id'],
-                        download['resolution'],
-                        download['compression'],
-                        download['download_dir'],
-                        download.get('cookies_file')
-                    )
-                    
-                    # Mark for removal
-                    to_remove.append(download_id)
-            
-            # Remove completed scheduled downloads
-            for download_id in to_remove:
-                del self.scheduled_downloads[download_id]
-            
-            # Save changes if any
-            if to_remove:
-                self.save_scheduled_downloads()
-            
-            # Sleep for a bit
-            time.sleep(60)  # Check every minute
+    def _start_scheduled_download(self, entry):
+        """Start a scheduled download, returns False when the server was too busy"""
+        result = self.downloader.download_video(
+            entry['url'],
+            entry['format_id'],
+            entry['resolution'],
+            entry['compression'],
+            entry['download_dir'],
+            entry.get('cookies_file'),
+            priority='scheduled',
+            owner=entry.get('owner')
+        )
+        return result['success']
     
     def schedule_download(self, url, format_id, resolution, compression, download_dir, 
-                         scheduled_time, cookies_file=None):
-        """Schedule a download for later"""
-        download_id = str(uuid.uuid4())
+                         scheduled_time=None, cookies_file=None, recurrence=None, window=None, owner=None):
+        """Schedule a download for later
         
-        # Store the scheduled download
-        self.scheduled_downloads[download_id] = {
-            'url': url,
-            'format_id': format_id,
-            'resolution': resolution,
-            'compression': compression,
-            'download_dir': download_dir,
-            'scheduled_time': scheduled_time.isoformat(),
-            'cookies_file': cookies_file
-        }
-        
-        # Save to file
-        self.save_scheduled_downloads()
+        recurrence is a cron expression (e.g. '0 3 * * *' or '@daily') that
+        repeats the download, window ('HH:MM-HH:MM' or 'off-peak') only
+        lets it start inside that time of day.
+        """
+        try:
+            entry = self.scheduler.add({
+                'url': url,
+                'format_id': format_id,
+                'resolution': resolution,
+                'compression': compression,
+                'download_dir': download_dir,
+                'cookies_file': cookies_file,
+                'owner': owner
+            }, scheduled_time, recurrence, window)
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
         
         return {
             'success': True,
-            'download_id': download_id,
-            'message': f'Download scheduled for {scheduled_time.strftime("%Y-%m-%d %H:%M:%S")}'
+            'download_id': entry['id'],
+            'next_run': entry['next_run'],
+            'message': f'Download scheduled for {entry["next_run"].replace("T", " ")}'
         }
     
     def cancel_scheduled_download(self, download_id):
         """Cancel a scheduled download"""
-        if download_id in self.scheduled_downloads:
-            del self.scheduled_downloads[download_id]
-            self.save_scheduled_downloads()
+        if self.scheduler.cancel(download_id):
             return {
                 'success': True,
                 'message': 'Scheduled download cancelled'
@@ -123,47 +136,226 @@ class AdditionalFeatures:
                 'message': 'Scheduled download not found'
             }
     
-    def get_scheduled_downloads(self):
-        """Get list of scheduled downloads"""
+    def get_scheduled_downloads(self, limit=None):
+        """Get list of scheduled downloads, the soonest first"""
         return {
             'success': True,
-            'scheduled_downloads': self.scheduled_downloads
+            'scheduled_downloads': self.scheduler.entries(limit),
+            'scheduler': self.scheduler.get_stats()
         }
     
-    def batch_download(self, urls, format_id, resolution, compression, download_dir, cookies_file=None):
-        """Download multiple videos in batch"""
-        batch_id = str(uuid.uuid4())
+    def batch_download(self, urls, format_id, resolution, compression, download_dir, cookies_file=None,
+                       parallelism=None, owner=None):
+        """Download multiple videos in batch, up to parallelism at a time"""
+        try:
+            parallelism = self._bounded_parallelism(parallelism, self.batch_parallelism, self.max_batch_parallelism)
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        return self._start_batch(
+            str(uuid.uuid4()), enumerate(urls, 1), format_id, resolution, compression, download_dir, cookies_file,
+            parallelism, f'Batch download of {len(urls)} videos started', {'urls': list(urls)}, total=len(urls),
+            owner=owner
+        )
+    
+    def _start_batch(self, batch_id, entries, format_id, resolution, compression, download_dir, cookies_file,
+                     parallelism, message, source, **fields):
+        """Track a new batch and queue its coordinator, entries yields (position, url) pairs
         
+        source is what the entries were made from (the URLs or the playlist
+        selection), journaled so the batch can be restored.
+        """
         # Initialize batch tracking
-        self.batch_downloads[batch_id] = {
+        self.batch_downloads[batch_id] = dict({
             'status': 'starting',
-            'total': len(urls),
+            'total': 0,
             'completed': 0,
             'failed': 0,
             'in_progress': 0,
+            'cursor': 1,
             'downloads': {}
-        }
+        }, **fields)
+        self._journal_batch(batch_id, spec=dict(source, **{
+            'format_id': format_id,
+            'resolution': resolution,
+            'compression': compression,
+            'download_dir': download_dir,
+            'cookies_file': cookies_file,
+            'parallelism': parallelism,
+            'owner': fields.get('owner')
+        }))
         
-        # Start batch download in a separate thread
-        thread = Thread(
-            target=self._batch_download_thread,
-            args=(batch_id, urls, format_id, resolution, compression, download_dir, cookies_file)
-        )
-        thread.daemon = True
-        thread.start()
+        # Run the batch coordinator on the download engine's batch pool
+        try:
+            self.downloader.engine.submit(
+                'batch',
+                self._batch_download_thread,
+                batch_id, entries, format_id, resolution, compression, download_dir, cookies_file, parallelism,
+                priority='batch',
+                job_id=batch_id,
+                owner=fields.get('owner')
+            )
+        except EngineSaturated as e:
+            del self.batch_downloads[batch_id]
+            self._journal_batch(batch_id, finished=True)
+            return {
+                'success': False,
+                'message': f'Server is busy, please try again shortly ({str(e)})'
+            }
         
         return {
             'success': True,
             'batch_id': batch_id,
-            'message': f'Batch download of {len(urls)} videos started'
+            'message': message
         }
     
-    def _batch_download_thread(self, batch_id, urls, format_id, resolution, compression, download_dir, cookies_file):
-        """Thread function to handle batch downloads"""
-        # Process each URL
-        for url in urls:
+    def _bounded_parallelism(self, parallelism, default, ceiling):
+        """Get how many items a batch runs at once, default when not given and never more than ceiling
+        
+        Raises ValueError when parallelism is not a positive whole number.
+        """
+        if parallelism is None:
+            parallelism = default
+        if isinstance(parallelism, bool) or (isinstance(parallelism, float) and not parallelism.is_integer()):
+            raise ValueError('parallelism must be a positive whole number')
+        try:
+            workers = int(parallelism)
+        except (TypeError, ValueError):
+            raise ValueError('parallelism must be a positive whole number')
+        if workers < 1:
+            raise ValueError('parallelism must be a positive whole number')
+        return min(workers, max(1, int(ceiling)))
+    
+    def _batch_download_thread(self, batch_id, entries, format_id, resolution, compression, download_dir,
+                               cookies_file, parallelism=None):
+        """Worker function to handle batch downloads, fanning the entries out over a thread pool
+        
+        Entries are only pulled once a worker is free, so a playlist is
+        expanded as fast as it is downloaded. The batch's cursor is the
+        first position that has not finished yet, where a resumed batch
+        can start again; positions after it that did finish are kept in
+        'finished_positions' and skipped on resume.
+        """
+        batch = self.batch_downloads[batch_id]
+        batch['status'] = 'processing'
+        self._publish_batch(batch_id)
+        
+        workers = self._bounded_parallelism(parallelism, self.batch_parallelism, self.max_batch_parallelism)
+        free_workers = Semaphore(workers)
+        pending = set()
+        finished = set(batch.get('finished_positions', ()))
+        # Highest position pulled so far, everything up to it is pending,
+        # finished or not selected
+        pulled = [batch['cursor'] - 1]
+        
+        def advance():
+            """Move the cursor to the first position neither finished nor pending, called with the lock held"""
+            cursor = min(pending) if pending else pulled[0] + 1
+            finished.difference_update([done for done in finished if done < cursor])
+            changed = cursor != batch['cursor'] or sorted(finished) != batch.get('finished_positions', [])
+            batch['cursor'] = cursor
+            batch['finished_positions'] = sorted(finished)
+            return changed
+        
+        def run(position, url):
+            try:
+                self._batch_download_item(batch_id, url, format_id, resolution, compression, download_dir,
+                                          cookies_file)
+            finally:
+                with self._batch_lock:
+                    pending.discard(position)
+                    finished.add(position)
+                    changed = advance()
+                if changed:
+                    self._journal_batch(batch_id)
+                free_workers.release()
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'batch-{batch_id[:8]}') as executor:
+            try:
+                for position, url in entries:
+                    with self._batch_lock:
+                        pulled[0] = max(pulled[0], position)
+                        if position in finished:
+                            # Finished before the batch was interrupted
+                            advance()
+                            continue
+                    free_workers.acquire()
+                    with self._batch_lock:
+                        pending.add(position)
+                        advance()
+                        if batch.get('expanding'):
+                            batch['total'] += 1
+                    executor.submit(run, position, url)
+            except Exception as e:
+                print(f"Error expanding batch: {str(e)}")
+                batch['error'] = str(e)
+        
+        # Mark batch as completed, or failed when nothing could be queued
+        batch['expanding'] = False
+        batch['status'] = 'error' if batch.get('error') and not batch['total'] else 'completed'
+        self._journal_batch(batch_id, finished=True)
+        self._publish_batch(batch_id)
+        self.downloader.progress.forget(id(batch))
+    
+    def _journal_batch(self, batch_id, spec=None, finished=False):
+        """Journal a batch's status and cursor, or remove it once finished"""
+        journal = self.downloader.journal
+        if not journal:
+            return
+        try:
+            if finished:
+                journal.finish(batch_id)
+            else:
+                batch = self.batch_downloads[batch_id]
+                journal.record(batch_id, 'batch', batch['status'], spec=spec, state={
+                    'cursor': batch['cursor'],
+                    'finished': batch.get('finished_positions', [])
+                })
+        except Exception as e:
+            print(f"Error writing job journal: {str(e)}")
+    
+    def _restore_batch(self, job):
+        """Restart a journaled batch from its cursor under its old id
+        
+        Downloads that were running rejoin the restored downloads, finished
+        ones are skipped (playlists) or served from the content store.
+        """
+        spec = job['spec']
+        cursor = job['state'].get('cursor', 1)
+        finished = job['state'].get('finished', [])
+        if spec.get('cookies_file') and not os.path.exists(spec['cookies_file']):
+            self.downloader.journal.finish(job['id'])
+            return
+        
+        settings = (spec['format_id'], spec['resolution'], spec['compression'], spec['download_dir'],
+                    spec.get('cookies_file'))
+        if 'playlist_url' in spec:
+            selection = spec['selection']
+            self._start_playlist(job['id'], spec['playlist_url'], *settings, selection['start'], selection['end'],
+                                 selection['step'], cursor, spec['skip_downloaded'], spec.get('parallelism'),
+                                 spec.get('owner'), finished_positions=finished)
+        else:
+            urls = spec['urls']
+            entries = [(position, url) for position, url in enumerate(urls, 1)
+                       if position >= cursor and position not in finished]
+            self._start_batch(
+                job['id'], entries, *settings, spec.get('parallelism'), 'Batch download resumed', {'urls': urls},
+                total=len(entries), cursor=cursor, resumed_from=cursor, finished_positions=finished,
+                owner=spec.get('owner')
+            )
+    
+    def _batch_download_item(self, batch_id, url, format_id, resolution, compression, download_dir, cookies_file):
+        """Download one URL of a batch, holding a slot for its host"""
+        batch = self.batch_downloads[batch_id]
+        host = self._url_host(url)
+        self.host_limiter.acquire(host)
+        try:
             # Update batch status
-            self.batch_downloads[batch_id]['in_progress'] += 1
+            with self._batch_lock:
+                batch['in_progress'] += 1
+            self._publish_batch(batch_id)
             
             try:
                 # Start the download
@@ -173,63 +365,104 @@ class AdditionalFeatures:
                     resolution,
                     compression,
                     download_dir,
-                    cookies_file
+                    cookies_file,
+                    priority='batch',
+                    owner=batch.get('owner')
                 )
                 
                 if result['success']:
                     # Track this download in the batch
                     download_id = result['download_id']
-                    self.batch_downloads[batch_id]['downloads'][download_id] = {
-                        'url': url,
-                        'status': 'in_progress'
-                    }
+                    with self._batch_lock:
+                        batch['downloads'][download_id] = {
+                            'url': url,
+                            'status': 'in_progress'
+                        }
                     
                     # Wait for download to complete
                     self._wait_for_download(batch_id, download_id)
                 else:
                     # Download failed to start
-                    self.batch_downloads[batch_id]['failed'] += 1
+                    with self._batch_lock:
+                        batch['failed'] += 1
             except Exception as e:
                 print(f"Error in batch download: {str(e)}")
-                self.batch_downloads[batch_id]['failed'] += 1
+                with self._batch_lock:
+                    batch['failed'] += 1
             
             # Update batch status
-            self.batch_downloads[batch_id]['in_progress'] -= 1
+            with self._batch_lock:
+                batch['in_progress'] -= 1
+            self._publish_batch(batch_id)
+        finally:
+            self.host_limiter.release(host)
+    
+    def _url_host(self, url):
+        """Get the host a URL is downloaded from, for the per-host limit"""
+        host = (urlparse(url).hostname or '').lower()
+        return host[4:] if host.startswith('www.') else host
+    
+    def _publish_batch(self, batch_id):
+        """Notify progress stream subscribers that a batch changed"""
+        self.downloader.progress.publish(id(self.batch_downloads[batch_id]))
+    
+    def stream_batch_progress(self, batch_id):
+        """Get a server-sent event generator for a batch, or None if unknown"""
+        if batch_id not in self.batch_downloads:
+            return None
         
-        # Mark batch as completed
-        self.batch_downloads[batch_id]['status'] = 'completed'
+        def get_state():
+            batch = self.batch_downloads.get(batch_id)
+            if batch is None:
+                return None
+            # Per-item details are left out to keep events small
+            return {key: value for key, value in batch.items() if key != 'downloads'}
+        
+        return self.downloader.progress.stream(id(self.batch_downloads[batch_id]), get_state)
     
     def _wait_for_download(self, batch_id, download_id):
-        """Wait for a download to complete and update batch status"""
-        max_checks = 600  # Maximum number of checks (10 minutes at 1 check per second)
-        checks = 0
-        
-        while checks < max_checks:
-            # Get download status
-            if download_id in self.downloader.active_downloads:
-                status = self.downloader.active_downloads[download_id]['status']
-                
-                # Update batch tracking
-                self.batch_downloads[batch_id]['downloads'][download_id]['status'] = status
-                
-                # Check if download is complete or failed
-                if status == 'completed':
-                    self.batch_downloads[batch_id]['completed'] += 1
-                    return
-                elif status == 'error' or status == 'cancelled':
-                    self.batch_downloads[batch_id]['failed'] += 1
-                    return
-            else:
+        """Wait for a download to complete and update batch status
+        
+        The wait ends as soon as the download reaches a final status. The
+        time allowed grows with the download's size once it is known, and a
+        paused download is waited for without a limit.
+        """
+        batch = self.batch_downloads[batch_id]
+        started = time.monotonic()
+        
+        while True:
+            state = self.downloader.active_downloads.get(download_id)
+            if state is None:
                 # Download not found
-                self.batch_downloads[batch_id]['failed'] += 1
-                return
+                status = None
+                break
             
-            # Wait before checking again
-            time.sleep(1)
-            checks += 1
+            remaining = started + self._item_timeout(state) - time.monotonic()
+            if remaining <= 0:
+                if state.status != 'paused':
+                    # The download timed out, stop it so it frees its worker
+                    self.downloader.cancel_download(download_id)
+                    status = 'timeout'
+                    break
+                # The clock restarts once a paused download is resumed
+                started = time.monotonic()
+                continue
+            
+            status = self.downloader.wait_for_download(download_id, timeout=remaining)
+            if status:
+                break
         
-        # If we get here, the download timed out
-        self.batch_downloads[batch_id]['failed'] += 1
+        # Update batch tracking
+        with self._batch_lock:
+            batch['downloads'][download_id]['status'] = status or 'error'
+            if status == 'completed':
+                batch['completed'] += 1
+            else:
+                batch['failed'] += 1
+    
+    def _item_timeout(self, state):
+        """Get the seconds a batch item may take, scaled by its size when known"""
+        return self.batch_item_timeout + (state.total_bytes or 0) / self.batch_item_min_rate
     
     def get_batch_status(self, batch_id):
         """Get status of a batch download"""
@@ -244,8 +477,229 @@ class AdditionalFeatures:
                 'message': 'Batch download not found'
             }
     
-    def trim_video(self, video_path, start_time, end_time, output_filename=None):
-        """Trim a video to specified start and end times"""
+    def batch_process(self, files, operations, parallelism=None):
+        """Run a chain of post-processing operations over many files
+        
+        The ffmpeg operations of the chain (trim, volume, extract_audio)
+        run as a single ffmpeg pass per file, then the file operations
+        (rename, encrypt, decrypt) run in order on its result. Files are
+        processed in parallel, by default and at most as many as the
+        transcode executor runs at once.
+        """
+        try:
+            validate_chain(operations)
+        except (ValueError, TypeError) as e:
+            return {
+                'success': False,
+                'message': f'Invalid operation chain: {str(e)}'
+            }
+        if not files:
+            return {
+                'success': False,
+                'message': 'No files given'
+            }
+        max_jobs = self.downloader.transcoder.max_jobs
+        try:
+            parallelism = self._bounded_parallelism(parallelism, max_jobs, max_jobs)
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        
+        batch_id = str(uuid.uuid4())
+        self.batch_processes[batch_id] = {
+            'status': 'starting',
+            'total': len(files),
+            'completed': 0,
+            'failed': 0,
+            'in_progress': 0,
+            'progress': 0,
+            'operations': [operation['op'] for operation in operations],
+            'items': [
+                {'file': path, 'status': 'queued', 'progress': 0, 'output_path': None, 'error': None}
+                for path in files
+            ]
+        }
+        
+        # The coordinator runs on the batch pool, the files on its own threads
+        try:
+            self.downloader.engine.submit(
+                'batch',
+                self._batch_process_thread,
+                batch_id, operations, parallelism,
+                priority='batch',
+                job_id=batch_id
+            )
+        except EngineSaturated as e:
+            del self.batch_processes[batch_id]
+            return {
+                'success': False,
+                'message': f'Server is busy, please try again shortly ({str(e)})'
+            }
+        
+        return {
+            'success': True,
+            'batch_id': batch_id,
+            'message': f'Processing of {len(files)} files started'
+        }
+    
+    def _batch_process_thread(self, batch_id, operations, parallelism):
+        """Worker function running a batch's files in parallel"""
+        batch = self.batch_processes[batch_id]
+        batch['status'] = 'processing'
+        self._publish_batch_process(batch_id)
+        
+        workers = parallelism
+        with ThreadPoolExecutor(max_workers=min(workers, len(batch['items'])),
+                                thread_name_prefix=f'batch-process-{batch_id[:8]}') as executor:
+            for index in range(len(batch['items'])):
+                executor.submit(self._process_batch_item, batch_id, index, operations)
+        
+        batch['status'] = 'completed'
+        self._publish_batch_process(batch_id)
+        self.downloader.progress.forget(id(batch))
+    
+    def _process_batch_item(self, batch_id, index, operations):
+        """Run the operation chain on one file of a batch"""
+        batch = self.batch_processes[batch_id]
+        item = batch['items'][index]
+        with self._batch_lock:
+            item['status'] = 'processing'
+            batch['in_progress'] += 1
+        self._publish_batch_process(batch_id)
+        
+        try:
+            path = item['file']
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f'file not found: {path}')
+            
+            ffmpeg_ops, file_ops = split_chain(operations)
+            if ffmpeg_ops:
+                path = self._run_chain(batch_id, item, path, ffmpeg_ops)
+            
+            for operation in file_ops:
+                if operation['op'] == 'rename':
+                    stem = os.path.splitext(os.path.basename(path))[0]
+                    new_name = operation['name'].replace('{name}', stem).replace('{index}', str(index + 1))
+                    result = self.rename_file(path, new_name)
+                    path_key = 'new_path'
+                elif operation['op'] == 'encrypt':
+                    result = self.encrypt_file(path, operation['password'])
+                    path_key = 'output_path'
+                else:
+                    result = self.decrypt_file(path, operation['password'])
+                    path_key = 'output_path'
+                if not result['success']:
+                    raise RuntimeError(result['message'])
+                path = result[path_key]
+            
+            with self._batch_lock:
+                item['status'] = 'completed'
+                item['output_path'] = path
+                item['progress'] = 100
+                batch['completed'] += 1
+        except Exception as e:
+            print(f"Error in batch processing of {item['file']}: {str(e)}")
+            with self._batch_lock:
+                item['status'] = 'error'
+                item['error'] = e.stderr.decode(errors='replace').strip() if isinstance(e, ffmpeg.Error) else str(e)
+                item['progress'] = 100
+                batch['failed'] += 1
+        finally:
+            with self._batch_lock:
+                batch['in_progress'] -= 1
+            self._update_batch_process_progress(batch_id)
+    
+    def _run_chain(self, batch_id, item, path, ffmpeg_ops):
+        """Apply the ffmpeg operations of a chain to a file in one pass, returns the output path"""
+        start = end = None
+        trim = ffmpeg_ops.get('trim')
+        if trim:
+            start = self._time_to_seconds(trim['start'])
+            end = self._time_to_seconds(trim['end'])
+            if end <= start:
+                raise ValueError('end time must be after start time')
+        
+        output_path = chain_output_path(path, ffmpeg_ops)
+        
+        # A chain that only trims can use the smart trim
+        if list(ffmpeg_ops) == ['trim'] and trim.get('mode') == 'smart':
+            result = self.trim_video(path, trim['start'], trim['end'], os.path.basename(output_path), mode='smart')
+            if not result['success']:
+                raise RuntimeError(result['message'])
+            return result['output_path']
+        
+        if trim:
+            duration = end - start
+        else:
+            try:
+                duration = float(ffmpeg.probe(path)['format'].get('duration') or 0) or None
+            except Exception:
+                duration = None
+        
+        audio_format = ffmpeg_ops.get('extract_audio', {}).get('format', 'mp3')
+        stream = build_chain_stream(
+            path, ffmpeg_ops, output_path, start, end,
+            self._get_audio_codec(audio_format), self.downloader.transcoder.threads_per_job
+        )
+        
+        def on_output(line):
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if key == 'out_time_us' and value.isdigit() and duration:
+                item['progress'] = min(int(value) / 1000000 / duration * 100, 99.9)
+            elif key == 'progress':
+                self._update_batch_process_progress(batch_id)
+        
+        self._run_ffmpeg(stream, name=f'batch {os.path.basename(path)}', priority='batch', on_output=on_output)
+        return output_path
+    
+    def _update_batch_process_progress(self, batch_id):
+        """Recompute a batch's overall progress from its items and notify subscribers"""
+        batch = self.batch_processes[batch_id]
+        items = batch['items']
+        batch['progress'] = round(sum(item['progress'] for item in items) / len(items), 1)
+        self._publish_batch_process(batch_id)
+    
+    def _publish_batch_process(self, batch_id):
+        """Notify progress stream subscribers that a processing batch changed"""
+        self.downloader.progress.publish(id(self.batch_processes[batch_id]))
+    
+    def stream_batch_process_progress(self, batch_id):
+        """Get a server-sent event generator for a processing batch, or None if unknown"""
+        if batch_id not in self.batch_processes:
+            return None
+        
+        def get_state():
+            batch = self.batch_processes.get(batch_id)
+            if batch is None:
+                return None
+            # Per-item details are left out to keep events small
+            return {key: value for key, value in batch.items() if key != 'items'}
+        
+        return self.downloader.progress.stream(id(self.batch_processes[batch_id]), get_state)
+    
+    def get_batch_process_status(self, batch_id):
+        """Get status of a processing batch, including each file"""
+        if batch_id in self.batch_processes:
+            return {
+                'success': True,
+                'batch_info': self.batch_processes[batch_id]
+            }
+        else:
+            return {
+                'success': False,
+                'message': 'Batch not found'
+            }
+    
+    def trim_video(self, video_path, start_time, end_time, output_filename=None, mode='fast'):
+        """Trim a video to specified start and end times
+        
+        mode 'fast' copies the streams and starts at the keyframe before the
+        start time, 'accurate' re-encodes the whole range and 'smart' only
+        re-encodes the frames between each cut and its nearest keyframe,
+        copying everything in between.
+        """
         try:
             # Generate output filename if not provided
             if not output_filename:
@@ -261,18 +715,28 @@ class AdditionalFeatures:
             
             # Calculate duration
             duration = end_seconds - start_seconds
+            if duration <= 0:
+                raise ValueError('end time must be after start time')
             
-            # Use ffmpeg to trim the video
-            (
-                ffmpeg
-                .input(video_path, ss=start_seconds)
-                .output(output_path, t=duration, c='copy')
-                .run(quiet=True, overwrite_output=True)
-            )
+            name = f'trim {os.path.basename(video_path)}'
+            if mode == 'smart':
+                mode = self._smart_trim(video_path, start_seconds, end_seconds, output_path, name)
+            elif mode == 'accurate':
+                self._accurate_trim(video_path, start_seconds, end_seconds, output_path, name)
+            else:
+                mode = 'fast'
+                # Use ffmpeg to trim the video
+                self._run_ffmpeg(
+                    ffmpeg
+                    .input(video_path, ss=start_seconds)
+                    .output(output_path, t=duration, c='copy'),
+                    name=name
+                )
             
             return {
                 'success': True,
                 'output_path': output_path,
+                'mode': mode,
                 'message': 'Video trimmed successfully'
             }
         except Exception as e:
@@ -282,19 +746,126 @@ class AdditionalFeatures:
                 'message': f'Error trimming video: {str(e)}'
             }
     
+    def _accurate_trim(self, video_path, start, end, output_path, name):
+        """Re-encode the whole range, the container's default encoders are used"""
+        self._run_ffmpeg(
+            ffmpeg
+            .input(video_path, ss=start)
+            .output(output_path, t=end - start, crf=SMART_TRIM_CRF,
+                    threads=self.downloader.transcoder.threads_per_job),
+            name=name
+        )
+    
+    def _smart_trim(self, video_path, start, end, output_path, name):
+        """Re-encode the partial GOPs at both cuts and stream-copy the middle
+        
+        The video is cut into up to three segments that are joined without
+        re-encoding, each carrying its codec parameters in-band. Audio
+        is re-encoded over the whole range, which is cheap and keeps it in
+        sync. Falls back to an accurate trim when the codec cannot be
+        matched or no keyframe falls inside the range. Returns the mode used.
+        """
+        probe = ffmpeg.probe(video_path)
+        streams = probe.get('streams', [])
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        encoder = SMART_TRIM_ENCODERS.get(normalize_codec(video.get('codec_name')) if video else None)
+        if encoder and encoder['encoder'] != 'libx264' and encoder['encoder'] not in available_encoders():
+            encoder = None
+        
+        first = last = None
+        if encoder:
+            first = self.keyframes.at_or_after(video_path, start)
+            last = self.keyframes.at_or_before(video_path, end)
+        if first is None or last is None or last <= first:
+            self._accurate_trim(video_path, start, end, output_path, name)
+            return 'accurate'
+        
+        # Cuts closer than half a frame to a keyframe need no re-encode
+        frame = self._frame_duration(video)
+        pieces = [
+            (start, first, False),
+            (first, last, True),
+            (last, end, False)
+        ]
+        
+        threads = self.downloader.transcoder.threads_per_job
+        encode_args = {
+            'vcodec': encoder['encoder'],
+            'crf': SMART_TRIM_CRF,
+            'preset': 'fast',
+            'threads': threads,
+            encoder['params']: 'repeat-headers=1'
+        }
+        if video.get('pix_fmt'):
+            encode_args['pix_fmt'] = video['pix_fmt']
+        
+        work_dir = tempfile.mkdtemp(dir=self.temp_dir)
+        try:
+            segments = []
+            for i, (piece_start, piece_end, copy) in enumerate(pieces):
+                if piece_end - piece_start < frame / 2:
+                    continue
+                segment = os.path.join(work_dir, f'{i}.mkv')
+                if copy:
+                    # Seeking a little past the keyframe still lands on it when
+                    # the printed time is rounded down. Cutting by time would let
+                    # reordered frames past the end slip in, the packet count
+                    # between the keyframes is exact.
+                    stream = ffmpeg.input(video_path, ss=piece_start + frame / 4).output(
+                        segment, vcodec='copy', an=None, **{
+                            'frames:v': self.keyframes.packets_between(video_path, piece_start, piece_end),
+                            'bsf:v': encoder['bsf']
+                        }
+                    )
+                else:
+                    stream = ffmpeg.input(video_path, ss=piece_start).output(
+                        segment, t=piece_end - piece_start - frame / 4, an=None, **encode_args
+                    )
+                self._run_ffmpeg(stream, name=f'{name} ({"copy" if copy else "encode"})')
+                segments.append(segment)
+            
+            list_path = os.path.join(work_dir, 'segments.txt')
+            with open(list_path, 'w') as f:
+                for segment in segments:
+                    f.write(f"file '{segment}'\n")
+            
+            output_args = {'vcodec': 'copy'}
+            outputs = [ffmpeg.input(list_path, f='concat', safe=0)['v']]
+            if any(s.get('codec_type') == 'audio' for s in streams):
+                outputs.append(ffmpeg.input(video_path, ss=start, t=end - start)['a'])
+                output_args['acodec'] = 'aac'
+            if os.path.splitext(output_path)[1].lower() in ('.mp4', '.m4v', '.mov'):
+                output_args['movflags'] = '+faststart'
+                if encoder['encoder'] == 'libx265':
+                    output_args['tag:v'] = 'hvc1'
+            
+            self._run_ffmpeg(ffmpeg.output(*outputs, output_path, **output_args), name=f'{name} (join)')
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return 'smart'
+    
+    def _frame_duration(self, video):
+        """Get the duration of one frame from ffprobe stream info, assuming 30 fps if unknown"""
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            num, _, den = (video.get(key) or '').partition('/')
+            try:
+                if float(num) > 0 and float(den or 1) > 0:
+                    return float(den or 1) / float(num)
+            except ValueError:
+                continue
+        return 1 / 30
+    
     def _time_to_seconds(self, time_str):
-        """Convert time string (HH:MM:SS or MM:SS) to seconds"""
-        parts = time_str.split(':')
+        """Convert time string (HH:MM:SS or MM:SS, seconds may have a fraction) to seconds"""
+        parts = str(time_str).split(':')
         
         if len(parts) == 3:  # HH:MM:SS
-            hours, minutes, seconds = map(int, parts)
-            return hours * 3600 + minutes * 60 + seconds
+            return int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
         elif len(parts) == 2:  # MM:SS
-            minutes, seconds = map(int, parts)
-            return minutes * 60 + seconds
+            return int(parts[0]) * 60 + float(parts[1])
         else:
             try:
-                return int(time_str)  # Seconds only
+                return float(time_str)  # Seconds only
             except:
                 return 0
     
@@ -310,11 +881,11 @@ class AdditionalFeatures:
             output_path = os.path.join(os.path.dirname(video_path), output_filename)
             
             # Use ffmpeg to adjust volume
-            (
+            self._run_ffmpeg(
                 ffmpeg
                 .input(video_path)
-                .output(output_path, af=f"volume={volume_factor}")
-                .run(quiet=True, overwrite_output=True)
+                .output(output_path, af=f"volume={volume_factor}", threads=self.downloader.transcoder.threads_per_job),
+                name=f'volume {os.path.basename(video_path)}'
             )
             
             return {
@@ -341,11 +912,11 @@ class AdditionalFeatures:
             output_path = os.path.join(os.path.dirname(video_path), output_filename)
             
             # Use ffmpeg to extract audio
-            (
+            self._run_ffmpeg(
                 ffmpeg
                 .input(video_path)
-                .output(output_path, acodec=self._get_audio_codec(audio_format), ab=f"{quality}k")
-                .run(quiet=True, overwrite_output=True)
+                .output(output_path, acodec=self._get_audio_codec(audio_format), ab=f"{quality}k"),
+                name=f'extract audio {os.path.basename(video_path)}'
             )
             
             return {
@@ -360,6 +931,13 @@ class AdditionalFeatures:
                 'message': f'Error extracting audio: {str(e)}'
             }
     
+    def _run_ffmpeg(self, stream, name, priority='interactive', on_output=None):
+        """Run an ffmpeg stream on the shared transcode executor, raising on failure"""
+        job = self.downloader.transcoder.run(stream.overwrite_output(), name=name, priority=priority, on_output=on_output)
+        if job.returncode:
+            raise ffmpeg.Error('ffmpeg', b'', job.stderr)
+        return job
+    
     def _get_audio_codec(self, format):
         """Get ffmpeg audio codec for format"""
         codecs = {
@@ -374,9 +952,15 @@ class AdditionalFeatures:
     def rename_file(self, file_path, new_name):
         """Rename a file"""
         try:
-            dir_path = os.path.dirname(file_path)
+            dir_path = os.path.dirname(os.path.abspath(file_path))
             ext = os.path.splitext(file_path)[1]
-            new_path = os.path.join(dir_path, f"{new_name}{ext}")
+            new_path = os.path.abspath(os.path.join(dir_path, f"{new_name}{ext}"))
+            
+            # The new name stays in the file's directory and never replaces another file
+            if os.path.dirname(new_path) != dir_path or os.path.commonpath([new_path, dir_path]) != dir_path:
+                raise ValueError(f'invalid file name: {new_name}')
+            if os.path.exists(new_path):
+                raise FileExistsError(f'{os.path.basename(new_path)} already exists')
             
             # Rename the file
             os.rename(file_path, new_path)
@@ -398,26 +982,11 @@ class AdditionalFeatures:
     
     def _update_history_filename(self, old_path, new_path):
         """Update download history with new filename"""
-        history_file = self.app_config['DOWNLOAD_HISTORY_FILE']
+        # Keep the content store reference pointing at the moved file
+        self.downloader.content_store.move_reference(old_path, new_path)
         
-        # Load existing history
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, 'r') as f:
-                    history = json.load(f)
-                
-                # Update matching entries
-                for entry in history:
-                    if entry.get('path') == old_path:
-                        entry['path'] = new_path
-                        # Update title based on new filename
-                        entry['title'] = os.path.basename(new_path).split('.')[0]
-                
-                # Save updated history
-                with open(history_file, 'w') as f:
-                    json.dump(history, f)
-            except:
-                pass
+        # Update matching entries, the title follows the new filename
+        self.downloader.history.update_path(old_path, new_path, os.path.basename(new_path).split('.')[0])
     
     def auto_categorize(self, video_info):
         """Auto-categorize a video based on metadata"""
@@ -556,55 +1125,122 @@ class AdditionalFeatures:
                 'message': f'Error uploading to cloud: {str(e)}'
             }
     
-    def download_playlist(self, playlist_url, format_id, resolution, compression, download_dir, cookies_file=None):
-        """Download an entire YouTube playlist"""
-        try:
-            # Extract playlist information
-            ydl_opts = {
-                'extract_flat': True,
-                'skip_download': True,
-                'quiet': True,
-                'ignoreerrors': True,
-                'no_warnings': True
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                playlist_info = ydl.extract_info(playlist_url, download=False)
-                
-                if not playlist_info:
-                    return {
-                        'success': False,
-                        'message': 'Failed to extract playlist information'
-                    }
-                
-                # Get video URLs from playlist
-                video_urls = []
-                for entry in playlist_info.get('entries', []):
-                    if entry and 'url' in entry:
-                        video_urls.append(entry['url'])
-                
-                if not video_urls:
-                    return {
-                        'success': False,
-                        'message': 'No videos found in playlist'
-                    }
-                
-                # Start batch download
-                return self.batch_download(
-                    video_urls,
-                    format_id,
-                    resolution,
-                    compression,
-                    download_dir,
-                    cookies_file
-                )
+    def download_playlist(self, playlist_url, format_id, resolution, compression, download_dir, cookies_file=None,
+                          start=1, end=None, step=1, cursor=None, skip_downloaded=True, parallelism=None, owner=None):
+        """Download a YouTube playlist or channel while its listing is still being read
         
-        except Exception as e:
-            print(f"Error downloading playlist: {str(e)}")
+        start, end and step select playlist positions (1-based, end
+        inclusive). cursor is the 'cursor' of an earlier batch for the same
+        selection and resumes it. Videos already in the download history
+        are skipped unless skip_downloaded is False.
+        """
+        start = max(int(start or 1), 1)
+        step = max(int(step or 1), 1)
+        end = int(end) if end else None
+        cursor = max(int(cursor or start), start)
+        try:
+            parallelism = self._bounded_parallelism(parallelism, self.batch_parallelism, self.max_batch_parallelism)
+        except ValueError as e:
             return {
                 'success': False,
-                'message': f'Error downloading playlist: {str(e)}'
+                'message': str(e)
             }
+        
+        return self._start_playlist(str(uuid.uuid4()), playlist_url, format_id, resolution, compression,
+                                    download_dir, cookies_file, start, end, step, cursor, skip_downloaded, parallelism,
+                                    owner)
+    
+    def _start_playlist(self, batch_id, playlist_url, format_id, resolution, compression, download_dir, cookies_file,
+                        start, end, step, cursor, skip_downloaded, parallelism, owner=None, finished_positions=None):
+        """Start a playlist batch from a validated selection, skipping the finished positions of a resumed one"""
+        selection = {'start': start, 'end': end, 'step': step}
+        entries = self._iter_playlist(batch_id, playlist_url, start, end, step, cursor, skip_downloaded,
+                                      cookies_file)
+        return self._start_batch(
+            batch_id, entries, format_id, resolution, compression, download_dir, cookies_file, parallelism,
+            'Playlist download started',
+            {'playlist_url': playlist_url, 'selection': selection, 'skip_downloaded': skip_downloaded},
+            playlist_url=playlist_url, expanding=True, skipped=0, cursor=cursor, selection=selection, owner=owner,
+            finished_positions=list(finished_positions or [])
+        )
+    
+    def _iter_playlist(self, batch_id, playlist_url, start, end, step, cursor, skip_downloaded, cookies_file):
+        """Yield (position, url) for the selected playlist entries as yt-dlp pages through the listing"""
+        selected = self._select_playlist_entries(batch_id, playlist_url, start, end, step, cursor, cookies_file)
+        if not skip_downloaded:
+            yield from selected
+            return
+        
+        # Videos already in the history are looked up one slice of the
+        # listing at a time, as the slice is read
+        batch = self.batch_downloads[batch_id]
+        pending = []
+        for item in selected:
+            pending.append(item)
+            if len(pending) >= PLAYLIST_HISTORY_SLICE:
+                yield from self._skip_downloaded(batch, pending)
+                pending = []
+        yield from self._skip_downloaded(batch, pending)
+    
+    def _skip_downloaded(self, batch, entries):
+        """Yield the (position, url) entries whose video is not in the download history, counting the others"""
+        downloaded = self.downloader.history.downloaded_video_ids(normalize_video_id(url) for _, url in entries)
+        for position, url in entries:
+            if normalize_video_id(url) in downloaded:
+                with self._batch_lock:
+                    batch['skipped'] += 1
+                continue
+            yield position, url
+    
+    def _select_playlist_entries(self, batch_id, playlist_url, start, end, step, cursor, cookies_file):
+        """Yield (position, url) for every selected playlist entry, downloaded or not"""
+        batch = self.batch_downloads[batch_id]
+        ydl_opts = {
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+            'skip_download': True,
+            'quiet': True,
+            'ignoreerrors': True,
+            'no_warnings': True
+        }
+        if cookies_file:
+            ydl_opts['cookiefile'] = cookies_file
+        
+        with self.downloader.ydl_pool.acquire(ydl_opts) as ydl:
+            # Without processing, entries stay a lazy iterator that fetches
+            # one page of the listing at a time
+            info = ydl.extract_info(playlist_url, download=False, process=False)
+            
+            # Channel and tab URLs point at the actual listing first
+            for _ in range(3):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+            
+            if not info:
+                raise ValueError('Failed to extract playlist information')
+            batch['playlist_title'] = info.get('title')
+            
+            entries = info.get('entries')
+            offset = 0
+            if entries is None:
+                # Not a playlist, just the one video
+                entries = [{'url': info.get('webpage_url') or playlist_url}]
+            elif hasattr(entries, 'getslice'):
+                # Paged listings only fetch the pages the selection needs
+                offset = cursor - 1
+                entries = entries.getslice(offset, end)
+            
+            for position, entry in enumerate(entries, offset + 1):
+                if end and position > end:
+                    break
+                if position < cursor or (position - start) % step or not entry:
+                    continue
+                
+                url = entry.get('url') or entry.get('webpage_url')
+                if not url:
+                    continue
+                yield position, url
     
     def encrypt_file(self, file_path, password, output_filename=None):
         """Encrypt a downloaded file"""
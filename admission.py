@@ -0,0 +1,100 @@
+# TasVID YouTube Downloader - Admission Control Module
+
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+
+
+def read_setting(app_config, name, default=None):
+    """Get a setting from the app config, falling back to the environment (.env)"""
+    value = app_config.get(name)
+    if value is None:
+        value = os.environ.get(name, default)
+    return value
+
+
+def read_flag(app_config, name, default=False):
+    """Get a boolean setting, accepting the strings an .env file holds"""
+    value = read_setting(app_config, name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+class TokenBucket:
+    """Holds up to capacity tokens, refilled continuously at rate tokens per second"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, tokens=1):
+        """Take tokens if available, returns 0 or the seconds until they will be"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+        return (tokens - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Per-client request rate limits for the routes that start work
+
+    Every client gets a token bucket per limited route that holds
+    MAX_REQUESTS_PER_MINUTE requests and refills at the same rate, so a
+    short burst passes and a sustained flood is refused. Limits apply only
+    with RATE_LIMIT_ENABLED. How admitted work shares the download workers
+    is up to the engine's fair queuing.
+    """
+    def __init__(self, app_config, max_clients=10000):
+        self.enabled = read_flag(app_config, 'RATE_LIMIT_ENABLED')
+        self.requests_per_minute = max(1, int(read_setting(app_config, 'MAX_REQUESTS_PER_MINUTE', 60)))
+        self.max_clients = max_clients
+
+        # (client, route) -> TokenBucket, least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.admitted = 0
+        self.limited = 0
+
+    def check(self, client, route, cost=1):
+        """Admit a request, returns 0 or the whole seconds to wait before retrying"""
+        if not self.enabled:
+            return 0
+
+        key = (client, route)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.requests_per_minute / 60.0, self.requests_per_minute)
+                self._buckets[key] = bucket
+                # A bucket that was dropped would be full again anyway
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            wait = bucket.take(min(cost, self.requests_per_minute))
+            if wait:
+                self.limited += 1
+                return max(1, math.ceil(wait))
+            self.admitted += 1
+            return 0
+
+    def get_stats(self):
+        """Get the limit and how many requests were admitted or refused"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'requests_per_minute': self.requests_per_minute,
+                'clients': len(self._buckets),
+                'admitted': self.admitted,
+                'limited': self.limited
+            }
@@ -0,0 +1,240 @@
+# TasVID YouTube Downloader - Analysis Jobs Module
+
+import time
+import uuid
+import heapq
+import threading
+from collections import OrderedDict
+
+from download_engine import EngineSaturated
+
+# Statuses after which an analysis never changes again
+FINISHED_STATUSES = ('completed', 'error')
+
+
+class AnalysisJobs:
+    """Video analyses run on the engine's analyze pool behind a job handle
+
+    submit() returns at once with an id, callers fetch the result later,
+    optionally waiting for it (long-poll). A failed attempt is not retried
+    by sleeping on a worker: it goes on a heap served by one thread, which
+    queues the next attempt once its backoff has passed. Concurrent
+    analyses of the same video share one job. Request threads that
+    long-poll are capped at max_waiters, callers beyond that get the
+    current status right away and poll again after retry_after seconds.
+    """
+    def __init__(self, engine, attempt, retry_delay, max_attempts=3, result_ttl=300, max_jobs=10000,
+                 max_waiters=16, poll_interval=1):
+        self.engine = engine
+        # attempt(url, cookies_file) -> result, None or an exception means a failed attempt
+        self.attempt = attempt
+        # retry_delay(attempts, error) -> seconds before the next attempt
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self.max_waiters = max_waiters
+        self.poll_interval = poll_interval
+
+        # analysis_id -> job dict, oldest first
+        self._jobs = OrderedDict()
+        # video key -> analysis_id of the unfinished job for it
+        self._pending = {}
+        self._waiters = 0
+        self._lock = threading.Lock()
+
+        # (due, analysis_id) of attempts waiting out their backoff
+        self._retries = []
+        self._retry_cond = threading.Condition(self._lock)
+
+        # Counters
+        self.submitted = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.turned_away = 0
+
+        self._thread = threading.Thread(target=self._retry_loop, name='analysis-retries')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, url, key=None, cookies_file=None, owner=None, result=None):
+        """Start analysing a URL, returns the job's status dict
+
+        Jobs with the same key share one analysis while it runs. A result
+        known up front (a cache hit) completes the job immediately.
+        """
+        with self._lock:
+            self._expire()
+            if key is not None and result is None:
+                analysis_id = self._pending.get(key)
+                if analysis_id is not None:
+                    self.coalesced += 1
+                    return self._snapshot(self._jobs[analysis_id])
+
+            job = {
+                'id': str(uuid.uuid4()),
+                'url': url,
+                'key': key,
+                'cookies_file': cookies_file,
+                'owner': owner,
+                'status': 'queued',
+                'attempts': 0,
+                'result': result,
+                'error': None,
+                'created': time.time(),
+                'finished': None,
+                'done': threading.Event()
+            }
+            self._jobs[job['id']] = job
+            self.submitted += 1
+            if result is not None:
+                self._finish(job, 'completed')
+                return self._snapshot(job)
+            if key is not None:
+                self._pending[key] = job['id']
+
+        self._queue(job)
+        with self._lock:
+            return self._snapshot(job)
+
+    def _queue(self, job, retry=False):
+        """Queue the next attempt of a job on the analyze pool
+
+        A new job the engine has no room for fails right away. A retry it
+        refuses counts as an attempt and backs off again while the job has
+        attempts left.
+        """
+        try:
+            self.engine.submit('analyze', self._run, job['id'], owner=job['owner'])
+        except EngineSaturated as e:
+            with self._lock:
+                error = f'Server is busy, please try again shortly ({str(e)})'
+                if retry:
+                    job['attempts'] += 1
+                if retry and job['attempts'] < self.max_attempts:
+                    self._schedule_retry(job, error)
+                else:
+                    job['error'] = error
+                    self._finish(job, 'error')
+
+    def _run(self, analysis_id):
+        """Worker function making one attempt, failures are retried later without holding the worker"""
+        with self._lock:
+            job = self._jobs.get(analysis_id)
+            if job is None:
+                return
+            job['status'] = 'running'
+            job['attempts'] += 1
+
+        error = None
+        try:
+            result = self.attempt(job['url'], job['cookies_file'])
+        except Exception as e:
+            print(f"Error analysing {job['url']} (attempt {job['attempts']}): {str(e)}")
+            result = None
+            error = str(e)
+
+        with self._lock:
+            if result is not None:
+                job['result'] = result
+                self._finish(job, 'completed')
+            elif job['attempts'] >= self.max_attempts:
+                job['error'] = error
+                self._finish(job, 'error')
+            else:
+                self._schedule_retry(job, error)
+
+    def _schedule_retry(self, job, error):
+        """Put a failed job on the retry heap until its backoff has passed, called with the lock held"""
+        job['status'] = 'retrying'
+        job['error'] = error
+        due = time.monotonic() + self.retry_delay(job['attempts'], error)
+        heapq.heappush(self._retries, (due, job['id']))
+        self.retried += 1
+        self._retry_cond.notify()
+
+    def _retry_loop(self):
+        """Queue each failed job again once its backoff has passed"""
+        while True:
+            with self._lock:
+                while not self._retries or self._retries[0][0] > time.monotonic():
+                    timeout = self._retries[0][0] - time.monotonic() if self._retries else None
+                    self._retry_cond.wait(timeout)
+                _, analysis_id = heapq.heappop(self._retries)
+                job = self._jobs.get(analysis_id)
+            if job is not None:
+                self._queue(job, retry=True)
+
+    def _finish(self, job, status):
+        """Settle a job and wake its waiters, called with the lock held"""
+        job['status'] = status
+        job['finished'] = time.time()
+        if self._pending.get(job['key']) == job['id']:
+            del self._pending[job['key']]
+        job['done'].set()
+
+    def _expire(self):
+        """Drop finished jobs older than result_ttl, and the oldest beyond max_jobs, called with the lock held"""
+        cutoff = time.time() - self.result_ttl
+        expired = []
+        for analysis_id, job in self._jobs.items():
+            if job['created'] >= cutoff and len(self._jobs) - len(expired) <= self.max_jobs:
+                break
+            if job['status'] in FINISHED_STATUSES:
+                expired.append(analysis_id)
+        for analysis_id in expired:
+            del self._jobs[analysis_id]
+
+    def _snapshot(self, job):
+        """Build the status dict returned for a job, called with the lock held"""
+        status = {
+            'analysis_id': job['id'],
+            'status': job['status'],
+            'attempts': job['attempts']
+        }
+        if job['status'] == 'completed':
+            status['result'] = job['result']
+        elif job['status'] == 'error':
+            status['error'] = job['error']
+        else:
+            status['retry_after'] = self.poll_interval
+        return status
+
+    def get(self, analysis_id, wait=0):
+        """Get a job's status dict or None, waiting up to wait seconds for it to finish"""
+        with self._lock:
+            job = self._jobs.get(analysis_id)
+            if job is None:
+                return None
+            waiting = wait > 0 and job['status'] not in FINISHED_STATUSES
+            if waiting and self._waiters >= self.max_waiters:
+                self.turned_away += 1
+                waiting = False
+            if waiting:
+                self._waiters += 1
+
+        if waiting:
+            try:
+                job['done'].wait(wait)
+            finally:
+                with self._lock:
+                    self._waiters -= 1
+
+        with self._lock:
+            return self._snapshot(job)
+
+    def get_stats(self):
+        """Get job counts by status and how many attempts were retried"""
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job['status']] = statuses.get(job['status'], 0) + 1
+            return {
+                'jobs': statuses,
+                'waiters': self._waiters,
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'retried': self.retried,
+                'retry_pending': len(self._retries),
+                'turned_away': self.turned_away
+            }
@@ -1,22 +1,35 @@
 import os
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, stream_with_context
 import uuid
 import json
-import time
 from datetime import datetime
 import hashlib
 import bcrypt
 import secrets
 import re
+from youtube_downloader import YouTubeDownloader, get_download_directory
+from additional_features import AdditionalFeatures
+from admission import AdmissionController
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
+# Downloader state (history, caches, content store) lives in the instance directory
+os.makedirs(app.instance_path, exist_ok=True)
+app.config['DOWNLOAD_HISTORY_FILE'] = os.path.join(app.instance_path, 'download_history.json')
+video_downloader = YouTubeDownloader(app.config)
+features = AdditionalFeatures(app.config, video_downloader)
+history_store = video_downloader.history
+
+# Request rate limits from RATE_LIMIT_ENABLED and MAX_REQUESTS_PER_MINUTE
+admission = AdmissionController(app.config)
+
+# Routes that start work are rate limited per client address
+RATE_LIMITED_ENDPOINTS = ('analyze_url', 'download_video', 'batch_download', 'download_playlist')
+
 # In-memory storage for demo purposes
 # In a production environment, this would be a database
-downloads = {}
-download_history = []
 user_settings = {
     'default_format': 'mp4',
     'default_resolution': '720p',
@@ -26,12 +39,30 @@ user_settings = {
     'auth_enabled': False
 }
 users = {}
-batch_downloads = {}
-scheduled_downloads = {}
 
 # Ensure download directory exists
 os.makedirs(user_settings['download_location'], exist_ok=True)
 
+def _client_id():
+    """Identify the caller for fair sharing of the download workers, per browser session"""
+    if 'client_id' not in session:
+        session['client_id'] = uuid.uuid4().hex
+    return session['client_id']
+
+@app.before_request
+def admit_request():
+    if request.endpoint not in RATE_LIMITED_ENDPOINTS:
+        return None
+    
+    retry_after = admission.check(request.remote_addr, request.endpoint)
+    if retry_after:
+        response = jsonify({'success': False,
+                            'message': f'Too many requests, please try again in {retry_after} seconds'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    return None
+
 # Routes
 @app.route('/')
 def home():
@@ -47,25 +78,23 @@ def analyze_url():
     if not url:
         return jsonify({'success': False, 'message': 'URL is required'})
     
+    # Returns at once, a cached video with its info and anything else with
+    # an analysis_id to long-poll /analyze/<analysis_id> with
     try:
-        # In a real implementation, this would use yt-dlp to get video info
-        # For demo purposes, we'll simulate a response
-        video_info = {
-            'title': f'Sample Video - {url[-8:]}',
-            'thumbnail': 'https://via.placeholder.com/480x360',
-            'duration': '10:30',
-            'formats': [
-                {'format_id': 'mp4_1080p', 'format': 'MP4', 'resolution': '1080p', 'size': '250 MB'},
-                {'format_id': 'mp4_720p', 'format': 'MP4', 'resolution': '720p', 'size': '150 MB'},
-                {'format_id': 'mp4_480p', 'format': 'MP4', 'resolution': '480p', 'size': '80 MB'},
-                {'format_id': 'webm_720p', 'format': 'WebM', 'resolution': '720p', 'size': '140 MB'},
-                {'format_id': 'mp3_128', 'format': 'MP3', 'resolution': 'Audio Only', 'size': '50 MB'}
-            ]
-        }
-        return jsonify({'success': True, 'video_info': video_info})
+        result = video_downloader.analyze_video(url, owner=_client_id())
+        return jsonify(result), 202 if result.get('status') not in ('completed', 'error') else 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/analyze/<analysis_id>')
+def analysis_status(analysis_id):
+    # wait= holds the request until the analysis finishes, for at most that many seconds
+    wait = request.args.get('wait', 0, type=float)
+    result = video_downloader.get_analysis(analysis_id, wait=wait)
+    if not result['success'] and 'analysis_id' not in result:
+        return jsonify(result), 404
+    return jsonify(result)
+
 @app.route('/download', methods=['POST'])
 def download_video():
     url = request.form.get('url')
@@ -77,88 +106,104 @@ def download_video():
         return jsonify({'success': False, 'message': 'URL and format are required'})
     
     try:
-        # Generate a unique ID for this download
-        download_id = str(uuid.uuid4())
-        
-        # In a real implementation, this would start a background task to download the video
-        # For demo purposes, we'll simulate a download
-        downloads[download_id] = {
-            'url': url,
-            'format_id': format_id,
-            'resolution': resolution,
-            'compression': compression,
-            'status': 'downloading',
-            'progress': 0,
-            'speed': '0 KB/s',
-            'eta': 'Calculating...',
-            'filename': f'video_{download_id[:8]}.mp4',
-            'start_time': time.time()
-        }
-        
-        # Simulate download progress in a real app
-        # In a real implementation, this would be handled by a background task
-        
-        return jsonify({'success': True, 'download_id': download_id})
+        download_dir = get_download_directory(request.headers.get('User-Agent'), user_settings)
+        result = video_downloader.download_video(url, format_id, resolution, compression, download_dir,
+                                                 owner=_client_id(),
+                                                 bandwidth_limit=request.form.get('bandwidth_limit'))
+        return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/download-status/<download_id>')
 def download_status(download_id):
-    if download_id not in downloads:
-        return jsonify({'success': False, 'message': 'Download not found'})
-    
-    # In a real implementation, this would check the actual download status
-    # For demo purposes, we'll simulate progress
-    download_info = downloads[download_id]
-    elapsed = time.time() - download_info['start_time']
-    
-    # Simulate download progress
-    if download_info['status'] == 'downloading':
-        progress = min(int(elapsed * 10), 100)  # 10% per second
-        download_info['progress'] = progress
-        download_info['speed'] = f'{int(progress * 50)} KB/s'
-        
-        if progress < 100:
-            download_info['eta'] = f'{int((100 - progress) / 10)} seconds'
-        else:
-            download_info['status'] = 'completed'
-            download_info['eta'] = '0 seconds'
-            
-            # Add to history
-            download_history.append({
-                'id': download_id,
-                'title': f'Sample Video - {download_info["url"][-8:]}',
-                'format': download_info['format_id'].split('_')[0].upper(),
-                'resolution': download_info['resolution'],
-                'size': f'{int(download_info["progress"] * 0.5)} MB',
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'output_path': os.path.join(user_settings['download_location'], download_info['filename'])
-            })
-    
-    return jsonify({'success': True, 'download_info': download_info})
+    return jsonify(video_downloader.get_download_status(download_id))
+
+def _event_stream(generator):
+    """Wrap a progress generator in a server-sent events response"""
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/download-events/<download_id>')
+def download_events(download_id):
+    generator = video_downloader.stream_download_progress(download_id)
+    if generator is None:
+        return jsonify({'success': False, 'message': 'Download not found'}), 404
+    return _event_stream(generator)
 
 @app.route('/cancel-download/<download_id>', methods=['POST'])
 def cancel_download(download_id):
-    if download_id not in downloads:
-        return jsonify({'success': False, 'message': 'Download not found'})
+    return jsonify(video_downloader.cancel_download(download_id))
+
+@app.route('/api/compression-profiles')
+def compression_profiles():
+    return jsonify(video_downloader.get_compression_profiles())
+
+@app.route('/api/bandwidth')
+def bandwidth():
+    return jsonify({'success': True, 'bandwidth': video_downloader.bandwidth.get_stats()})
+
+@app.route('/pause-download/<download_id>', methods=['POST'])
+def pause_download(download_id):
+    return jsonify(video_downloader.pause_download(download_id))
+
+@app.route('/resume-download/<download_id>', methods=['POST'])
+def resume_download(download_id):
+    return jsonify(video_downloader.resume_download(download_id))
+
+# Choices offered by the history filter form
+HISTORY_FORMATS = ['mp4', 'webm', 'mp3']
+HISTORY_RESOLUTIONS = ['4K', '1440p', '1080p', '720p', '480p', '360p', '240p', '144p', 'audio']
+
+def _history_query_args():
+    """Read history filters, sorting and paging from the query string"""
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        limit = 50
     
-    downloads[download_id]['status'] = 'cancelled'
-    return jsonify({'success': True})
+    return {
+        'cursor': request.args.get('cursor'),
+        'limit': limit,
+        'sort': request.args.get('sort', 'date'),
+        'order': request.args.get('order', 'desc'),
+        'format': request.args.get('format') or None,
+        'resolution': request.args.get('resolution') or None,
+        'date_from': request.args.get('date_from') or None,
+        'date_to': request.args.get('date_to') or None,
+        'search': request.args.get('q') or None
+    }
 
 @app.route('/history')
 def history():
-    return render_template('history.html', history=download_history)
+    query_args = _history_query_args()
+    page = history_store.query(**query_args)
+    filters = {key: value for key, value in request.args.items() if key not in ('cursor', 'limit')}
+    return render_template(
+        'history.html',
+        history=page['items'],
+        next_cursor=page['next_cursor'],
+        filters=filters,
+        formats=HISTORY_FORMATS,
+        resolutions=HISTORY_RESOLUTIONS
+    )
+
+@app.route('/api/history')
+def history_api():
+    page = history_store.query(**_history_query_args())
+    return jsonify({'success': True, **page})
 
 @app.route('/clear-history', methods=['POST'])
 def clear_history():
-    download_history.clear()
+    history_store.clear()
     flash('Download history cleared', 'success')
     return redirect(url_for('history'))
 
 @app.route('/delete-history-item/<item_id>', methods=['POST'])
 def delete_history_item(item_id):
-    global download_history
-    download_history = [item for item in download_history if item['id'] != item_id]
+    history_store.delete(item_id)
     flash('History item deleted', 'success')
     return redirect(url_for('history'))
 
@@ -244,6 +289,7 @@ def batch_download():
     format_id = request.form.get('format_id', 'mp4')
     resolution = request.form.get('resolution', '720p')
     compression = request.form.get('compression', 'auto')
+    parallelism = request.form.get('parallelism', type=int)
     
     if not urls:
         return jsonify({'success': False, 'message': 'URLs are required'})
@@ -255,64 +301,90 @@ def batch_download():
         if not url_list:
             return jsonify({'success': False, 'message': 'No valid URLs provided'})
         
-        # Generate a unique ID for this batch
-        batch_id = str(uuid.uuid4())
-        
-        # In a real implementation, this would start a background task to download the videos
-        # For demo purposes, we'll simulate a batch download
-        batch_downloads[batch_id] = {
-            'urls': url_list,
-            'format_id': format_id,
-            'resolution': resolution,
-            'compression': compression,
-            'status': 'processing',
-            'total': len(url_list),
-            'completed': 0,
-            'failed': 0,
-            'start_time': time.time()
-        }
-        
-        return jsonify({'success': True, 'batch_id': batch_id})
+        download_dir = get_download_directory(request.headers.get('User-Agent'), user_settings)
+        result = features.batch_download(url_list, format_id, resolution, compression, download_dir,
+                                         parallelism=parallelism, owner=_client_id())
+        return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/batch-status/<batch_id>')
 def batch_status(batch_id):
-    if batch_id not in batch_downloads:
-        return jsonify({'success': False, 'message': 'Batch download not found'})
+    return jsonify(features.get_batch_status(batch_id))
+
+@app.route('/batch-events/<batch_id>')
+def batch_events(batch_id):
+    generator = features.stream_batch_progress(batch_id)
+    if generator is None:
+        return jsonify({'success': False, 'message': 'Batch download not found'}), 404
+    return _event_stream(generator)
+
+@app.route('/batch-process', methods=['POST'])
+def batch_process():
+    data = request.get_json(silent=True) or {}
+    files = data.get('files') or []
+    operations = data.get('operations') or []
     
-    # In a real implementation, this would check the actual batch status
-    # For demo purposes, we'll simulate progress
-    batch_info = batch_downloads[batch_id]
-    elapsed = time.time() - batch_info['start_time']
+    if not files or not operations:
+        return jsonify({'success': False, 'message': 'Files and operations are required'})
     
-    # Simulate batch progress
-    if batch_info['status'] == 'processing':
-        completed = min(int(elapsed), batch_info['total'])
-        batch_info['completed'] = completed
-        
-        if completed == batch_info['total']:
-            batch_info['status'] = 'completed'
+    # Only files inside the download directory can be processed
+    base_dir = os.path.realpath(get_download_directory(request.headers.get('User-Agent'), user_settings)['base'])
+    paths = []
+    for file in files:
+        path = os.path.realpath(os.path.join(base_dir, str(file)))
+        if os.path.commonpath([base_dir, path]) != base_dir:
+            return jsonify({'success': False, 'message': f'File is outside the download directory: {file}'})
+        paths.append(path)
     
-    return jsonify({'success': True, 'batch_info': batch_info})
+    return jsonify(features.batch_process(paths, operations, data.get('parallelism')))
+
+@app.route('/batch-process/<batch_id>')
+def batch_process_status(batch_id):
+    return jsonify(features.get_batch_process_status(batch_id))
+
+@app.route('/batch-process-events/<batch_id>')
+def batch_process_events(batch_id):
+    generator = features.stream_batch_process_progress(batch_id)
+    if generator is None:
+        return jsonify({'success': False, 'message': 'Batch not found'}), 404
+    return _event_stream(generator)
 
 @app.route('/schedule-download', methods=['POST'])
 def schedule_download():
-    # In a real implementation, this would schedule a download for later
-    # For demo purposes, we'll simulate scheduling
-    return jsonify({'success': True, 'message': 'Download scheduled'})
+    url = request.form.get('url')
+    format_id = request.form.get('format_id', 'mp4')
+    resolution = request.form.get('resolution', '720p')
+    compression = request.form.get('compression', 'auto')
+    scheduled_time = request.form.get('scheduled_time')
+    recurrence = request.form.get('recurrence')
+    
+    if not url or not (scheduled_time or recurrence):
+        return jsonify({'success': False, 'message': 'URL and a scheduled time or recurrence are required'})
+    
+    try:
+        scheduled_time = datetime.fromisoformat(scheduled_time) if scheduled_time else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid scheduled time'})
+    
+    try:
+        download_dir = get_download_directory(request.headers.get('User-Agent'), user_settings)
+        result = features.schedule_download(url, format_id, resolution, compression, download_dir, scheduled_time,
+                                            recurrence=recurrence, window=request.form.get('window'),
+                                            owner=_client_id())
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/scheduled-downloads')
 def scheduled_downloads():
-    # In a real implementation, this would show scheduled downloads
-    # For demo purposes, we'll return an empty list
-    return jsonify({'success': True, 'scheduled': []})
+    result = features.get_scheduled_downloads(request.args.get('limit', 100, type=int))
+    return jsonify({'success': True, 'scheduled': list(result['scheduled_downloads'].values()),
+                    'scheduler': result['scheduler']})
 
 @app.route('/cancel-scheduled/<download_id>', methods=['POST'])
 def cancel_scheduled(download_id):
-    # In a real implementation, this would cancel a scheduled download
-    # For demo purposes, we'll simulate cancellation
-    return jsonify({'success': True, 'message': 'Scheduled download cancelled'})
+    return jsonify(features.cancel_scheduled_download(download_id))
 
 @app.route('/trim-video', methods=['POST'])
 def trim_video():
@@ -340,9 +412,29 @@ def rename_file():
 
 @app.route('/download-playlist', methods=['POST'])
 def download_playlist():
-    # In a real implementation, this would download a playlist
-    # For demo purposes, we'll simulate playlist download
-    return jsonify({'success': True, 'message': 'Playlist download started'})
+    url = request.form.get('url')
+    if not url:
+        return jsonify({'success': False, 'message': 'URL is required'})
+    
+    try:
+        download_dir = get_download_directory(request.headers.get('User-Agent'), user_settings)
+        result = features.download_playlist(
+            url,
+            request.form.get('format_id', 'mp4'),
+            request.form.get('resolution', '720p'),
+            request.form.get('compression', 'auto'),
+            download_dir,
+            start=request.form.get('start', 1, type=int),
+            end=request.form.get('end', type=int),
+            step=request.form.get('step', 1, type=int),
+            cursor=request.form.get('cursor', type=int),
+            skip_downloaded=request.form.get('skip_downloaded', 'true').lower() != 'false',
+            parallelism=request.form.get('parallelism', type=int),
+            owner=_client_id()
+        )
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/encrypt-file', methods=['POST'])
 def encrypt_file():
@@ -0,0 +1,120 @@
+# TasVID YouTube Downloader - Bandwidth Shaping Module
+
+import re
+import time
+import threading
+from datetime import datetime
+
+from download_scheduler import TimeWindow
+from download_state import format_size
+
+RATE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(value):
+    """Get bytes per second from a number or a string such as '500K' or '2.5M', None for no limit"""
+    if value in (None, '', 0, '0'):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kmg]?)(i?b)?(/s)?\s*', str(value).lower())
+    if not match:
+        raise ValueError(f'invalid bandwidth limit: {value}')
+    rate = float(match.group(1)) * RATE_UNITS[match.group(2)]
+    return rate if rate > 0 else None
+
+
+class BandwidthShaper:
+    """Share a global download bandwidth limit between running downloads
+
+    Each download registers the params dict of its YoutubeDL, whose
+    'ratelimit' yt-dlp reads on every chunk, so allocations change while
+    downloads run. The limit is split evenly; downloads capped below their
+    share by a per-download limit hand the rest to the others. Shares are
+    recomputed when a download starts or finishes and when a time-of-day
+    profile begins or ends.
+    """
+    def __init__(self, limit=None, per_download_limit=None, profiles=None, check_interval=30):
+        self.limit = parse_rate(limit)
+        self.per_download_limit = parse_rate(per_download_limit)
+        # [(TimeWindow, limit)], the first matching window wins
+        self.profiles = [(TimeWindow(profile['window']), parse_rate(profile.get('limit')))
+                         for profile in (profiles or [])]
+        self.check_interval = check_interval
+
+        # download_id -> {'params': ydl.params, 'cap': bytes/s or None, 'allocated': bytes/s or None}
+        self._downloads = {}
+        self._lock = threading.Lock()
+        self._current_limit = self._effective_limit()
+
+        if self.profiles:
+            self._thread = threading.Thread(target=self._profile_loop, name='bandwidth-profiles')
+            self._thread.daemon = True
+            self._thread.start()
+
+    @property
+    def enabled(self):
+        """Check whether any limit is configured, shaped downloads cannot use aria2c"""
+        return bool(self.limit or self.per_download_limit or self.profiles)
+
+    def _effective_limit(self, now=None):
+        """Get the global limit in force at a time, from the first matching profile"""
+        now = now or datetime.now()
+        for window, limit in self.profiles:
+            if window.contains(now):
+                return limit
+        return self.limit
+
+    def acquire(self, download_id, params, limit=None):
+        """Start shaping a download through its YoutubeDL params, limit caps this download only"""
+        caps = [rate for rate in (parse_rate(limit), self.per_download_limit) if rate]
+        with self._lock:
+            self._downloads[download_id] = {'params': params, 'cap': min(caps) if caps else None, 'allocated': None}
+            self._rebalance()
+
+    def release(self, download_id):
+        """Stop shaping a download and give its share to the others"""
+        with self._lock:
+            if self._downloads.pop(download_id, None) is not None:
+                self._rebalance()
+
+    def _rebalance(self):
+        """Split the current limit over the downloads, the most tightly capped first"""
+        remaining = self._current_limit
+        downloads = sorted(self._downloads.values(), key=lambda entry: entry['cap'] or float('inf'))
+        for count, entry in zip(range(len(downloads), 0, -1), downloads):
+            share = remaining / count if remaining is not None else None
+            rates = [rate for rate in (share, entry['cap']) if rate]
+            allocated = min(rates) if rates else None
+            if remaining is not None:
+                remaining -= allocated
+            entry['allocated'] = allocated
+            entry['params']['ratelimit'] = allocated
+
+    def allocation(self, download_id):
+        """Get the bytes per second a download may use now, None when unlimited or not downloading"""
+        with self._lock:
+            entry = self._downloads.get(download_id)
+            return entry['allocated'] if entry else None
+
+    def _profile_loop(self):
+        """Apply the profile in force whenever it changes"""
+        while True:
+            time.sleep(self.check_interval)
+            limit = self._effective_limit()
+            with self._lock:
+                if limit != self._current_limit:
+                    self._current_limit = limit
+                    self._rebalance()
+
+    def get_stats(self):
+        """Get the limit in force and what each running download was given"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'limit': self._current_limit,
+                'limit_formatted': format_size(self._current_limit) + '/s' if self._current_limit else 'Unlimited',
+                'per_download_limit': self.per_download_limit,
+                'profiles': [{'window': window.spec, 'limit': limit} for window, limit in self.profiles],
+                'allocations': {download_id: entry['allocated'] for download_id, entry in self._downloads.items()}
+            }
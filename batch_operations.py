@@ -0,0 +1,127 @@
+# TasVID YouTube Downloader - Batch Operations Module
+
+import os
+
+import ffmpeg
+
+# Operations that become part of the single ffmpeg pass over a file
+FFMPEG_OPERATIONS = ('trim', 'volume', 'extract_audio')
+
+# Operations on the finished file, run in order after the ffmpeg pass
+FILE_OPERATIONS = ('rename', 'encrypt', 'decrypt')
+
+# Quality of re-encoded video when a chain trims accurately
+CHAIN_VIDEO_CRF = 18
+
+
+def validate_chain(operations):
+    """Check an operation chain, raising ValueError with the reason if invalid
+
+    Each operation is a dict with an 'op' name and its arguments, e.g.
+    {'op': 'trim', 'start': '00:01:00', 'end': '00:02:30'}. The ffmpeg
+    operations run as one pass, so they have to come before the file
+    operations and each may appear only once.
+    """
+    if not operations:
+        raise ValueError('no operations given')
+
+    seen = set()
+    file_stage = False
+    for operation in operations:
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op in FFMPEG_OPERATIONS:
+            if file_stage:
+                raise ValueError(f'{op} has to come before {", ".join(FILE_OPERATIONS)}')
+            if op in seen:
+                raise ValueError(f'{op} can only be used once per chain')
+        elif op in FILE_OPERATIONS:
+            file_stage = True
+        else:
+            raise ValueError(f'unknown operation: {op}')
+        seen.add(op)
+
+        if op == 'trim' and ('start' not in operation or 'end' not in operation):
+            raise ValueError('trim needs a start and an end')
+        if op == 'volume':
+            float(operation.get('factor', 1.0))
+        if op == 'rename':
+            name = operation.get('name')
+            if not name:
+                raise ValueError('rename needs a name')
+            if not is_plain_name(name):
+                raise ValueError('rename takes a file name, not a path')
+        if op in ('encrypt', 'decrypt') and not operation.get('password'):
+            raise ValueError(f'{op} needs a password')
+
+
+def is_plain_name(name):
+    """Check that a new file name cannot leave the directory of the file it renames"""
+    name = str(name)
+    separators = [sep for sep in (os.sep, os.altsep, '/') if sep]
+    return not (any(sep in name for sep in separators) or '..' in name or os.path.isabs(name))
+
+
+def split_chain(operations):
+    """Split a validated chain into its ffmpeg operations (by name) and file operations"""
+    ffmpeg_ops = {operation['op']: operation for operation in operations if operation['op'] in FFMPEG_OPERATIONS}
+    file_ops = [operation for operation in operations if operation['op'] in FILE_OPERATIONS]
+    return ffmpeg_ops, file_ops
+
+
+def chain_output_path(input_path, ffmpeg_ops):
+    """Get where the ffmpeg pass of a chain writes its result"""
+    name, ext = os.path.splitext(input_path)
+    extract = ffmpeg_ops.get('extract_audio')
+    if extract:
+        ext = '.' + extract.get('format', 'mp3')
+    return f'{name}_processed{ext}'
+
+
+def build_chain_stream(input_path, ffmpeg_ops, output_path, start, end, audio_codec, threads=None):
+    """Build one ffmpeg-python stream applying every ffmpeg operation of a chain
+
+    start and end are in seconds (None when not trimming). Trimming seeks
+    the input and re-encodes the video for frame accuracy unless the trim
+    asks for mode 'fast'; without a trim the video is copied. Audio filters
+    are chained in one filter graph, so no intermediate files are written.
+    """
+    input_args = {}
+    output_args = {}
+    if start is not None:
+        input_args['ss'] = start
+        output_args['t'] = end - start
+    source = ffmpeg.input(input_path, **input_args)
+
+    extract = ffmpeg_ops.get('extract_audio')
+    volume = ffmpeg_ops.get('volume')
+
+    audio = source['a']
+    if volume:
+        audio = audio.filter('volume', float(volume.get('factor', 1.0)))
+
+    if extract:
+        streams = [audio]
+        output_args['acodec'] = audio_codec
+        output_args['ab'] = f"{extract.get('quality', '192')}k"
+    elif volume:
+        # Optional video, the source may be audio only
+        streams = [source['v?'], audio]
+        output_args['acodec'] = 'aac' if os.path.splitext(output_path)[1].lower() in ('.mp4', '.m4v', '.mov') else None
+    else:
+        streams = [source]
+
+    if not extract:
+        trim = ffmpeg_ops.get('trim')
+        if trim and trim.get('mode', 'accurate') != 'fast':
+            output_args['crf'] = CHAIN_VIDEO_CRF
+        else:
+            output_args['vcodec'] = 'copy'
+            if not volume:
+                output_args['acodec'] = 'copy'
+    if threads:
+        output_args['threads'] = threads
+
+    output_args = {key: value for key, value in output_args.items() if value is not None}
+    return ffmpeg.output(*streams, output_path, **output_args).global_args(
+        '-progress', 'pipe:1', '-nostats', '-loglevel', 'error'
+    )
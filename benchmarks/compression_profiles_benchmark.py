@@ -0,0 +1,125 @@
+# TasVID YouTube Downloader - Compression Profiles Benchmark
+#
+# Encodes a sample video with every compression profile and records encode
+# speed, CPU time and output size. The results are written to the file the
+# app reads (COMPRESSION_BENCHMARK_FILE) and shown with each profile.
+#
+#   python benchmarks/compression_profiles_benchmark.py sample.mp4 [--output FILE] [--profiles fast,small]
+#
+# Run it on the production machine with a typical download as the sample,
+# numbers from other hardware or content do not carry over.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ffmpeg
+
+from compression_planner import expected_bitrate
+from compression_profiles import CompressionProfiles, available_encoders
+from transcode_executor import TranscodeExecutor
+
+
+def probe_sample(path):
+    """Get the duration in seconds and the video height of the sample"""
+    try:
+        probe = ffmpeg.probe(path)
+    except Exception:
+        return None, None
+    video = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'video'), {})
+    return float(probe['format'].get('duration') or 0) or None, video.get('height')
+
+
+def encode(executor, profiles, profile, sample, output, duration, height):
+    """Encode the sample with one profile, returns CPU seconds and wall seconds"""
+    bitrate = None
+    if profile['mode'] == 'two_pass':
+        # Same bitrate the app gives two-pass encodes at this resolution
+        bitrate = expected_bitrate(height, profiles.x264_crf(profile))
+    elif profile['mode'] == 'target_size':
+        bitrate = profiles.target_bitrate(profile, duration)
+
+    passlog = output + '.passlog'
+    cpu_seconds = 0.0
+    started = time.time()
+    for args in profiles.output_args(profile, executor.threads_per_job, bitrate):
+        if 'pass' in args:
+            args['passlogfile'] = passlog
+        target = os.devnull if args.get('f') == 'null' else output
+        job = executor.run(ffmpeg.input(sample).output(target, **args).overwrite_output(), name=profile['name'])
+        if job.returncode:
+            raise RuntimeError(job.stderr.decode(errors='replace').strip())
+        cpu_seconds += job.cpu_seconds
+    return cpu_seconds, time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure speed and size of the compression profiles')
+    parser.add_argument('sample', help='video file to encode')
+    parser.add_argument('--output', default=os.path.join('instance', 'compression_benchmark.json'),
+                        help='results file read by the app (default: instance/compression_benchmark.json)')
+    parser.add_argument('--profiles', help='comma separated profile names (default: all)')
+    parser.add_argument('--duration', type=float, help='sample duration in seconds when ffprobe is unavailable')
+    parser.add_argument('--height', type=int, help='sample height in pixels when ffprobe is unavailable')
+    args = parser.parse_args()
+
+    profiles = CompressionProfiles()
+    names = args.profiles.split(',') if args.profiles else list(profiles.profiles)
+    duration, height = probe_sample(args.sample)
+    duration = args.duration or duration
+    height = args.height or height
+    source_bytes = os.path.getsize(args.sample)
+    executor = TranscodeExecutor(max_jobs=1)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in names:
+            profile = profiles.resolve(name)
+            if profile.get('fallback_from'):
+                print(f'{name:<10} skipped, {profile["fallback_from"]} is not available in this ffmpeg')
+                continue
+
+            output = os.path.join(temp_dir, f'{name}.mp4')
+            try:
+                cpu_seconds, wall_seconds = encode(executor, profiles, profile, args.sample, output, duration, height)
+            except RuntimeError as e:
+                print(f'{name:<10} failed: {e}')
+                continue
+
+            output_bytes = os.path.getsize(output)
+            results[name] = {
+                'encoder': profile['encoder'],
+                'preset': profile['preset'],
+                'speed': round(duration / wall_seconds, 2) if duration else None,
+                'cpu_seconds_per_minute': round(cpu_seconds / duration * 60, 1) if duration else None,
+                'size_ratio': round(output_bytes / source_bytes, 3),
+                'bitrate_kbps': round(output_bytes * 8 / 1000 / duration) if duration else None
+            }
+            os.remove(output)
+
+    print(f'\nSample: {args.sample} ({source_bytes / 1024 / 1024:.1f} MB, {duration or 0:.0f} s), '
+          f'{os.cpu_count()} cores, encoders: {", ".join(sorted(available_encoders()))}')
+    print(f'{"profile":<10} {"encoder":<10} {"preset":<9} {"speed":>7} {"cpu s/min":>10} {"size":>7} {"kbps":>7}')
+    for name, result in results.items():
+        print(f'{name:<10} {result["encoder"]:<10} {result["preset"]:<9} {result["speed"] or 0:>6}x '
+              f'{result["cpu_seconds_per_minute"] or 0:>10} {result["size_ratio"]:>7.1%} {result["bitrate_kbps"] or 0:>7}')
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'sample': os.path.basename(args.sample),
+            'duration': duration,
+            'cpu_count': os.cpu_count(),
+            'measured_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'profiles': results
+        }, f, indent=2)
+    print(f'\nResults written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# TasVID YouTube Downloader - Download Strategy Benchmark
+#
+# Downloads files of several sizes from a local HTTP server with every
+# strategy DownloadStrategies can pick: yt-dlp over one connection, a split
+# over range requests (RangeDownloader, and aria2c when installed) and HLS
+# fragments fetched one or several at a time. The server throttles each
+# connection and delays each response, the way video hosts do, so the
+# table shows where splitting starts to pay off.
+#
+#   python benchmarks/download_strategy_benchmark.py [--sizes 1,4,16,64] [--rate 4M] [--latency 0.05]
+#
+# SEGMENT_MIN_BYTES, SEGMENT_TARGET_BYTES and FRAGMENT_CONCURRENCY in
+# download_strategy.py follow from these numbers.
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+
+from bandwidth import parse_rate
+from download_strategy import SEGMENT_TARGET_BYTES, RangeDownloader, aria2c_available, split_connections
+
+FRAGMENT_BYTES = 1024 * 1024
+
+
+class ThrottledHandler(SimpleHTTPRequestHandler):
+    """Serves files with byte ranges, each response delayed and rate limited"""
+    rate = None
+    latency = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        # Clients drop connections they no longer need
+        try:
+            super().handle()
+        except ConnectionError:
+            pass
+
+    def send_head(self):
+        time.sleep(self.latency)
+        path = self.translate_path(self.path.split('?')[0])
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if not os.path.isfile(path) or not match:
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, '_remaining', None)
+        started = time.monotonic()
+        sent = 0
+        while remaining is None or remaining > 0:
+            chunk = source.read(64 * 1024 if remaining is None else min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            sent += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+            if self.rate:
+                ahead = sent / self.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+def start_server(directory, rate, latency):
+    """Serve a directory on a free local port, returns the base URL"""
+    handler = type('Handler', (ThrottledHandler,), {'rate': rate, 'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), lambda *args: handler(*args, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def make_files(directory, sizes_mb):
+    """Write a file per size and an HLS playlist of 1 MB fragments for each"""
+    for size_mb in sizes_mb:
+        with open(os.path.join(directory, f'{size_mb}.mp4'), 'wb') as f:
+            f.write(os.urandom(size_mb * 1024 * 1024))
+
+        fragments = os.path.join(directory, f'{size_mb}_hls')
+        os.makedirs(fragments)
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+        for i in range(max(1, size_mb * 1024 * 1024 // FRAGMENT_BYTES)):
+            with open(os.path.join(fragments, f'{i}.ts'), 'wb') as f:
+                f.write(os.urandom(FRAGMENT_BYTES))
+            lines += ['#EXTINF:2.0,', f'{size_mb}_hls/{i}.ts']
+        with open(os.path.join(directory, f'{size_mb}.m3u8'), 'w') as f:
+            f.write('\n'.join(lines + ['#EXT-X-ENDLIST', '']))
+
+
+def ytdlp_download(url, path, protocol, **params):
+    """Download a URL with yt-dlp's downloader for a protocol, no extraction involved"""
+    info = {'id': 'bench', 'url': url, 'protocol': protocol, 'ext': 'mp4', 'http_headers': {}}
+    with yt_dlp.YoutubeDL(dict(params, quiet=True, noprogress=True, no_warnings=True)) as ydl:
+        if not ydl.dl(path, info):
+            raise RuntimeError(f'yt-dlp failed to download {url}')
+
+
+def timed(fn, path):
+    """Run a download into path and get its duration, the file is removed after"""
+    started = time.monotonic()
+    fn()
+    seconds = time.monotonic() - started
+    for leftover in (path, path + '.part', path + '.ytdl'):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare download strategies against a local throttled server')
+    parser.add_argument('--sizes', default='1,4,16,64', help='file sizes in MB, comma separated')
+    parser.add_argument('--rate', default='4M', help='throughput limit per connection, e.g. 4M, 0 for none')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds before each response starts')
+    args = parser.parse_args()
+
+    sizes_mb = [int(size) for size in args.sizes.split(',')]
+    rate = parse_rate(args.rate)
+    directory = tempfile.mkdtemp(prefix='strategy_benchmark_')
+    try:
+        make_files(directory, sizes_mb)
+        base_url = start_server(directory, rate, args.latency)
+        target = os.path.join(directory, 'out.mp4')
+
+        strategies = [
+            ('native', lambda url, size: ytdlp_download(url, target, 'http')),
+            ('ranges', lambda url, size: RangeDownloader(url, target, split_connections(size)).download()),
+            ('ranges x16', lambda url, size: RangeDownloader(url, target, 16).download()),
+        ]
+        if aria2c_available():
+            strategies.append(('aria2c', lambda url, size: ytdlp_download(
+                url, target, 'http', external_downloader={'http': 'aria2c'},
+                external_downloader_args={'aria2c': [f'--split={split_connections(size)}',
+                                                     f'--max-connection-per-server={split_connections(size)}',
+                                                     f'--min-split-size={SEGMENT_TARGET_BYTES // (1024 * 1024)}M']}
+            )))
+        else:
+            print('aria2c is not installed, skipping it')
+        for concurrency in (1, 4, 8):
+            strategies.append((f'hls x{concurrency}', lambda url, size, concurrency=concurrency: ytdlp_download(
+                url.replace('.mp4', '.m3u8'), target, 'm3u8_native', concurrent_fragment_downloads=concurrency
+            )))
+
+        print(f'per connection {args.rate}/s, {args.latency * 1000:.0f} ms latency, MB/s (seconds)')
+        print(f'{"size":>6} ' + ' '.join(f'{name:>16}' for name, _ in strategies))
+        for size_mb in sizes_mb:
+            url = f'{base_url}/{size_mb}.mp4'
+            size = size_mb * 1024 * 1024
+            cells = []
+            for name, download in strategies:
+                seconds = timed(lambda: download(url, size), target)
+                cells.append(f'{size_mb / seconds:7.1f} ({seconds:5.2f}s)')
+            print(f'{size_mb:>4}MB ' + ' '.join(f'{cell:>16}' for cell in cells))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# TasVID YouTube Downloader - Progress Hook Benchmark
+#
+# Measures the per-call cost of the yt-dlp progress hook. The legacy hook
+# below is the dict-based version it replaced, kept here for comparison.
+#
+#   python benchmarks/progress_hook_benchmark.py [calls]
+
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_state import DownloadState, format_size, format_eta
+from progress_stream import ProgressBroker
+from youtube_downloader import YouTubeDownloader
+
+
+def legacy_progress_hook(active_downloads, d, download_id):
+    """Dict-based hook that formatted every field on every call"""
+    if d['status'] == 'downloading':
+        active_downloads[download_id]['status'] = 'downloading'
+
+        total_bytes = d.get('total_bytes')
+        if total_bytes:
+            active_downloads[download_id]['total_bytes'] = total_bytes
+            active_downloads[download_id]['size'] = format_size(total_bytes)
+        else:
+            total_bytes = d.get('total_bytes_estimate')
+            if total_bytes:
+                active_downloads[download_id]['total_bytes'] = total_bytes
+                active_downloads[download_id]['size'] = format_size(total_bytes) + ' (est.)'
+
+        downloaded_bytes = d.get('downloaded_bytes', 0)
+        active_downloads[download_id]['downloaded_bytes'] = downloaded_bytes
+
+        if active_downloads[download_id]['total_bytes'] > 0:
+            progress = (downloaded_bytes / active_downloads[download_id]['total_bytes']) * 100
+            active_downloads[download_id]['progress'] = progress
+
+        speed = d.get('speed', 0)
+        if speed:
+            active_downloads[download_id]['speed'] = format_size(speed) + '/s'
+
+        eta = d.get('eta', 0)
+        if eta:
+            active_downloads[download_id]['eta'] = format_eta(eta)
+
+        filename = d.get('_filename')
+        if filename:
+            active_downloads[download_id]['output_path'] = filename
+
+
+def make_downloader():
+    """Build just enough of a YouTubeDownloader to run its progress hook"""
+    downloader = YouTubeDownloader.__new__(YouTubeDownloader)
+    downloader.active_downloads = {}
+    downloader.progress = ProgressBroker()
+    downloader.progress_publish_interval = 0.25
+    return downloader
+
+
+def make_event(i):
+    """A progress dict shaped like the ones yt-dlp passes to hooks"""
+    return {
+        'status': 'downloading',
+        'total_bytes': 250 * 1024 * 1024,
+        'downloaded_bytes': i * 16384,
+        'speed': 4.2 * 1024 * 1024 + i,
+        'eta': 120 - (i % 120),
+        '_filename': '/tmp/video.mp4'
+    }
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    events = [make_event(i) for i in range(1024)]
+
+    legacy_downloads = {'bench': {
+        'status': 'queued', 'progress': 0, 'filename': None, 'speed': '0 KB/s',
+        'eta': 'Unknown', 'size': 'Calculating...', 'downloaded_bytes': 0,
+        'total_bytes': 0, 'start_time': time.time(), 'output_path': None
+    }}
+    legacy_iter = iter(range(calls * 2))
+
+    def run_legacy():
+        legacy_progress_hook(legacy_downloads, events[next(legacy_iter) & 1023], 'bench')
+
+    downloader = make_downloader()
+    downloader.active_downloads['bench'] = DownloadState()
+    current_iter = iter(range(calls * 2))
+
+    def run_current():
+        downloader._progress_hook(events[next(current_iter) & 1023], 'bench')
+
+    results = {}
+    for name, fn in (('legacy dict hook', run_legacy), ('slots hook', run_current)):
+        seconds = min(timeit.repeat(fn, number=calls // 2, repeat=2))
+        results[name] = seconds / (calls // 2) * 1e9
+
+    print(f'{calls // 2} calls per run, best of 2')
+    for name, ns in results.items():
+        print(f'  {name:<18} {ns:8.0f} ns/call')
+
+    # Reading the status is where formatting happens now
+    state = downloader.active_downloads['bench']
+    read_ns = min(timeit.repeat(state.to_dict, number=calls // 10, repeat=2)) / (calls // 10) * 1e9
+    print(f'  {"status read":<18} {read_ns:8.0f} ns/call')
+
+
+if __name__ == '__main__':
+    main()
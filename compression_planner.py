@@ -0,0 +1,168 @@
+# TasVID YouTube Downloader - Compression Planner Module
+
+import os
+
+import ffmpeg
+
+# Rough libx264 video bitrate (kbps) at CRF 23, preset medium, for typical
+# YouTube content. Every 6 CRF steps roughly halves or doubles the bitrate.
+CRF23_BITRATES = {
+    2160: 16000,
+    1440: 8000,
+    1080: 4500,
+    720: 2500,
+    480: 1200,
+    360: 700,
+    240: 400,
+    144: 200
+}
+
+# Codecs that need fewer bits than H.264 for the same quality
+EFFICIENT_CODECS = ('hevc', 'h265', 'vp9', 'av1')
+
+# Codecs mp4 can hold without re-encoding
+MP4_VIDEO_CODECS = ('h264', 'hevc', 'vp9', 'av1')
+MP4_AUDIO_CODECS = ('aac', 'mp3', 'opus', 'ac3', 'eac3', 'alac', 'flac')
+
+# Sources within this factor of the target bitrate are not worth re-encoding
+BITRATE_TOLERANCE = 1.1
+
+
+def expected_bitrate(height, crf):
+    """Estimate the libx264 video bitrate in kbps for a resolution and CRF"""
+    height = height or 720
+    base = CRF23_BITRATES[144]
+    for lines in sorted(CRF23_BITRATES):
+        if height >= lines:
+            base = CRF23_BITRATES[lines]
+    return base * 2 ** ((23 - crf) / 6)
+
+
+def normalize_codec(codec):
+    """Map ffprobe codec names and yt-dlp codec strings to one name"""
+    codec = (codec or '').lower()
+    if codec.startswith(('avc', 'h264')):
+        return 'h264'
+    if codec.startswith(('hev', 'hvc', 'h265', 'hevc')):
+        return 'hevc'
+    if codec.startswith('vp09') or codec.startswith('vp9'):
+        return 'vp9'
+    if codec.startswith(('av01', 'av1')):
+        return 'av1'
+    if codec.startswith('mp4a'):
+        return 'aac'
+    return codec.split('.')[0] or None
+
+
+def probe_source(file_path):
+    """Describe a downloaded file's streams with ffprobe"""
+    probe = ffmpeg.probe(file_path)
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    container = os.path.splitext(file_path)[1].lstrip('.').lower()
+    if not video:
+        return {'container': container, 'video': False}
+
+    fmt = probe.get('format', {})
+    duration = float(fmt.get('duration') or 0)
+
+    # Matroska and WebM often only report the overall bitrate
+    bitrate = int(video.get('bit_rate') or 0)
+    if not bitrate:
+        total = int(fmt.get('bit_rate') or 0)
+        if not total and duration:
+            total = int(fmt.get('size') or 0) * 8 / duration
+        bitrate = total - int((audio or {}).get('bit_rate') or 0) if total else 0
+
+    return {
+        'container': container,
+        'video': True,
+        'codec': normalize_codec(video.get('codec_name')),
+        'audio_codec': normalize_codec(audio.get('codec_name')) if audio else None,
+        'bitrate': bitrate / 1000 if bitrate else None,
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'duration': duration or None
+    }
+
+
+def source_from_formats(formats):
+    """Describe the formats yt-dlp selected, before anything is downloaded"""
+    # yt-dlp uses 'none' for a missing stream and None for an unknown codec
+    video = next((f for f in formats if f.get('vcodec') != 'none'), None)
+    audio = next((f for f in formats if f.get('acodec') != 'none'), None)
+    if not video:
+        return {'container': None, 'video': False}
+
+    # vbr is the video-only bitrate, tbr includes audio for muxed formats
+    bitrate = video.get('vbr') or video.get('tbr')
+    if bitrate and not video.get('vbr') and audio is video and audio.get('abr'):
+        bitrate -= audio['abr']
+
+    return {
+        'container': 'mp4' if len(formats) > 1 else video.get('ext'),
+        'video': True,
+        'codec': normalize_codec(video.get('vcodec')),
+        'audio_codec': normalize_codec(audio.get('acodec')) if audio else None,
+        'bitrate': bitrate,
+        'width': video.get('width'),
+        'height': video.get('height')
+    }
+
+
+def plan_compression(source, crf, efficiency=1.0, target_kbps=None):
+    """Decide between skipping, remuxing and re-encoding a download
+
+    crf is on the libx264 scale and efficiency is the target encoder's
+    bitrate relative to libx264. target_kbps replaces the estimate when the
+    output bitrate is fixed, e.g. for a target file size.
+
+    Returns a dict with the 'action' ('skip', 'remux' or 'encode'), a
+    human-readable 'reason' and the bitrates the decision was based on.
+    """
+    codec = source.get('codec')
+    bitrate = source.get('bitrate')
+    target = target_kbps or expected_bitrate(source.get('height'), crf) * efficiency
+
+    plan = {
+        'action': 'encode',
+        'crf': crf,
+        'source_codec': codec,
+        'source_bitrate': round(bitrate) if bitrate else None,
+        'target_bitrate': round(target)
+    }
+
+    if not source.get('video'):
+        plan['reason'] = 'no video stream found'
+        plan['action'] = 'skip'
+        return plan
+    if not codec or not bitrate:
+        plan['reason'] = 'source codec or bitrate unknown'
+        return plan
+
+    if bitrate > target * BITRATE_TOLERANCE:
+        plan['reason'] = f'{codec} at {round(bitrate)} kbps exceeds the {round(target)} kbps target'
+        return plan
+
+    # Re-encoding cannot make a stream smaller without losing quality once it
+    # is already at or below what libx264 would produce at this CRF
+    if codec == 'h264':
+        plan['reason'] = f'H.264 at {round(bitrate)} kbps is already below the {round(target)} kbps target'
+    elif codec in EFFICIENT_CODECS:
+        plan['reason'] = f'{codec.upper()} at {round(bitrate)} kbps would grow as H.264'
+    else:
+        plan['reason'] = f'{codec} is converted to H.264'
+        return plan
+
+    # Only the container is wrong, copy the streams into mp4
+    audio_codec = source.get('audio_codec')
+    if source.get('container') != 'mp4' and codec in MP4_VIDEO_CODECS and (
+            not audio_codec or audio_codec in MP4_AUDIO_CODECS):
+        plan['action'] = 'remux'
+    elif source.get('container') == 'mp4':
+        plan['action'] = 'skip'
+    else:
+        plan['action'] = 'encode'
+        plan['reason'] += ', but its streams cannot be copied into mp4'
+    return plan
@@ -0,0 +1,216 @@
+# TasVID YouTube Downloader - Compression Profiles Module
+
+import os
+import json
+import subprocess
+
+# Encoders a profile can use. CRF scales differ per encoder, crf_offset maps
+# an encoder CRF back to the libx264 scale and efficiency is the bitrate it
+# needs relative to libx264 for about the same quality.
+ENCODERS = {
+    'libx264': {
+        'presets': ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow'],
+        'crf_offset': 0,
+        'efficiency': 1.0
+    },
+    'libx265': {
+        'presets': ['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow'],
+        'crf_offset': 5,
+        'efficiency': 0.6
+    },
+    'libsvtav1': {
+        # SVT-AV1 presets are numbers, lower is slower and smaller
+        'presets': ['12', '10', '8', '6', '4'],
+        'crf_offset': 12,
+        'efficiency': 0.5
+    }
+}
+
+# Built-in profiles, operators can add or override them with COMPRESSION_PROFILES
+DEFAULT_PROFILES = {
+    'fast': {
+        'description': 'H.264, fastest useful preset',
+        'encoder': 'libx264', 'preset': 'veryfast', 'crf': 23
+    },
+    'balanced': {
+        'description': 'H.264, default speed and size',
+        'encoder': 'libx264', 'preset': 'medium', 'crf': 23
+    },
+    'small': {
+        'description': 'H.264, slower preset and higher CRF for smaller files',
+        'encoder': 'libx264', 'preset': 'slow', 'crf': 28
+    },
+    'quality': {
+        'description': 'H.264, near-transparent quality',
+        'encoder': 'libx264', 'preset': 'slow', 'crf': 18, 'tune': 'film'
+    },
+    'two-pass': {
+        'description': 'H.264 two-pass at the bitrate libx264 reaches at CRF 23',
+        'encoder': 'libx264', 'preset': 'medium', 'crf': 23, 'mode': 'two_pass'
+    },
+    'hevc': {
+        'description': 'H.265, roughly 40% smaller than H.264 at a much higher CPU cost',
+        'encoder': 'libx265', 'preset': 'medium', 'crf': 28
+    },
+    'av1': {
+        'description': 'AV1 (SVT-AV1), smallest files, needs an ffmpeg built with libsvtav1',
+        'encoder': 'libsvtav1', 'preset': '8', 'crf': 35
+    }
+}
+
+# Compression levels accepted before profiles existed, mapped to a CRF
+LEGACY_LEVELS = {
+    'high': 18,
+    'medium': 23,
+    'low': 28
+}
+
+# 'auto' picks a faster libx264 preset as the transcode queue fills up,
+# keyed by the highest load (running + queued jobs per slot) it applies to
+AUTO_PRESETS = [
+    (0.5, 'medium'),
+    (1.0, 'fast'),
+    (2.0, 'veryfast'),
+    (float('inf'), 'ultrafast')
+]
+
+# Audio bitrate assumed when sizing a target-size encode
+TARGET_SIZE_AUDIO_KBPS = 128
+
+_available_encoders = None
+
+
+def available_encoders():
+    """Get the video encoders of the installed ffmpeg, checked once"""
+    global _available_encoders
+    if _available_encoders is None:
+        try:
+            output = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-encoders'],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30
+            ).stdout.decode(errors='replace')
+            _available_encoders = {name for name in ENCODERS if f' {name} ' in output}
+        except (OSError, subprocess.SubprocessError):
+            _available_encoders = set()
+    return _available_encoders
+
+
+class CompressionProfiles:
+    """Resolve compression choices to encoder settings
+
+    A compression value is 'none', 'auto', a legacy level (high, medium,
+    low), a CRF number, a profile name or 'size:<MB>' for a target file
+    size. Measured speed and size per profile are read from the benchmark
+    file written by benchmarks/compression_profiles_benchmark.py.
+    """
+    def __init__(self, profiles=None, benchmark_file=None):
+        self.profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+        for name, profile in (profiles or {}).items():
+            self.profiles[name] = dict(self.profiles.get(name, {}), **profile)
+        self.benchmark_file = benchmark_file
+
+    def resolve(self, compression, load=0.0):
+        """Get the profile dict for a compression value, or None for no compression"""
+        compression = str(compression or 'none').strip().lower()
+        if compression == 'none':
+            return None
+
+        if compression == 'auto':
+            preset = next(preset for limit, preset in AUTO_PRESETS if load <= limit)
+            profile = {'encoder': 'libx264', 'preset': preset, 'crf': 23}
+        elif compression in LEGACY_LEVELS:
+            profile = {'encoder': 'libx264', 'preset': 'medium', 'crf': LEGACY_LEVELS[compression]}
+        elif compression.startswith('size:'):
+            try:
+                size_mb = float(compression[5:].rstrip('m'))
+            except ValueError:
+                size_mb = 0
+            if size_mb <= 0:
+                return self.resolve('balanced')
+            profile = {'encoder': 'libx264', 'preset': 'medium', 'crf': 23, 'mode': 'target_size',
+                       'size_mb': size_mb}
+        elif compression in self.profiles:
+            profile = dict(self.profiles[compression])
+        else:
+            try:
+                crf = min(max(int(compression), 0), 51)
+            except ValueError:
+                crf = 23
+            profile = {'encoder': 'libx264', 'preset': 'medium', 'crf': crf}
+
+        profile['name'] = compression
+        profile.setdefault('mode', 'crf')
+
+        # Fall back to libx264 when ffmpeg was built without the encoder
+        encoder = profile.get('encoder', 'libx264')
+        if encoder != 'libx264' and encoder not in available_encoders():
+            profile['fallback_from'] = encoder
+            profile['encoder'] = 'libx264'
+            profile['crf'] = profile['crf'] - ENCODERS.get(encoder, ENCODERS['libx264'])['crf_offset']
+            if profile.get('preset') not in ENCODERS['libx264']['presets']:
+                profile['preset'] = 'medium'
+
+        # Two-pass and target-size rate control are only wired up for libx264
+        if profile['mode'] != 'crf' and profile['encoder'] != 'libx264':
+            profile['mode'] = 'crf'
+
+        return profile
+
+    def x264_crf(self, profile):
+        """Get the libx264-scale CRF a profile is comparable to"""
+        return profile['crf'] - ENCODERS.get(profile['encoder'], ENCODERS['libx264'])['crf_offset']
+
+    def efficiency(self, profile):
+        """Get the bitrate a profile's encoder needs relative to libx264"""
+        return ENCODERS.get(profile['encoder'], ENCODERS['libx264'])['efficiency']
+
+    def target_bitrate(self, profile, duration):
+        """Get the video bitrate in kbps for a target-size profile, or None"""
+        if profile.get('mode') != 'target_size' or not duration:
+            return None
+        total_kbps = profile['size_mb'] * 8 * 1024 / duration
+        return max(total_kbps - TARGET_SIZE_AUDIO_KBPS, 50)
+
+    def output_args(self, profile, threads=None, bitrate=None):
+        """Get ffmpeg output arguments for each pass of a profile
+
+        Returns one dict per pass; two-pass encodes first write a stats
+        file and no output. bitrate (kbps) is required for two-pass and
+        target-size profiles.
+        """
+        args = {'vcodec': profile['encoder'], 'preset': profile['preset']}
+        if profile.get('tune'):
+            args['tune'] = profile['tune']
+        if profile['encoder'] == 'libx265':
+            # Apple players only accept HEVC in mp4 with the hvc1 tag
+            args['tag:v'] = 'hvc1'
+        if threads:
+            args['threads'] = threads
+
+        if profile.get('mode') in ('two_pass', 'target_size') and bitrate:
+            video_bitrate = f'{int(bitrate)}k'
+            return [
+                dict(args, **{'b:v': video_bitrate, 'pass': 1, 'an': None, 'f': 'null'}),
+                dict(args, **{'b:v': video_bitrate, 'pass': 2})
+            ]
+
+        return [dict(args, crf=profile['crf'])]
+
+    def measurements(self):
+        """Get the measured speed and size per profile, if a benchmark was run"""
+        if not self.benchmark_file or not os.path.exists(self.benchmark_file):
+            return {}
+        try:
+            with open(self.benchmark_file, 'r') as f:
+                return json.load(f).get('profiles', {})
+        except (OSError, ValueError):
+            return {}
+
+    def describe(self):
+        """List the profiles with their settings and any measured numbers"""
+        measured = self.measurements()
+        return {
+            name: dict(profile, available=profile['encoder'] == 'libx264' or profile['encoder'] in available_encoders(),
+                       measured=measured.get(name))
+            for name, profile in self.profiles.items()
+        }
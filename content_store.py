@@ -0,0 +1,286 @@
+# TasVID YouTube Downloader - Content Store Module
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Get the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, target):
+    """Hardlink source to target, copying when they are on different filesystems"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class ContentStore:
+    """Content-addressed store for finished downloads with LRU garbage collection
+
+    Objects are hardlinks to the delivered files, so a download is only
+    stored when its directory is on the store's filesystem; a copy would
+    double the disk use instead of saving it. Eviction only ever deletes
+    the store's own link, never a file delivered to a user, so the size cap
+    only covers objects whose delivered files are all gone.
+    """
+    def __init__(self, store_dir, max_bytes=20 * 1024 * 1024 * 1024, gc_interval=60):
+        self.store_dir = store_dir
+        self.objects_dir = os.path.join(store_dir, 'objects')
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._last_gc = None
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._device = os.stat(self.objects_dir).st_dev
+        # directory -> whether it is on the store's filesystem
+        self._same_device = {}
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(store_dir, 'index.db'), check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS objects (
+                hash TEXT PRIMARY KEY, path TEXT, size INTEGER, mtime REAL,
+                last_access REAL, metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, hash TEXT);
+            CREATE TABLE IF NOT EXISTS refs (path TEXT PRIMARY KEY, hash TEXT);
+            CREATE INDEX IF NOT EXISTS idx_objects_last_access ON objects (last_access);
+            CREATE INDEX IF NOT EXISTS idx_refs_hash ON refs (hash);
+        ''')
+        self._db.commit()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+        # Bytes only the store holds, as of the last collection
+        self.exclusive_bytes = 0
+
+    def _key(self, key):
+        """Serialize a key tuple"""
+        return json.dumps(list(key)) if isinstance(key, (list, tuple)) else str(key)
+
+    def lookup(self, key):
+        """Find a verified stored object for a key, or None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT o.hash, o.path, o.size, o.mtime, o.metadata FROM keys k '
+                'JOIN objects o ON o.hash = k.hash WHERE k.key = ?',
+                (self._key(key),)
+            ).fetchone()
+
+            if not row:
+                self.misses += 1
+                return None
+
+            object_hash, path, size, mtime, metadata = row
+            if not self._verify(object_hash, path, size, mtime):
+                self._drop_object(object_hash)
+                self.misses += 1
+                return None
+
+            self._db.execute('UPDATE objects SET last_access = ? WHERE hash = ?', (time.time(), object_hash))
+            self._db.commit()
+            self.hits += 1
+
+            return {
+                'hash': object_hash,
+                'path': path,
+                'size': size,
+                'metadata': json.loads(metadata or '{}')
+            }
+
+    def _verify(self, object_hash, path, size, mtime):
+        """Check a stored object still matches its hash"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+
+        if stat.st_size != size:
+            return False
+
+        # Only re-hash when the file was touched since it was stored
+        if stat.st_mtime != mtime:
+            if hash_file(path) != object_hash:
+                return False
+            self._db.execute('UPDATE objects SET mtime = ? WHERE hash = ?', (stat.st_mtime, object_hash))
+
+        return True
+
+    def storable(self, file_path):
+        """Check whether a file can be stored as a hardlink, once per directory"""
+        directory = os.path.dirname(os.path.abspath(file_path))
+        same = self._same_device.get(directory)
+        if same is None:
+            try:
+                same = os.stat(directory).st_dev == self._device
+            except OSError:
+                return False
+            self._same_device[directory] = same
+        return same
+
+    def put(self, key, file_path, metadata=None):
+        """Store a finished download, file_path stays in place as a reference
+
+        Returns the object hash, or None when the file is on another
+        filesystem than the store and is not stored.
+        """
+        if not self.storable(file_path):
+            self.skipped += 1
+            return None
+
+        object_hash = hash_file(file_path)
+        ext = os.path.splitext(file_path)[1]
+        object_path = os.path.join(self.objects_dir, object_hash[:2], object_hash + ext)
+
+        with self._lock:
+            existing = self._db.execute('SELECT path FROM objects WHERE hash = ?', (object_hash,)).fetchone()
+
+            if existing and os.path.exists(existing[0]):
+                # Identical content is already stored - share it
+                object_path = existing[0]
+                self._replace_with_link(object_path, file_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                if os.path.exists(object_path):
+                    os.remove(object_path)
+                link_or_copy(file_path, object_path)
+
+            stat = os.stat(object_path)
+            self._db.execute(
+                'INSERT OR REPLACE INTO objects (hash, path, size, mtime, last_access, metadata) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (object_hash, object_path, stat.st_size, stat.st_mtime, time.time(), json.dumps(metadata or {}))
+            )
+            self._db.execute('INSERT OR REPLACE INTO keys (key, hash) VALUES (?, ?)', (self._key(key), object_hash))
+            self._db.execute('INSERT OR REPLACE INTO refs (path, hash) VALUES (?, ?)', (file_path, object_hash))
+            self._db.commit()
+
+        # Collecting stats every object, so it runs at most once per interval
+        if self._last_gc is None or time.monotonic() - self._last_gc >= self.gc_interval:
+            self.collect_garbage()
+        return object_hash
+
+    def _replace_with_link(self, object_path, file_path):
+        """Swap a duplicate file for a link to the stored object"""
+        temp_path = file_path + '.link'
+        try:
+            link_or_copy(object_path, temp_path)
+            os.replace(temp_path, file_path)
+        except OSError as e:
+            print(f"Error linking duplicate download: {str(e)}")
+
+    def deliver(self, object_hash, target_path):
+        """Make a stored object available at target_path and count the reference"""
+        with self._lock:
+            row = self._db.execute('SELECT path FROM objects WHERE hash = ?', (object_hash,)).fetchone()
+            if not row:
+                return None
+
+            if not os.path.exists(target_path):
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                link_or_copy(row[0], target_path)
+
+            self._db.execute('INSERT OR REPLACE INTO refs (path, hash) VALUES (?, ?)', (target_path, object_hash))
+            self._db.execute('UPDATE objects SET last_access = ? WHERE hash = ?', (time.time(), object_hash))
+            self._db.commit()
+            return target_path
+
+    def release(self, path):
+        """Forget a reference, e.g. after the delivered file was renamed or deleted"""
+        with self._lock:
+            self._db.execute('DELETE FROM refs WHERE path = ?', (path,))
+            self._db.commit()
+
+    def move_reference(self, old_path, new_path):
+        """Keep a reference when the delivered file is renamed or moved"""
+        with self._lock:
+            self._db.execute('UPDATE refs SET path = ? WHERE path = ?', (new_path, old_path))
+            self._db.commit()
+
+    def _drop_object(self, object_hash):
+        """Delete a stored object, files delivered from it stay where they are"""
+        row = self._db.execute('SELECT path FROM objects WHERE hash = ?', (object_hash,)).fetchone()
+        if row:
+            try:
+                os.remove(row[0])
+            except OSError:
+                pass
+
+        self._db.execute('DELETE FROM objects WHERE hash = ?', (object_hash,))
+        self._db.execute('DELETE FROM keys WHERE hash = ?', (object_hash,))
+        self._db.execute('DELETE FROM refs WHERE hash = ?', (object_hash,))
+        self._db.commit()
+
+    def collect_garbage(self):
+        """Evict least recently used objects until the bytes only the store holds fit its size cap
+
+        An object still linked from a delivered file frees no disk space when
+        its own link goes, so it neither counts toward the cap nor is evicted.
+        """
+        self._last_gc = time.monotonic()
+        if not self.max_bytes:
+            return 0
+
+        with self._lock:
+            rows = self._db.execute('SELECT hash, path FROM objects ORDER BY last_access').fetchall()
+
+        # Stat without the lock so lookups and puts carry on meanwhile
+        exclusive = []
+        for object_hash, path in rows:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_nlink == 1:
+                exclusive.append((object_hash, path, stat.st_size))
+        total = sum(size for _, _, size in exclusive)
+
+        evicted = 0
+        with self._lock:
+            for object_hash, path, size in exclusive:
+                if total <= self.max_bytes:
+                    break
+                # Skip objects delivered again since they were looked at
+                try:
+                    if os.stat(path).st_nlink != 1:
+                        continue
+                except OSError:
+                    continue
+                self._drop_object(object_hash)
+                total -= size
+                evicted += 1
+
+        self.exclusive_bytes = total
+        self.evictions += evicted
+        return evicted
+
+    def get_stats(self):
+        """Get object counts, size and hit/miss counters"""
+        with self._lock:
+            objects, total = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+            refs = self._db.execute('SELECT COUNT(*) FROM refs').fetchone()[0]
+            return {
+                'objects': objects,
+                'references': refs,
+                'bytes': total,
+                'exclusive_bytes': self.exclusive_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'skipped': self.skipped
+            }
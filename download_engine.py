@@ -0,0 +1,373 @@
+# TasVID YouTube Downloader - Download Engine Module
+
+import os
+import time
+import uuid
+import heapq
+import itertools
+import threading
+
+# Priority lanes - lower values are served first
+PRIORITY_LANES = {
+    'interactive': 0,  # Single downloads started from the UI
+    'batch': 1,        # Batch and playlist items
+    'scheduled': 2     # Scheduled downloads
+}
+
+
+class EngineSaturated(Exception):
+    """Raised when a pool queue is full and the overflow policy rejects new work"""
+    pass
+
+
+class Job:
+    """A unit of work submitted to a worker pool"""
+    def __init__(self, pool_name, fn, args, kwargs, priority='interactive', job_id=None, owner=None, weight=1.0):
+        self.job_id = job_id or str(uuid.uuid4())
+        self.pool_name = pool_name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        # Client the job runs for, its share of the pool follows its weight
+        self.owner = owner
+        self.weight = weight
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def done(self):
+        """Check whether the job has finished"""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes, returns False on timeout"""
+        return self._done.wait(timeout)
+
+
+class WorkerPool:
+    """Fixed number of worker threads fed from a bounded priority queue
+
+    Lanes are served strictly in priority order. Within a lane, owners
+    share the workers by weighted fair queuing: each job gets a virtual
+    finish time one 1/weight step after its owner's previous job, so a
+    client with hundreds of queued jobs is interleaved with one that has
+    a single job instead of going first. owner_limit caps the jobs one
+    owner runs at once, and reserved workers only take interactive jobs.
+    """
+    def __init__(self, name, workers, max_queue, owner_limit=None, reserved=0):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.owner_limit = max(1, int(owner_limit)) if owner_limit else None
+        self.reserved = min(max(0, int(reserved)), self.workers - 1)
+
+        # (lane, virtual finish, sequence, job)
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+
+        # Fair queuing state: virtual time and last finish time per owner
+        self._virtual_time = 0.0
+        self._finish = {}
+        self._running_by_owner = {}
+        self._background_busy = 0
+
+        # Statistics
+        self.busy = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.time()
+
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'{name}-worker-{i}')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job, block=False, timeout=None):
+        """Queue a job, either rejecting or waiting when the queue is full"""
+        lane = PRIORITY_LANES.get(job.priority, PRIORITY_LANES['interactive'])
+
+        with self._cond:
+            if self.max_queue:
+                deadline = time.time() + timeout if timeout else None
+                while len(self._heap) >= self.max_queue:
+                    if not block:
+                        self.rejected += 1
+                        raise EngineSaturated(f'{self.name} queue is full ({self.max_queue} jobs waiting)')
+
+                    remaining = deadline - time.time() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise EngineSaturated(f'{self.name} queue is still full after {timeout} seconds')
+                    self._cond.wait(remaining)
+
+            finish = max(self._virtual_time, self._finish.get(job.owner, 0.0)) + 1.0 / max(job.weight, 0.01)
+            self._finish[job.owner] = finish
+            if len(self._finish) > 1000:
+                # Owners behind the virtual time start from it anyway
+                self._finish = {owner: tag for owner, tag in self._finish.items() if tag > self._virtual_time}
+
+            heapq.heappush(self._heap, (lane, finish, next(self._counter), job))
+            self.submitted += 1
+            self._cond.notify_all()
+
+        return job
+
+    def _eligible(self, lane, job):
+        """Check whether a job may start now under the owner cap and the interactive reserve"""
+        if lane and self._background_busy >= self.workers - self.reserved:
+            return False
+        if self.owner_limit and job.owner is not None:
+            return self._running_by_owner.get(job.owner, 0) < self.owner_limit
+        return True
+
+    def _take(self):
+        """Pop the first job that may start now, or None"""
+        skipped = []
+        taken = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._eligible(entry[0], entry[3]):
+                taken = entry
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return taken
+
+    def _worker_loop(self):
+        """Pull jobs off the queue and run them until the pool is shut down"""
+        while True:
+            with self._cond:
+                entry = None
+                while self._running:
+                    entry = self._take()
+                    if entry:
+                        break
+                    self._cond.wait()
+
+                if not self._running:
+                    return
+
+                lane, finish, _, job = entry
+                self._virtual_time = max(self._virtual_time, finish - 1.0 / max(job.weight, 0.01))
+                self.busy += 1
+                if lane:
+                    self._background_busy += 1
+                self._running_by_owner[job.owner] = self._running_by_owner.get(job.owner, 0) + 1
+                # Wake up any submitter waiting for room in the queue
+                self._cond.notify_all()
+
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                job.result = job.fn(*job.args, **job.kwargs)
+                job.status = 'completed'
+            except Exception as e:
+                print(f"Error in {self.name} job {job.job_id}: {str(e)}")
+                job.error = str(e)
+                job.status = 'error'
+            finally:
+                job.finished_at = time.time()
+                with self._cond:
+                    self.busy -= 1
+                    if lane:
+                        self._background_busy -= 1
+                    self._running_by_owner[job.owner] -= 1
+                    if not self._running_by_owner[job.owner]:
+                        del self._running_by_owner[job.owner]
+                    self.busy_seconds += job.finished_at - job.started_at
+                    # Jobs held back by a cap may be able to start now
+                    self._cond.notify_all()
+                    if job.status == 'completed':
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                job._done.set()
+
+    def queue_depth(self):
+        """Get number of jobs waiting per priority lane"""
+        with self._cond:
+            depth = {lane: 0 for lane in PRIORITY_LANES}
+            lane_names = {value: name for name, value in PRIORITY_LANES.items()}
+            for lane, _, _, _ in self._heap:
+                depth[lane_names.get(lane, 'interactive')] += 1
+            return depth
+
+    def get_stats(self):
+        """Get queue depth and worker utilisation for this pool"""
+        depth = self.queue_depth()
+
+        with self._cond:
+            uptime = max(time.time() - self.started_at, 1e-6)
+            return {
+                'workers': self.workers,
+                'busy_workers': self.busy,
+                'utilisation': self.busy / self.workers,
+                'average_utilisation': min(self.busy_seconds / (uptime * self.workers), 1.0),
+                'queue_depth': sum(depth.values()),
+                'queue_depth_by_lane': depth,
+                'max_queue': self.max_queue,
+                'owner_limit': self.owner_limit,
+                'reserved_interactive': self.reserved,
+                'running_owners': len([owner for owner in self._running_by_owner if owner is not None]),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self):
+        """Stop the workers once they finish their current job"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+
+class DownloadEngine:
+    """Bounded worker pools for downloads, post-processing, batch coordination and analyses"""
+    def __init__(self, app_config):
+        self.app_config = app_config
+
+        # Downloads default to MAX_CONCURRENT_DOWNLOADS from the environment
+        download_workers = app_config.get('DOWNLOAD_WORKERS') or os.environ.get('MAX_CONCURRENT_DOWNLOADS', 3)
+        queue_size = app_config.get('DOWNLOAD_QUEUE_SIZE', 100)
+
+        # 'reject' fails immediately when a queue is full, 'queue' waits for room
+        self.overflow_policy = app_config.get('ENGINE_OVERFLOW_POLICY', 'reject')
+        self.submit_timeout = app_config.get('ENGINE_SUBMIT_TIMEOUT', 30)
+
+        # One client runs at most MAX_DOWNLOADS_PER_USER downloads at once and
+        # INTERACTIVE_RESERVED_WORKERS download workers stay free of batch
+        # and scheduled work, so single downloads start quickly during bulk runs
+        owner_limit = app_config.get('MAX_DOWNLOADS_PER_USER') or os.environ.get('MAX_DOWNLOADS_PER_USER', 2)
+        reserved = app_config.get('INTERACTIVE_RESERVED_WORKERS', 1)
+        # Relative shares of clients under fair queuing, 1 when not listed
+        self.weights = app_config.get('USER_WEIGHTS') or {}
+
+        self.pools = {
+            'download': WorkerPool('download', download_workers, queue_size, owner_limit=owner_limit,
+                                   reserved=reserved),
+            'postprocess': WorkerPool('postprocess', app_config.get('POSTPROCESS_WORKERS', 2), queue_size),
+            'batch': WorkerPool('batch', app_config.get('BATCH_WORKERS', 2), queue_size),
+            # Analyses are short and many wait at once, so their queue is longer
+            'analyze': WorkerPool('analyze', app_config.get('ANALYZE_WORKERS', 4),
+                                  app_config.get('ANALYZE_QUEUE_SIZE', 1000))
+        }
+
+    def submit(self, pool_name, fn, *args, priority='interactive', job_id=None, owner=None, **kwargs):
+        """Submit a function to run on the named pool on behalf of owner"""
+        if pool_name not in self.pools:
+            raise ValueError(f'Unknown worker pool: {pool_name}')
+
+        job = Job(pool_name, fn, args, kwargs, priority=priority, job_id=job_id, owner=owner,
+                  weight=float(self.weights.get(owner, 1.0)))
+        block = self.overflow_policy == 'queue'
+        return self.pools[pool_name].submit(job, block=block, timeout=self.submit_timeout)
+
+    def get_stats(self):
+        """Get statistics for every pool"""
+        return {name: pool.get_stats() for name, pool in self.pools.items()}
+
+    def shutdown(self):
+        """Stop all worker pools"""
+        for pool in self.pools.values():
+            pool.shutdown()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single execution"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn once per key, concurrent callers wait for and share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call['event'].wait()
+            if call['error']:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn(*args, **kwargs)
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+    def get_stats(self):
+        """Get execution and coalescing counters"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced
+            }
+
+
+class HostLimiter:
+    """Cap the number of concurrent holders per host"""
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self._cond = threading.Condition()
+        self._active = {}
+        self.waits = 0
+
+    def acquire(self, host, timeout=None):
+        """Wait for a free slot for host, returns False on timeout"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            if self._active.get(host, 0) >= self.limit:
+                self.waits += 1
+            while self._active.get(host, 0) >= self.limit:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._active[host] = self._active.get(host, 0) + 1
+            return True
+
+    def release(self, host):
+        """Free a slot taken with acquire()"""
+        with self._cond:
+            self._active[host] -= 1
+            if not self._active[host]:
+                del self._active[host]
+            self._cond.notify_all()
+
+    def get_stats(self):
+        """Get active holders per host"""
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'active': dict(self._active),
+                'waits': self.waits
+            }
@@ -0,0 +1,445 @@
+# TasVID YouTube Downloader - Download Scheduler Module
+
+import os
+import json
+import time
+import uuid
+import heapq
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# Shorthands accepted in place of a cron expression
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *'
+}
+
+# Value range of each cron field: minute, hour, day of month, month, weekday
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+# Attempts at starting a one-off download while the server is busy
+MAX_START_ATTEMPTS = 5
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day month weekday)
+
+    Fields accept *, numbers, ranges, lists and steps (*/15, 1-5, 0,30).
+    Sunday is 0 or 7. As in cron, when both the day of month and the
+    weekday are restricted a day matching either runs.
+    """
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        fields = CRON_ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'cron expression needs 5 fields: {expression}')
+
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    def _parse_field(self, field, low, high):
+        """Get the sorted values a field matches"""
+        values = set()
+        for part in field.split(','):
+            part, _, step = part.partition('/')
+            try:
+                step = int(step) if step else 1
+                if part == '*':
+                    first, last = low, high
+                elif '-' in part:
+                    first, last = (int(value) for value in part.split('-', 1))
+                else:
+                    first = int(part)
+                    last = high if step > 1 else first
+            except ValueError:
+                raise ValueError(f'invalid cron field: {field}')
+            if first < low or last > high or first > last or step < 1:
+                raise ValueError(f'invalid cron field: {field}')
+            values.update(range(first, last + 1, step))
+        return sorted(values)
+
+    def _day_matches(self, day):
+        """Check a date against the day of month, month and weekday fields"""
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment):
+        """Get the first matching minute after a datetime, or None within five years"""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(5 * 366):
+            if self._day_matches(day):
+                first_day = day == start.date()
+                for hour in self.hours:
+                    if first_day and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if first_day and hour == start.hour and minute < start.minute:
+                            continue
+                        return datetime(day.year, day.month, day.day, hour, minute)
+            day += timedelta(days=1)
+        return None
+
+
+class TimeWindow:
+    """Daily time window such as 01:00-06:00, which may span midnight"""
+    def __init__(self, spec):
+        self.spec = spec
+        try:
+            start, end = spec.split('-')
+            self.start = self._minutes(start)
+            self.end = self._minutes(end)
+        except ValueError:
+            raise ValueError(f'invalid time window, expected HH:MM-HH:MM: {spec}')
+
+    def _minutes(self, value):
+        """Convert HH:MM to minutes after midnight"""
+        hours, minutes = value.strip().split(':')
+        hours, minutes = int(hours), int(minutes)
+        if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+            raise ValueError(value)
+        return hours * 60 + minutes
+
+    def contains(self, moment):
+        """Check whether a datetime falls inside the window"""
+        minute = moment.hour * 60 + moment.minute
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        return minute >= self.start or minute < self.end
+
+    def defer(self, moment):
+        """Get the datetime itself when inside the window, else the next window start"""
+        if self.contains(moment):
+            return moment
+        start = moment.replace(hour=self.start // 60, minute=self.start % 60, second=0, microsecond=0)
+        return start if start > moment else start + timedelta(days=1)
+
+
+class DownloadScheduler:
+    """Scheduled downloads in a heap ordered by due time, persisted in SQLite (WAL mode)
+
+    The scheduler thread sleeps until the earliest entry is due and is
+    woken early when entries are added or cancelled. Every change writes
+    only its own row. Entries are claimed with a conditional update before
+    they start, so processes sharing the database never start one twice;
+    entries added by another process are picked up within sync_interval.
+    """
+    def __init__(self, db_path, start_download, legacy_json_path=None, off_peak_window='01:00-06:00',
+                 sync_interval=30, retry_delay=60):
+        self.db_path = db_path
+        self.start_download = start_download
+        self.off_peak_window = off_peak_window
+        self.sync_interval = sync_interval
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+
+        # id -> entry, the heap holds (due, id) and may contain stale pairs
+        self._entries = {}
+        self._heap = []
+        self._cond = threading.Condition()
+        self._last_sync = 0.0
+
+        # Counters
+        self.started = 0
+        self.last_lag = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS schedules (
+                id TEXT PRIMARY KEY,
+                due REAL,
+                entry TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_schedules_updated ON schedules (updated_at);
+        ''')
+        conn.commit()
+
+        if legacy_json_path:
+            self.migrate_from_json(legacy_json_path)
+        self._sync()
+
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='download-scheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _conn(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def migrate_from_json(self, json_path):
+        """One-time import of the old scheduled.json file"""
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r') as f:
+                scheduled = json.load(f)
+        except:
+            scheduled = {}
+
+        rows = []
+        for schedule_id, entry in scheduled.items():
+            try:
+                due = datetime.fromisoformat(entry['scheduled_time']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            entry = dict(entry, id=schedule_id, next_run=entry['scheduled_time'], recurrence=None, window=None)
+            rows.append((schedule_id, due, json.dumps(entry), time.time()))
+
+        conn = self._conn()
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO schedules (id, due, entry, updated_at) VALUES (?, ?, ?, ?)', rows)
+
+        # Keep the old file around but never import it twice
+        os.replace(json_path, json_path + '.migrated')
+        print(f"Migrated {len(rows)} scheduled downloads from {json_path}")
+        return len(rows)
+
+    def _window(self, entry):
+        """Get the time window an entry may start in, or None"""
+        window = entry.get('window')
+        if not window:
+            return None
+        return TimeWindow(self.off_peak_window if window == 'off-peak' else window)
+
+    def _next_due(self, entry, after):
+        """Get the next start of an entry after a datetime as a timestamp, or None"""
+        recurrence = entry.get('recurrence')
+        if not recurrence:
+            return None
+        moment = CronSchedule(recurrence).next_after(after)
+        if moment is None:
+            return None
+        window = self._window(entry)
+        return (window.defer(moment) if window else moment).timestamp()
+
+    def add(self, fields, scheduled_time=None, recurrence=None, window=None):
+        """Schedule a download, returns the entry
+
+        scheduled_time is a datetime for the first start, a recurring
+        entry without one starts at the next time its cron expression
+        matches. window ('HH:MM-HH:MM' or 'off-peak') holds starts back
+        until the window opens. Raises ValueError for invalid input.
+        """
+        entry = dict(fields, id=str(uuid.uuid4()), recurrence=recurrence or None, window=window or None, runs=0)
+        if recurrence:
+            CronSchedule(recurrence)
+        window = self._window(entry)
+
+        if scheduled_time is None:
+            due = self._next_due(entry, datetime.now())
+            if due is None:
+                raise ValueError('a scheduled time or a recurrence is required')
+            moment = datetime.fromtimestamp(due)
+        else:
+            moment = window.defer(scheduled_time) if window else scheduled_time
+        entry['scheduled_time'] = (scheduled_time or moment).isoformat()
+
+        self._write(entry, moment.timestamp())
+        return entry
+
+    def cancel(self, schedule_id):
+        """Remove a scheduled download, returns False if it was not found"""
+        conn = self._conn()
+        with conn:
+            removed = conn.execute('DELETE FROM schedules WHERE id = ?', (schedule_id,)).rowcount
+        with self._cond:
+            removed = self._entries.pop(schedule_id, None) is not None or removed
+            self._cond.notify()
+        return bool(removed)
+
+    def entries(self, limit=None):
+        """Get scheduled downloads by id, the soonest first"""
+        with self._cond:
+            entries = sorted(self._entries.values(), key=lambda entry: entry['due'])
+        if limit:
+            entries = entries[:limit]
+        return {entry['id']: dict(entry) for entry in entries}
+
+    def _write(self, entry, due):
+        """Store an entry with its due time and wake the scheduler thread"""
+        entry['due'] = due
+        entry['next_run'] = datetime.fromtimestamp(due).isoformat()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO schedules (id, due, entry, updated_at) VALUES (?, ?, ?, ?)',
+                (entry['id'], due, json.dumps(entry), time.time())
+            )
+        with self._cond:
+            self._entries[entry['id']] = entry
+            heapq.heappush(self._heap, (due, entry['id']))
+            self._cond.notify()
+
+    def _sync(self):
+        """Load entries added or changed since the last sync, including by other processes"""
+        since = self._last_sync
+        self._last_sync = time.time()
+        # A little overlap so rows committed during the last sync are not missed
+        rows = self._conn().execute(
+            'SELECT id, due, entry FROM schedules WHERE updated_at >= ?', (since - 1 if since else 0,)
+        ).fetchall()
+        with self._cond:
+            for row in rows:
+                current = self._entries.get(row['id'])
+                if current and current['due'] == row['due']:
+                    continue
+                entry = json.loads(row['entry'])
+                entry['due'] = row['due']
+                self._entries[row['id']] = entry
+                self._heap.append((row['due'], row['id']))
+            heapq.heapify(self._heap)
+
+    def _claim(self, entry, now):
+        """Advance or remove a due entry in the database, False if another process got it first"""
+        due = entry['due']
+        next_due = self._next_due(entry, datetime.fromtimestamp(max(now, due)))
+        conn = self._conn()
+        with conn:
+            if next_due is None:
+                claimed = conn.execute('DELETE FROM schedules WHERE id = ? AND due = ?', (entry['id'], due)).rowcount
+            else:
+                updated = dict(entry, due=next_due, next_run=datetime.fromtimestamp(next_due).isoformat(),
+                               runs=entry.get('runs', 0) + 1)
+                updated.pop('last_error', None)
+                claimed = conn.execute(
+                    'UPDATE schedules SET due = ?, entry = ?, updated_at = ? WHERE id = ? AND due = ?',
+                    (next_due, json.dumps(updated), time.time(), entry['id'], due)
+                ).rowcount
+
+        with self._cond:
+            if self._entries.get(entry['id']) is entry:
+                if next_due is None or not claimed:
+                    del self._entries[entry['id']]
+                else:
+                    self._entries[entry['id']] = updated
+                    heapq.heappush(self._heap, (next_due, entry['id']))
+        return bool(claimed)
+
+    def _loop(self):
+        """Start entries as they fall due, sleeping until the next one in between"""
+        while self._running:
+            due_entries = []
+            with self._cond:
+                now = time.time()
+                while self._heap:
+                    due, schedule_id = self._heap[0]
+                    entry = self._entries.get(schedule_id)
+                    if entry is None or entry['due'] != due or entry.get('status') == 'failed':
+                        # Cancelled or moved since it was pushed, failed
+                        # entries stay listed but never start
+                        heapq.heappop(self._heap)
+                    elif due <= now:
+                        heapq.heappop(self._heap)
+                        due_entries.append(entry)
+                    else:
+                        break
+
+                if not due_entries:
+                    next_sync = self._last_sync + self.sync_interval
+                    timeout = next_sync - now
+                    if self._heap:
+                        timeout = min(timeout, self._heap[0][0] - now)
+                    if timeout > 0:
+                        self._cond.wait(timeout)
+
+            try:
+                for entry in due_entries:
+                    self._start(entry)
+                if time.time() >= self._last_sync + self.sync_interval:
+                    self._sync()
+            except Exception as e:
+                print(f"Error in download scheduler: {str(e)}")
+
+    def _start(self, entry):
+        """Start a due entry, one-off entries that are busy or fail to start are tried again after retry_delay
+
+        After MAX_START_ATTEMPTS a one-off entry is kept as 'failed' with its
+        last error, until it is cancelled. A recurring entry that fails keeps
+        the error on its next run.
+        """
+        now = time.time()
+        window = self._window(entry)
+        if window and not window.contains(datetime.fromtimestamp(now)):
+            # Missed its window, e.g. while the server was down
+            self._write(entry, window.defer(datetime.fromtimestamp(now)).timestamp())
+            return
+        if not self._claim(entry, now):
+            return
+
+        self.last_lag = now - entry['due']
+        print(f"Starting scheduled download: {entry['url']}")
+        try:
+            started = self.start_download(entry)
+            error = None if started else 'Server was too busy'
+        except Exception as e:
+            print(f"Error starting scheduled download {entry['url']}: {str(e)}")
+            started = False
+            error = str(e)
+        if started:
+            self.started += 1
+            return
+
+        if entry.get('recurrence'):
+            self._record_error(entry['id'], error)
+            return
+        attempts = entry.get('attempts', 0) + 1
+        retry = dict(entry, attempts=attempts, last_error=error)
+        if attempts < MAX_START_ATTEMPTS:
+            self._write(retry, now + self.retry_delay)
+        else:
+            retry['status'] = 'failed'
+            self._write(retry, now)
+
+    def _record_error(self, schedule_id, error):
+        """Note why a recurring entry did not start on the run it moved on to"""
+        with self._cond:
+            entry = self._entries.get(schedule_id)
+            if entry is None:
+                return
+            entry['last_error'] = error
+            row = (json.dumps(entry), schedule_id, entry['due'])
+        conn = self._conn()
+        with conn:
+            conn.execute('UPDATE schedules SET entry = ? WHERE id = ? AND due = ?', row)
+
+    def get_stats(self):
+        """Get the number of scheduled entries, the next due time and start lag"""
+        with self._cond:
+            upcoming = min((entry for entry in self._entries.values() if entry.get('status') != 'failed'),
+                           key=lambda entry: entry['due'], default=None)
+            return {
+                'scheduled': len(self._entries),
+                'next_run': upcoming['next_run'] if upcoming else None,
+                'started': self.started,
+                'last_lag': round(self.last_lag, 3) if self.last_lag is not None else None
+            }
+
+    def close(self):
+        """Stop the scheduler thread"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
@@ -0,0 +1,152 @@
+# TasVID YouTube Downloader - Download State Module
+
+import time
+
+from yt_dlp.utils import DownloadCancelled
+
+
+def format_size(size_bytes):
+    """Format size in bytes to human-readable string"""
+    if not size_bytes:
+        return "Unknown"
+
+    # Convert to MB for easier reading
+    size_mb = size_bytes / (1024 * 1024)
+
+    if size_mb < 1:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_mb < 1024:
+        return f"{size_mb:.1f} MB"
+    else:
+        return f"{size_mb / 1024:.2f} GB"
+
+
+def format_eta(seconds):
+    """Format ETA in seconds to human-readable string"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} seconds"
+    elif seconds < 3600:
+        minutes = seconds // 60
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+    else:
+        hours = seconds // 3600
+        minutes = (seconds % 3600) // 60
+        return f"{hours}h {minutes}m"
+
+
+class DownloadInterrupted(DownloadCancelled):
+    """Raised from the progress hook to stop a cancelled or paused download"""
+    def __init__(self, reason):
+        super().__init__(f'Download {reason}')
+        self.reason = reason
+
+
+class DownloadState:
+    """Compact per-download progress record
+
+    The progress hook only stores raw numbers in slots. Human-readable
+    speed, ETA and size strings are built when the status is read. Item
+    access (state['status']) keeps working for code written against the
+    old status dicts, and any key without a slot lives in 'extra'.
+    """
+    __slots__ = (
+        'status', 'filename', 'output_path', 'start_time',
+        'downloaded_bytes', 'total_bytes', 'total_is_estimate',
+        'speed', 'eta', 'progress_override', 'last_publish',
+        'interrupt', 'output_template', 'job', 'process', 'extra'
+    )
+
+    # Control fields that are never part of the status dict
+    CONTROL_SLOTS = ('last_publish', 'interrupt', 'output_template', 'job', 'process', 'extra')
+
+    # Keys computed from the raw fields on read
+    FORMATTED_KEYS = ('progress', 'speed', 'eta', 'size')
+
+    def __init__(self, status='queued', filename=None, output_path=None, **extra):
+        self.status = status
+        self.filename = filename
+        self.output_path = output_path
+        self.start_time = time.time()
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.total_is_estimate = False
+        self.speed = None
+        self.eta = None
+        self.progress_override = None
+        self.last_publish = 0.0
+        # 'cancelled' or 'paused' once the worker has been asked to stop
+        self.interrupt = None
+        # Output path without extension, shared by partial and final files
+        self.output_template = None
+        # Engine job and running ffmpeg process, if any
+        self.job = None
+        self.process = None
+        self.extra = extra
+
+    @property
+    def progress(self):
+        """Get progress as a percentage"""
+        if self.progress_override is not None:
+            return self.progress_override
+        if self.total_bytes:
+            return (self.downloaded_bytes / self.total_bytes) * 100
+        return 0
+
+    def to_dict(self):
+        """Build the formatted status dict returned by the API"""
+        if self.total_bytes:
+            size = format_size(self.total_bytes) + (' (est.)' if self.total_is_estimate else '')
+        else:
+            size = 'Calculating...'
+
+        info = {
+            'status': self.status,
+            'progress': self.progress,
+            'filename': self.filename,
+            'speed': format_size(self.speed) + '/s' if self.speed else '0 KB/s',
+            'eta': format_eta(self.eta) if self.eta else 'Unknown',
+            'size': size,
+            'downloaded_bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'start_time': self.start_time,
+            'output_path': self.output_path
+        }
+        info.update(self.extra)
+        return info
+
+    def copy(self):
+        """Get an independent copy of this record"""
+        clone = DownloadState()
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        clone.extra = dict(self.extra)
+        return clone
+
+    # Mapping-style access for existing callers
+
+    def __getitem__(self, key):
+        if key in self.FORMATTED_KEYS:
+            return self.to_dict()[key]
+        if key in self.__slots__ and key not in self.CONTROL_SLOTS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key == 'progress':
+            self.progress_override = value
+        elif key in self.__slots__ and key not in self.FORMATTED_KEYS and key not in self.CONTROL_SLOTS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return (key in self.FORMATTED_KEYS or (key in self.__slots__ and key not in self.CONTROL_SLOTS)
+                or key in self.extra)
+
+    def get(self, key, default=None):
+        """Get a value like dict.get"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
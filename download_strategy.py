@@ -0,0 +1,325 @@
+# TasVID YouTube Downloader - Download Strategy Module
+
+import os
+import json
+import time
+import shutil
+import threading
+from urllib.parse import urlparse
+
+import requests
+
+# Protocols yt-dlp downloads as a list of fragments
+FRAGMENTED_PROTOCOLS = ('m3u8', 'http_dash_segments', 'f4m', 'ism')
+
+# Thresholds from benchmarks/download_strategy_benchmark.py: with hosts
+# throttling each connection, throughput grows with connections up to 16
+# and a split pays off from a few MB, below that the extra requests cost
+# about as much as they save.
+# Progressive files below this size download over one connection
+SEGMENT_MIN_BYTES = 4 * 1024 * 1024
+
+# Bytes per connection a split aims for, and the most connections used
+SEGMENT_TARGET_BYTES = 2 * 1024 * 1024
+MAX_CONNECTIONS = 16
+
+# Fragments fetched at once for HLS and DASH
+FRAGMENT_CONCURRENCY = 8
+
+# A split has to beat one connection by this factor on a host to be used
+SPLIT_MIN_GAIN = 1.2
+
+# Every this many downloads a host that is not split is tried split again
+SPLIT_RETRY_EVERY = 10
+
+# Weight of the newest measurement in a host's throughput average
+THROUGHPUT_SMOOTHING = 0.3
+
+_aria2c_path = None
+
+
+def aria2c_available():
+    """Check once whether aria2c is installed"""
+    global _aria2c_path
+    if _aria2c_path is None:
+        _aria2c_path = shutil.which('aria2c') or ''
+    return bool(_aria2c_path)
+
+
+def split_connections(size, max_connections=MAX_CONNECTIONS):
+    """Get the connections a split of size bytes uses"""
+    return int(min(max(size // SEGMENT_TARGET_BYTES, 2), max_connections))
+
+
+class RangeNotSupported(Exception):
+    """Raised when a download cannot be split over range requests"""
+    pass
+
+
+class RangeDownloader:
+    """Download one URL over several HTTP range requests at once
+
+    Each connection writes its range at its offset in one file named
+    '<path>.part-Ranges', so finishing is a rename and not a copy. Bytes
+    done per range are saved next to it every second, so an interrupted
+    download continues where its ranges stopped. Without a connection
+    count the size found by the first request decides it, and files
+    smaller than min_bytes are not split at all.
+    """
+    def __init__(self, url, path, connections=None, min_bytes=0, max_connections=MAX_CONNECTIONS, headers=None,
+                 proxy=None, chunk_size=256 * 1024, timeout=30):
+        self.url = url
+        self.path = path
+        self.connections = connections
+        self.min_bytes = min_bytes
+        self.max_connections = max_connections
+        self.headers = dict(headers or {})
+        self.proxies = {'http': proxy, 'https': proxy} if proxy else None
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.part_path = path + '.part-Ranges'
+        self.state_path = self.part_path + '.json'
+
+        # [start, done, end] per connection, set once the size is known
+        self.ranges = []
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _probe(self):
+        """Get the file size, raising RangeNotSupported when ranges are not served"""
+        response = requests.get(self.url, headers=dict(self.headers, Range='bytes=0-0'), proxies=self.proxies,
+                                stream=True, timeout=self.timeout)
+        response.close()
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code != 206 or '/' not in content_range or content_range.endswith('/*'):
+            raise RangeNotSupported(f'{urlparse(self.url).hostname} answered a range request with '
+                                    f'{response.status_code}')
+        return int(content_range.rsplit('/', 1)[1])
+
+    def _load_ranges(self, total):
+        """Get [start, done, end] per range, continuing a saved download of the same size"""
+        if os.path.exists(self.part_path) and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r') as f:
+                    saved = json.load(f)
+                if saved.get('total') == total:
+                    return saved['ranges']
+            except (OSError, ValueError, KeyError):
+                pass
+
+        connections = self.connections or split_connections(total, self.max_connections)
+        size = -(-total // connections)
+        ranges = [[start, start, min(start + size, total) - 1] for start in range(0, total, size)]
+        with open(self.part_path, 'wb') as f:
+            f.truncate(total)
+        return ranges
+
+    def _save_ranges(self, total, ranges):
+        """Write the bytes done per range next to the partial file"""
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump({'total': total, 'ranges': ranges}, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def _fetch(self, fd, byte_range):
+        """Download one range into the partial file, updating its done offset"""
+        try:
+            start, done, end = byte_range
+            if done > end:
+                return
+            headers = dict(self.headers, Range=f'bytes={done}-{end}')
+            with requests.get(self.url, headers=headers, proxies=self.proxies, stream=True,
+                              timeout=self.timeout) as response:
+                if response.status_code != 206:
+                    raise RangeNotSupported(f'range request answered with {response.status_code}')
+                for chunk in response.iter_content(self.chunk_size):
+                    if self._stop.is_set():
+                        return
+                    chunk = chunk[:end + 1 - byte_range[1]]
+                    if not chunk:
+                        break
+                    os.pwrite(fd, chunk, byte_range[1])
+                    byte_range[1] += len(chunk)
+            if byte_range[1] <= end:
+                raise IOError(f'connection closed {end + 1 - byte_range[1]} bytes early')
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def download(self, progress=None):
+        """Download to path, calling progress(downloaded, total, speed) a few times per second
+
+        An exception raised by progress stops every connection and is
+        passed on, the partial file is kept for a later call.
+        """
+        total = self._probe()
+        if total < self.min_bytes and not os.path.exists(self.part_path):
+            raise RangeNotSupported(f'{total} bytes is too small to split')
+        ranges = self.ranges = self._load_ranges(total)
+        initial = sum(done - start for start, done, _ in ranges)
+
+        fd = os.open(self.part_path, os.O_WRONLY)
+        threads = [threading.Thread(target=self._fetch, args=(fd, byte_range), daemon=True) for byte_range in ranges]
+        started = time.monotonic()
+        last_save = started
+        try:
+            for thread in threads:
+                thread.start()
+            while True:
+                running = [thread for thread in threads if thread.is_alive()]
+                if not running:
+                    break
+                running[0].join(0.25)
+                now = time.monotonic()
+                downloaded = sum(done - start for start, done, _ in ranges)
+                if now - last_save >= 1:
+                    self._save_ranges(total, ranges)
+                    last_save = now
+                if progress:
+                    progress(downloaded, total, (downloaded - initial) / max(now - started, 1e-6))
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            os.close(fd)
+            self._save_ranges(total, ranges)
+
+        if self._errors:
+            raise self._errors[0]
+
+        os.replace(self.part_path, self.path)
+        os.remove(self.state_path)
+        if progress:
+            progress(total, total, (total - initial) / max(time.monotonic() - started, 1e-6))
+        return total
+
+
+class DownloadStrategies:
+    """Pick how each download is fetched from its format, size and past throughput
+
+    HLS and DASH formats are fetched by yt-dlp with several fragments at
+    once. Large progressive files are split over several connections with
+    aria2c when it is installed, or with RangeDownloader otherwise, unless
+    splitting measured no faster on that host; small ones use a single
+    connection. Shaped downloads always use yt-dlp's own downloader so
+    their rate limit can change while they run.
+    """
+    def __init__(self, min_split_bytes=SEGMENT_MIN_BYTES, max_connections=MAX_CONNECTIONS):
+        self.min_split_bytes = min_split_bytes
+        self.max_connections = max_connections
+
+        # (host, strategy name) -> bytes per second, smoothed
+        self._throughput = {}
+        self._skipped_splits = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.chosen = {}
+
+    def selected_format(self, info, format_spec):
+        """Guess the format yt-dlp will download, returns (format, exact)
+
+        exact is True when the format spec names one of the formats, or
+        there is only one, so the download path is known in advance.
+        """
+        formats = info.get('formats') or [info]
+        format_id = str(format_spec or '').split('/')[0]
+        for fmt in formats:
+            if fmt.get('format_id') == format_id:
+                return fmt, True
+        # yt-dlp lists formats from worst to best
+        return formats[-1], len(formats) == 1
+
+    def _size(self, info, fmt):
+        """Get a format's size in bytes, estimated from its bitrate if needed, or None"""
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and info.get('duration'):
+            size = fmt['tbr'] * 1000 / 8 * info['duration']
+        return size
+
+    def choose(self, info, format_spec, output_template, shaped=False, cookies=False):
+        """Get the strategy for a download as a dict with name, connections, reason and ydl opts
+
+        connections is None when a split download decides it from the size
+        its first request finds.
+        """
+        fmt, exact = self.selected_format(info, format_spec)
+        protocol = fmt.get('protocol') or 'https'
+        size = self._size(info, fmt)
+        host = urlparse(fmt.get('url') or '').hostname
+        path = f"{output_template}.{fmt.get('ext') or info.get('ext') or 'mp4'}"
+
+        if shaped:
+            strategy = self._strategy('native', 1, 'bandwidth limits need a single throttled connection')
+        elif protocol.startswith(FRAGMENTED_PROTOCOLS):
+            strategy = self._strategy('fragments', FRAGMENT_CONCURRENCY, f'{protocol} is downloaded in fragments')
+        elif not protocol.startswith('http'):
+            strategy = self._strategy('native', 1, f'{protocol} cannot be split')
+        elif os.path.exists(path + '.part-Ranges') and exact:
+            strategy = self._strategy('ranges', None, 'continuing a split download', path=path)
+        elif size and size < self.min_split_bytes:
+            strategy = self._strategy('native', 1, 'small file')
+        else:
+            # Without a size only RangeDownloader can split, once its first
+            # request has found the size
+            connections = split_connections(size, self.max_connections) if size else None
+            split = 'aria2c' if aria2c_available() and size else 'ranges'
+            if split == 'ranges' and (not exact or cookies or fmt.get('fragments')):
+                strategy = self._strategy('native', 1, 'aria2c is not installed and the format cannot be split here')
+            elif not self._split_pays(host, split):
+                strategy = self._strategy('native', 1, f'splitting measured no faster on {host}')
+            else:
+                reason = f'{size / 1024 / 1024:.0f} MB progressive download' if size else 'size found on download'
+                strategy = self._strategy(split, connections, reason, path=path)
+
+        strategy['host'] = host
+        strategy['url'] = fmt.get('url')
+        strategy['headers'] = fmt.get('http_headers') or {}
+        with self._lock:
+            self.chosen[strategy['name']] = self.chosen.get(strategy['name'], 0) + 1
+        return strategy
+
+    def _strategy(self, name, connections, reason, path=None):
+        """Build a strategy dict with the yt-dlp options it needs"""
+        opts = {'external_downloader': None, 'concurrent_fragment_downloads': 1}
+        if name == 'fragments':
+            opts['concurrent_fragment_downloads'] = connections
+        elif name == 'aria2c':
+            opts['external_downloader'] = {'http': 'aria2c'}
+            opts['external_downloader_args'] = {'aria2c': [
+                f'--split={connections}',
+                f'--max-connection-per-server={connections}',
+                f'--min-split-size={max(SEGMENT_TARGET_BYTES // (1024 * 1024), 1)}M'
+            ]}
+        return {'name': name, 'connections': connections, 'reason': reason, 'path': path, 'opts': opts}
+
+    def _split_pays(self, host, split):
+        """Check past downloads from a host, a split is retried now and then"""
+        with self._lock:
+            native = self._throughput.get((host, 'native'))
+            segmented = self._throughput.get((host, split))
+            if not native or not segmented or segmented >= native * SPLIT_MIN_GAIN:
+                return True
+            skipped = self._skipped_splits.get(host, 0) + 1
+            self._skipped_splits[host] = skipped % SPLIT_RETRY_EVERY
+            return not self._skipped_splits[host]
+
+    def record(self, strategy, size, seconds):
+        """Note the throughput a finished download reached with its strategy"""
+        if not strategy.get('host') or not size or seconds <= 0:
+            return
+        key = (strategy['host'], strategy['name'])
+        rate = size / seconds
+        with self._lock:
+            previous = self._throughput.get(key)
+            self._throughput[key] = rate if previous is None else (
+                previous + THROUGHPUT_SMOOTHING * (rate - previous)
+            )
+
+    def get_stats(self):
+        """Get how often each strategy was chosen and the throughput seen per host"""
+        with self._lock:
+            return {
+                'aria2c': aria2c_available(),
+                'chosen': dict(self.chosen),
+                'throughput': {f'{host} {name}': round(rate) for (host, name), rate in self._throughput.items()}
+            }
@@ -0,0 +1,276 @@
+# TasVID YouTube Downloader - History Store Module
+
+import os
+import json
+import base64
+import sqlite3
+import threading
+
+# Columns stored directly, anything else in an entry goes into 'extra'
+HISTORY_COLUMNS = ['id', 'title', 'format', 'resolution', 'size', 'path', 'date']
+
+# Columns the history view can be sorted by
+SORT_COLUMNS = ['date', 'title']
+
+MAX_PAGE_SIZE = 200
+
+# Ids per query when looking up video ids, below SQLite's variable limit
+VIDEO_ID_LOOKUP_SIZE = 500
+
+
+class HistoryStore:
+    """Download history in SQLite (WAL mode) with indexes on id, path, date and video id"""
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS history (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                format TEXT,
+                resolution TEXT,
+                size TEXT,
+                path TEXT,
+                date TEXT,
+                extra TEXT,
+                video_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_path ON history (path);
+            CREATE INDEX IF NOT EXISTS idx_history_date ON history (date);
+            CREATE INDEX IF NOT EXISTS idx_history_date_id ON history (date, id);
+            CREATE INDEX IF NOT EXISTS idx_history_title_id ON history (title, id);
+            CREATE INDEX IF NOT EXISTS idx_history_format_date ON history (format, date, id);
+            CREATE INDEX IF NOT EXISTS idx_history_resolution_date ON history (resolution, date, id);
+        ''')
+        conn.commit()
+        self._add_video_id_column(conn)
+        self._fill_sort_columns(conn)
+
+        if legacy_json_path:
+            self.migrate_from_json(legacy_json_path)
+
+    def _conn(self):
+        """Get this thread's connection, readers never block the writer in WAL mode"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _add_video_id_column(self, conn):
+        """Give databases created before the video_id column one, filled from 'extra'"""
+        columns = [row['name'] for row in conn.execute('PRAGMA table_info(history)')]
+        with conn:
+            if 'video_id' not in columns:
+                conn.execute('ALTER TABLE history ADD COLUMN video_id TEXT')
+                rows = conn.execute(
+                    "SELECT id, extra FROM history WHERE extra LIKE '%\"video_id\"%'"
+                ).fetchall()
+                conn.executemany('UPDATE history SET video_id = ? WHERE id = ?', [
+                    (json.loads(row['extra']).get('video_id'), row['id']) for row in rows
+                ])
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_history_video_id ON history (video_id)')
+
+    def _fill_sort_columns(self, conn):
+        """Replace NULL sort values left by older versions with '', see _to_row"""
+        with conn:
+            for column in SORT_COLUMNS:
+                conn.execute(f"UPDATE history SET {column} = '' WHERE {column} IS NULL")
+
+    def _to_row(self, entry):
+        """Split an entry dict into column values, the video id is also kept in its own column"""
+        extra = {k: v for k, v in entry.items() if k not in HISTORY_COLUMNS}
+        # Sort columns store '' instead of NULL, a row value comparison with
+        # NULL is never true so the page cursor would skip those entries
+        values = [entry.get(column) or '' if column in SORT_COLUMNS else entry.get(column)
+                  for column in HISTORY_COLUMNS]
+        values.append(json.dumps(extra) if extra else None)
+        values.append(entry.get('video_id'))
+        return values
+
+    def _from_row(self, row):
+        """Rebuild an entry dict from a database row"""
+        entry = {column: row[column] for column in HISTORY_COLUMNS}
+        if row['extra']:
+            entry.update(json.loads(row['extra']))
+        return entry
+
+    def migrate_from_json(self, json_path):
+        """One-time import of the old JSON history file"""
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r') as f:
+                history = json.load(f)
+        except:
+            history = []
+
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO history (id, title, format, resolution, size, path, date, extra, video_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._to_row(entry) for entry in history if entry.get('id')]
+            )
+
+        # Keep the old file around but never import it twice
+        os.replace(json_path, json_path + '.migrated')
+        print(f"Migrated {len(history)} history entries from {json_path}")
+        return len(history)
+
+    def add(self, entry):
+        """Append an entry"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO history (id, title, format, resolution, size, path, date, extra, video_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                self._to_row(entry)
+            )
+
+    def get(self, entry_id):
+        """Get an entry by id, or None"""
+        row = self._conn().execute('SELECT * FROM history WHERE id = ?', (entry_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def find_by_path(self, path):
+        """Get all entries for a file path"""
+        rows = self._conn().execute('SELECT * FROM history WHERE path = ?', (path,)).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def downloaded_video_ids(self, video_ids):
+        """Get which of the given video ids have a history entry"""
+        video_ids = list({video_id for video_id in video_ids if video_id})
+        found = set()
+        conn = self._conn()
+        for index in range(0, len(video_ids), VIDEO_ID_LOOKUP_SIZE):
+            chunk = video_ids[index:index + VIDEO_ID_LOOKUP_SIZE]
+            rows = conn.execute(
+                f"SELECT DISTINCT video_id FROM history WHERE video_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            found.update(row['video_id'] for row in rows)
+        return found
+
+    def update_path(self, old_path, new_path, title=None):
+        """Point entries for a renamed or moved file at its new path"""
+        conn = self._conn()
+        with conn:
+            if title is None:
+                conn.execute('UPDATE history SET path = ? WHERE path = ?', (new_path, old_path))
+            else:
+                conn.execute('UPDATE history SET path = ?, title = ? WHERE path = ?', (new_path, title, old_path))
+
+    def delete(self, entry_id):
+        """Delete an entry"""
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM history WHERE id = ?', (entry_id,))
+
+    def clear(self):
+        """Delete all entries"""
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM history')
+
+    def count(self):
+        """Get the number of entries"""
+        return self._conn().execute('SELECT COUNT(*) FROM history').fetchone()[0]
+
+    def recent(self, limit=50):
+        """Get the newest entries"""
+        rows = self._conn().execute(
+            'SELECT * FROM history ORDER BY date DESC, id DESC LIMIT ?', (limit,)
+        ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def query(self, cursor=None, limit=50, sort='date', order='desc', format=None, resolution=None,
+              date_from=None, date_to=None, search=None):
+        """Get one page of entries using keyset pagination
+
+        Returns the page items and an opaque cursor for the next page, so the
+        cost of a page only depends on its size and not on the history size.
+        A search is the exception: no index serves LIKE '%...%', so a search
+        page reads entries in sort order until it has found enough matches,
+        and a rare search term reads most of the history.
+        """
+        sort = sort if sort in SORT_COLUMNS else 'date'
+        descending = order != 'asc'
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        clauses = []
+        params = []
+
+        if format:
+            # Older entries store the format in upper case
+            clauses.append('format IN (?, ?)')
+            params.extend([format.lower(), format.upper()])
+        if resolution:
+            clauses.append('resolution = ?')
+            params.append(resolution)
+        if date_from:
+            clauses.append('date >= ?')
+            params.append(date_from)
+        if date_to:
+            # Dates are stored as 'YYYY-MM-DD HH:MM:SS', include the whole end day
+            clauses.append('date <= ?')
+            params.append(date_to if len(date_to) > 10 else date_to + ' 23:59:59')
+        if search:
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+
+        # Continue after the last row of the previous page
+        position = self._decode_cursor(cursor)
+        if position:
+            comparison = '<' if descending else '>'
+            clauses.append(f'({sort}, id) {comparison} (?, ?)')
+            params.extend(position)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        direction = 'DESC' if descending else 'ASC'
+        rows = self._conn().execute(
+            f'SELECT * FROM history {where} ORDER BY {sort} {direction}, id {direction} LIMIT ?',
+            params + [limit + 1]
+        ).fetchall()
+
+        has_more = len(rows) > limit
+        items = [self._from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if has_more and items:
+            last = items[-1]
+            next_cursor = self._encode_cursor([last[sort], last['id']])
+
+        return {
+            'items': items,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+
+    def _encode_cursor(self, position):
+        """Encode a (sort value, id) position as an opaque cursor"""
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def _decode_cursor(self, cursor):
+        """Decode a cursor, invalid cursors start from the first page"""
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if isinstance(position, list) and len(position) == 2:
+                return position
+        except:
+            pass
+        return None
+
+    def export_all(self):
+        """Get every entry, oldest first, e.g. for a JSON export"""
+        rows = self._conn().execute('SELECT * FROM history ORDER BY date, id').fetchall()
+        return [self._from_row(row) for row in rows]
@@ -0,0 +1,198 @@
+# TasVID YouTube Downloader - Job Journal Module
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+
+class JobJournal:
+    """Durable record of unfinished downloads and batches in SQLite (WAL mode)
+
+    Every status change is written together with what is needed to start
+    the job again, finished jobs are removed. Each process registers as an
+    owner and refreshes a heartbeat; the jobs of an owner whose heartbeat
+    stopped (a crash, a restart, a deploy) are adopted by a live process
+    and handed to the handler registered for their kind. Several worker
+    processes can share one journal.
+    """
+    def __init__(self, db_path, heartbeat_interval=10, owner_timeout=60):
+        self.db_path = db_path
+        self.heartbeat_interval = heartbeat_interval
+        self.owner_timeout = owner_timeout
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._local = threading.local()
+        self._handlers = {}
+        self._handler_order = []
+        self._adopt_lock = threading.Lock()
+
+        # Counters
+        self.adopted = 0
+        self.writes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT,
+                owner TEXT,
+                status TEXT,
+                spec TEXT,
+                state TEXT,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, heartbeat REAL);
+            CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY);
+            CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs (owner);
+        ''')
+        conn.commit()
+        self.heartbeat()
+
+        self._running = True
+        self._thread = threading.Thread(target=self._heartbeat_loop, name='job-journal')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _conn(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, job_id, kind, status, spec=None, state=None, directory=None):
+        """Write a job's status, spec and state are kept from earlier records when None"""
+        conn = self._conn()
+        conn.execute(
+            'INSERT INTO jobs (id, kind, owner, status, spec, state, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at, '
+            'spec = COALESCE(excluded.spec, jobs.spec), state = COALESCE(excluded.state, jobs.state)',
+            (job_id, kind, self.owner, status,
+             json.dumps(spec) if spec is not None else None,
+             json.dumps(state) if state is not None else None,
+             time.time())
+        )
+        if directory:
+            conn.execute('INSERT OR IGNORE INTO directories (path) VALUES (?)', (directory,))
+        self.writes += 1
+
+    def finish(self, job_id):
+        """Remove a job that reached a final status"""
+        self._conn().execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        self.writes += 1
+
+    def heartbeat(self):
+        """Mark this process as alive"""
+        self._conn().execute(
+            'INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)', (self.owner, time.time())
+        )
+
+    def register(self, kind, handler):
+        """Replay adopted jobs of a kind with handler(job), kinds are replayed in registration order"""
+        self._handlers[kind] = handler
+        if kind not in self._handler_order:
+            self._handler_order.append(kind)
+
+    def adopt(self):
+        """Take over the jobs of dead owners for the registered kinds and replay them"""
+        kinds = list(self._handler_order)
+        if not kinds:
+            return 0
+
+        with self._adopt_lock:
+            conn = self._conn()
+            stale = time.time() - self.owner_timeout
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                owners = conn.execute('SELECT owner, heartbeat FROM owners').fetchall()
+                dead = [row['owner'] for row in owners if row['heartbeat'] < stale or not self._alive(row['owner'])]
+                live = {row['owner'] for row in owners} - set(dead)
+                live.add(self.owner)
+
+                # Owners without a row never got to write a heartbeat
+                placeholders = ','.join('?' * len(kinds))
+                rows = [
+                    row for row in conn.execute(f'SELECT * FROM jobs WHERE kind IN ({placeholders})', kinds)
+                    if row['owner'] not in live
+                ]
+                conn.executemany('UPDATE jobs SET owner = ? WHERE id = ?', [(self.owner, row['id']) for row in rows])
+                conn.executemany('DELETE FROM owners WHERE owner = ?', [(owner,) for owner in dead])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        jobs = [self._from_row(row) for row in rows]
+        jobs.sort(key=lambda job: kinds.index(job['kind']))
+        for job in jobs:
+            try:
+                self._handlers[job['kind']](job)
+            except Exception as e:
+                print(f"Error replaying {job['kind']} {job['id']}: {str(e)}")
+                self.finish(job['id'])
+        self.adopted += len(jobs)
+        return len(jobs)
+
+    def _alive(self, owner):
+        """Check an owner's process on this host, a restarted server need not wait for the timeout"""
+        host, pid, _ = owner.rsplit(':', 2)
+        if host != socket.gethostname():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (OSError, ValueError):
+            pass
+        return True
+
+    def _from_row(self, row):
+        """Rebuild a job dict from a database row"""
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'spec': json.loads(row['spec']) if row['spec'] else {},
+            'state': json.loads(row['state']) if row['state'] else {},
+            'updated_at': row['updated_at']
+        }
+
+    def jobs(self):
+        """Get every journaled job of any owner"""
+        return [self._from_row(row) for row in self._conn().execute('SELECT * FROM jobs').fetchall()]
+
+    def directories(self):
+        """Get every directory a journaled job has written to"""
+        return [row['path'] for row in self._conn().execute('SELECT path FROM directories').fetchall()]
+
+    def _heartbeat_loop(self):
+        """Refresh this process's heartbeat and adopt jobs of owners that died"""
+        while self._running:
+            time.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+                self.adopt()
+            except Exception as e:
+                print(f"Error in job journal: {str(e)}")
+
+    def get_stats(self):
+        """Get journaled job counts and how many were adopted"""
+        rows = self._conn().execute('SELECT kind, COUNT(*) AS count FROM jobs GROUP BY kind').fetchall()
+        return {
+            'owner': self.owner,
+            'jobs': {row['kind']: row['count'] for row in rows},
+            'adopted': self.adopted,
+            'writes': self.writes
+        }
+
+    def close(self):
+        """Stop the heartbeat, this process's jobs become adoptable once it times out"""
+        self._running = False
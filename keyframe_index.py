@@ -0,0 +1,100 @@
+# TasVID YouTube Downloader - Keyframe Index Module
+
+import os
+import bisect
+import threading
+import subprocess
+from collections import OrderedDict
+
+
+class KeyframeIndex:
+    """Keyframe timestamps per file, read once with ffprobe
+
+    Only packet headers are read (no decoding), and entries are keyed by
+    path, size and modification time so an edited file is indexed again.
+    Each keyframe's position in decode order is kept too, so a stream copy
+    between two keyframes can be cut by packet count instead of by time.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+
+        # path -> ((size, mtime_ns), sorted keyframe times, packet numbers)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Get the sorted keyframe times of a file's first video stream in seconds"""
+        return self._get(path)[1]
+
+    def _get(self, path):
+        """Get the index entry of a file, probing it when missing or outdated"""
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        keyframes = self._probe(path)
+        entry = (version, [time for time, _ in keyframes], [packet for _, packet in keyframes])
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _probe(self, path):
+        """List (time, packet number) of each keyframe with ffprobe"""
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+        keyframes = []
+        for packet, line in enumerate(result.stdout.decode(errors='replace').splitlines()):
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.append((float(pts_time), packet))
+        # Packets are in decode order, B-frames make that differ from display order
+        keyframes.sort()
+        return keyframes
+
+    def at_or_after(self, path, seconds):
+        """Get the first keyframe time at or after a position, or None"""
+        keyframes = self.get(path)
+        i = bisect.bisect_left(keyframes, seconds)
+        return keyframes[i] if i < len(keyframes) else None
+
+    def at_or_before(self, path, seconds):
+        """Get the last keyframe time at or before a position, or None"""
+        keyframes = self.get(path)
+        i = bisect.bisect_right(keyframes, seconds)
+        return keyframes[i - 1] if i else None
+
+    def packets_between(self, path, start, end):
+        """Get the number of packets from the keyframe at start up to the one at end"""
+        _, times, packets = self._get(path)
+        return packets[bisect.bisect_left(times, end)] - packets[bisect.bisect_left(times, start)]
+
+    def forget(self, path):
+        """Drop a file from the index"""
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def get_stats(self):
+        """Get the number of indexed files and hit counts"""
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'keyframes': sum(len(times) for _, times, _ in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
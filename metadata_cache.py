@@ -0,0 +1,224 @@
+# TasVID YouTube Downloader - Metadata Cache Module
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Patterns used to pull the video ID out of the different YouTube URL forms
+VIDEO_ID_PATTERNS = [
+    r'(?:youtube\.com/watch\?(?:.*&)?v=)([A-Za-z0-9_-]{11})',
+    r'(?:youtu\.be/)([A-Za-z0-9_-]{11})',
+    r'(?:youtube\.com/(?:shorts|embed|live|v)/)([A-Za-z0-9_-]{11})',
+    r'(?:youtube-nocookie\.com/embed/)([A-Za-z0-9_-]{11})'
+]
+
+# Signed media URLs carry their expiry as a unix timestamp
+EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d{9,11})')
+
+
+def normalize_video_id(url):
+    """Normalize a video URL to a stable cache key"""
+    if not url:
+        return ''
+
+    for pattern in VIDEO_ID_PATTERNS:
+        match = re.search(pattern, url)
+        if match:
+            return f'youtube:{match.group(1)}'
+
+    # Unknown site - drop the fragment and trailing slash
+    return url.split('#')[0].rstrip('/')
+
+
+class MetadataCache:
+    """TTL + LRU cache for extracted video info with an optional SQLite tier
+
+    The disk tier holds at most disk_max_rows entries. Expired rows are
+    deleted when a lookup finds them, and every purge_interval writes the
+    expired rows plus those over the cap, soonest to expire first, are too.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, default_ttl=3600, expiry_margin=300, disk_path=None,
+                 disk_max_rows=10000, purge_interval=100):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self.disk_path = disk_path
+        self.disk_max_rows = disk_max_rows
+        self.purge_interval = max(1, purge_interval)
+        self._disk_writes = 0
+
+        # key -> (serialized info, expires_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_path:
+            self._init_disk()
+
+    def _init_disk(self):
+        """Create the on-disk tier and drop entries that expired while offline"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.executescript('''
+                CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, expires_at REAL, data TEXT);
+                CREATE INDEX IF NOT EXISTS idx_metadata_expires_at ON metadata (expires_at);
+            ''')
+            self._purge_disk()
+        except Exception as e:
+            print(f"Error opening metadata cache file: {str(e)}")
+            self.disk_path = None
+
+    def _purge_disk(self):
+        """Delete expired rows and the rows over disk_max_rows that expire soonest, called with the lock held"""
+        self._db.execute('DELETE FROM metadata WHERE expires_at <= ?', (time.time(),))
+        if self.disk_max_rows:
+            excess = self._db.execute('SELECT COUNT(*) FROM metadata').fetchone()[0] - self.disk_max_rows
+            if excess > 0:
+                self._db.execute(
+                    'DELETE FROM metadata WHERE key IN (SELECT key FROM metadata ORDER BY expires_at LIMIT ?)',
+                    (excess,)
+                )
+                self.disk_evictions += excess
+        self._db.commit()
+
+    def _ttl_for(self, info):
+        """Get the TTL for an info dict based on the earliest signed URL expiry"""
+        now = time.time()
+        expiries = []
+
+        for f in info.get('formats') or []:
+            for field in ('url', 'manifest_url'):
+                match = EXPIRE_PATTERN.search(f.get(field) or '')
+                if match:
+                    expiries.append(int(match.group(1)))
+
+        if not expiries:
+            return self.default_ttl
+
+        # Stop serving the entry a little before the first URL goes stale
+        ttl = min(expiries) - now - self.expiry_margin
+        return max(0, min(ttl, self.default_ttl))
+
+    def get(self, url):
+        """Get cached info for a URL, or None on a miss"""
+        key = normalize_video_id(url)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                data, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(data)
+
+                # Expired
+                self._remove(key)
+                self.expired += 1
+
+            if self.disk_path:
+                row = self._db.execute(
+                    'SELECT data, expires_at FROM metadata WHERE key = ?', (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._store(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return json.loads(row[0])
+                if row:
+                    self._db.execute('DELETE FROM metadata WHERE key = ? AND expires_at <= ?', (key, now))
+                    self._db.commit()
+                    self.expired += 1
+
+            self.misses += 1
+            return None
+
+    def put(self, url, info):
+        """Cache a JSON-serializable info dict for a URL"""
+        ttl = self._ttl_for(info)
+        if ttl <= 0:
+            return
+
+        key = normalize_video_id(url)
+        data = json.dumps(info)
+        expires_at = time.time() + ttl
+
+        with self._lock:
+            self._store(key, data, expires_at)
+
+            if self.disk_path:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO metadata (key, expires_at, data) VALUES (?, ?, ?)',
+                        (key, expires_at, data)
+                    )
+                    self._db.commit()
+
+                    self._disk_writes += 1
+                    if self._disk_writes % self.purge_interval == 0:
+                        self._purge_disk()
+                except Exception as e:
+                    print(f"Error writing metadata cache file: {str(e)}")
+
+    def invalidate(self, url):
+        """Drop a URL from both tiers"""
+        key = normalize_video_id(url)
+
+        with self._lock:
+            self._remove(key)
+            if self.disk_path:
+                self._db.execute('DELETE FROM metadata WHERE key = ?', (key,))
+                self._db.commit()
+
+    def _store(self, key, data, expires_at):
+        """Insert into the memory tier and evict least recently used entries"""
+        self._remove(key)
+
+        # Entries bigger than the whole budget are only kept on disk
+        if len(data) > self.max_bytes:
+            return
+
+        self._entries[key] = (data, expires_at)
+        self.current_bytes += len(data)
+
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (old_data, _) = self._entries.popitem(last=False)
+            self.current_bytes -= len(old_data)
+            self.evictions += 1
+
+    def _remove(self, key):
+        """Remove a key from the memory tier"""
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.current_bytes -= len(entry[0])
+
+    def get_stats(self):
+        """Get hit/miss counters and memory usage"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'disk_enabled': bool(self.disk_path)
+            }
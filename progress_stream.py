@@ -0,0 +1,100 @@
+# TasVID YouTube Downloader - Progress Streaming Module
+
+import json
+import time
+import threading
+
+# Statuses after which a stream is closed
+TERMINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+class ProgressBroker:
+    """Push progress changes to server-sent event subscribers
+
+    Publishers only bump a version number, so calling publish() from a
+    progress hook is cheap. Each subscriber wakes on a new version, waits
+    out the coalescing interval and then sends only the fields that
+    changed since its previous event.
+    """
+    def __init__(self, min_interval=0.5, keepalive=15):
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self._cond = threading.Condition()
+        self._versions = {}
+        self.subscribers = 0
+
+    def publish(self, channel):
+        """Signal that the state behind a channel changed"""
+        with self._cond:
+            self._versions[channel] = self._versions.get(channel, 0) + 1
+            self._cond.notify_all()
+
+    def forget(self, channel):
+        """Drop the version counter of a finished channel"""
+        with self._cond:
+            self._versions.pop(channel, None)
+            self._cond.notify_all()
+
+    def _wait_for_change(self, channel, seen_version, timeout):
+        """Block until the channel version moves past seen_version or timeout"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._versions.get(channel, 0) == seen_version:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._versions.get(channel, 0)
+
+    def stream(self, channel, get_state, poll_interval=2):
+        """Generate SSE messages with changed fields until the state is terminal
+
+        get_state returns the current state dict, or None once it is gone.
+        State changes that were not published are still picked up every
+        poll_interval seconds.
+        """
+        with self._cond:
+            self.subscribers += 1
+
+        last_sent = {}
+        last_event = 0
+        version = -1
+
+        try:
+            while True:
+                state = get_state()
+                if state is None:
+                    yield 'event: end\ndata: {}\n\n'
+                    return
+
+                changes = {key: value for key, value in state.items() if last_sent.get(key) != value}
+                if changes:
+                    last_sent.update(changes)
+                    last_event = time.time()
+                    yield f'data: {json.dumps(changes, default=str)}\n\n'
+                elif time.time() - last_event >= self.keepalive:
+                    # Comment line keeps proxies from closing an idle stream
+                    last_event = time.time()
+                    yield ': keepalive\n\n'
+
+                if state.get('status') in TERMINAL_STATUSES:
+                    yield 'event: end\ndata: {}\n\n'
+                    return
+
+                version = self._wait_for_change(channel, version, poll_interval)
+
+                # Coalesce bursts of updates into one event per interval
+                wait = self.min_interval - (time.time() - last_event)
+                if wait > 0:
+                    time.sleep(wait)
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def get_stats(self):
+        """Get the number of connected subscribers"""
+        with self._cond:
+            return {
+                'subscribers': self.subscribers,
+                'channels': len(self._versions)
+            }
@@ -82,6 +82,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 })
             })
             .then(response => response.json())
+            .then(data => waitForAnalysis(data))
             .then(data => {
                 // Reset button state
                 analyzeBtn.innerHTML = 'Analyze';
@@ -119,6 +120,23 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    function waitForAnalysis(data) {
+        // Analyses finish in the background, long-poll until the result is in
+        if (!data.success || !data.analysis_id || data.video_info) {
+            return data;
+        }
+        return fetch(`/analyze/${data.analysis_id}?wait=25`)
+            .then(response => response.json())
+            .then(next => {
+                if (next.success && !next.video_info) {
+                    // Still running, or the server was too busy to hold the request
+                    const delay = (next.retry_after || 1) * 1000;
+                    return new Promise(resolve => setTimeout(resolve, delay)).then(() => waitForAnalysis(next));
+                }
+                return next;
+            });
+    }
+    
     // Download functionality
     if (downloadForm) {
         downloadForm.addEventListener('submit', function(e) {
@@ -295,6 +313,15 @@ document.addEventListener('DOMContentLoaded', function() {
                     <option value="low">Low Compression</option>
                     <option value="auto" selected>Auto (Recommended)</option>
                     <option value="high">High Compression</option>
+                    <optgroup label="Profiles">
+                        <option value="fast">Fast (H.264, veryfast)</option>
+                        <option value="balanced">Balanced (H.264, medium)</option>
+                        <option value="small">Small (H.264, slow)</option>
+                        <option value="quality">Quality (H.264, CRF 18)</option>
+                        <option value="two-pass">Two-pass (H.264)</option>
+                        <option value="hevc">HEVC (H.265)</option>
+                        <option value="av1">AV1 (SVT-AV1)</option>
+                    </optgroup>
                 </select>
             </div>
         `;
@@ -349,6 +376,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 <div class="progress-filename" id="progress-filename-${downloadId}"></div>
             </div>
             <div class="card-footer">
+                <button class="btn btn-secondary btn-sm" id="pause-btn-${downloadId}" onclick="togglePauseDownload('${downloadId}')">Pause</button>
                 <button class="btn btn-danger btn-sm" onclick="cancelDownload('${downloadId}')">Cancel</button>
             </div>
         `;
@@ -362,11 +390,45 @@ document.addEventListener('DOMContentLoaded', function() {
             downloadBtn.disabled = false;
         }
         
-        // Start progress polling
-        pollDownloadProgress(downloadId);
+        // Start progress streaming
+        trackDownloadProgress(downloadId);
     }
     
-    function pollDownloadProgress(downloadId) {
+    function trackDownloadProgress(downloadId) {
+        // Prefer server-sent events, fall back to polling when unavailable
+        if (!window.EventSource) {
+            pollDownloadProgress(downloadId);
+            return;
+        }
+        
+        const downloadInfo = {};
+        let finished = false;
+        const source = new EventSource(`/download-events/${downloadId}`);
+        
+        // Each event only carries the fields that changed
+        source.onmessage = function(event) {
+            Object.assign(downloadInfo, JSON.parse(event.data));
+            finished = updateDownloadProgress(downloadId, downloadInfo);
+            if (finished) {
+                source.close();
+            }
+        };
+        
+        source.addEventListener('end', function() {
+            finished = true;
+            source.close();
+        });
+        
+        source.onerror = function() {
+            source.close();
+            if (!finished) {
+                pollDownloadProgress(downloadId);
+            }
+        };
+    }
+    
+    function updateDownloadProgress(downloadId, downloadInfo) {
+        // Update the progress card, returns true once the download is finished
         const statusElement = document.getElementById(`status-${downloadId}`);
         const percentElement = document.getElementById(`progress-percent-${downloadId}`);
         const speedElement = document.getElementById(`progress-speed-${downloadId}`);
@@ -374,57 +436,70 @@ document.addEventListener('DOMContentLoaded', function() {
         const progressBar = document.getElementById(`progress-bar-${downloadId}`);
         const filenameElement = document.getElementById(`progress-filename-${downloadId}`);
         
-        if (!statusElement || !percentElement || !speedElement || !etaElement || !progressBar) return;
+        if (!statusElement || !percentElement || !speedElement || !etaElement || !progressBar) return true;
+        if (!downloadInfo.status) return false;
+        
+        // Update status
+        statusElement.textContent = downloadInfo.status.charAt(0).toUpperCase() + downloadInfo.status.slice(1);
+        
+        // Update progress bar
+        const progress = downloadInfo.progress || 0;
+        progressBar.style.width = `${progress}%`;
+        percentElement.textContent = `${Math.round(progress)}%`;
         
+        // Update speed and ETA
+        speedElement.textContent = downloadInfo.speed || '0 KB/s';
+        etaElement.textContent = downloadInfo.eta || 'Calculating...';
+        
+        // Update filename
+        if (downloadInfo.filename && filenameElement) {
+            filenameElement.textContent = downloadInfo.filename;
+        }
+        
+        // Pausing is only possible while the file is still being fetched
+        const pauseButton = document.getElementById(`pause-btn-${downloadId}`);
+        if (pauseButton) {
+            const pausable = ['queued', 'starting', 'downloading', 'paused'].includes(downloadInfo.status);
+            pauseButton.textContent = downloadInfo.status === 'paused' ? 'Resume' : 'Pause';
+            pauseButton.disabled = !pausable;
+        }
+        
+        if (downloadInfo.status === 'completed') {
+            statusElement.textContent = 'Completed';
+            showAlert('Download completed successfully!', 'success');
+            
+            // Add to history (this would normally happen server-side)
+            // Here we're just updating the UI
+            const historyContainer = document.getElementById('download-history');
+            if (historyContainer) {
+                const historyItem = document.createElement('div');
+                historyItem.className = 'card fade-in';
+                historyItem.innerHTML = `
+                    <div class="card-body">
+                        <h4>${downloadInfo.filename}</h4>
+                        <p>Downloaded to: ${downloadInfo.output_path || 'Unknown location'}</p>
+                    </div>
+                `;
+                historyContainer.prepend(historyItem);
+            }
+            return true;
+        } else if (downloadInfo.status === 'error') {
+            statusElement.textContent = 'Error';
+            showAlert(`Download error: ${downloadInfo.error || 'Unknown error'}`, 'danger');
+            return true;
+        }
+        
+        return downloadInfo.status === 'cancelled';
+    }
+    
+    function pollDownloadProgress(downloadId) {
         const checkProgress = () => {
             fetch(`/download-status/${downloadId}`)
                 .then(response => response.json())
                 .then(data => {
-                    if (data.success) {
-                        const downloadInfo = data.download_info;
-                        
-                        // Update status
-                        statusElement.textContent = downloadInfo.status.charAt(0).toUpperCase() + downloadInfo.status.slice(1);
-                        
-                        // Update progress bar
-                        const progress = downloadInfo.progress || 0;
-                        progressBar.style.width = `${progress}%`;
-                        percentElement.textContent = `${Math.round(progress)}%`;
-                        
-                        // Update speed and ETA
-                        speedElement.textContent = downloadInfo.speed || '0 KB/s';
-                        etaElement.textContent = downloadInfo.eta || 'Calculating...';
-                        
-                        // Update filename
-                        if (downloadInfo.filename) {
-                            filenameElement.textContent = downloadInfo.filename;
-                        }
-                        
-                        // Continue polling if not completed or error
-                        if (downloadInfo.status !== 'completed' && downloadInfo.status !== 'error' && downloadInfo.status !== 'cancelled') {
-                            setTimeout(checkProgress, 1000);
-                        } else if (downloadInfo.status === 'completed') {
-                            statusElement.textContent = 'Completed';
-                            showAlert('Download completed successfully!', 'success');
-                            
-                            // Add to history (this would normally happen server-side)
-                            // Here we're just updating the UI
-                            const historyContainer = document.getElementById('download-history');
-                            if (historyContainer) {
-                                const historyItem = document.createElement('div');
-                                historyItem.className = 'card fade-in';
-                                historyItem.innerHTML = `
-                                    <div class="card-body">
-                                        <h4>${downloadInfo.filename}</h4>
-                                        <p>Downloaded to: ${downloadInfo.output_path || 'Unknown location'}</p>
-                                    </div>
-                                `;
-                                historyContainer.prepend(historyItem);
-                            }
-                        } else if (downloadInfo.status === 'error') {
-                            statusElement.textContent = 'Error';
-                            showAlert(`Download error: ${downloadInfo.error || 'Unknown error'}`, 'danger');
-                        }
+                    // Continue polling if not completed or error
+                    if (data.success && !updateDownloadProgress(downloadId, data.download_info)) {
+                        setTimeout(checkProgress, 1000);
                     }
                 })
                 .catch(error => {
@@ -469,45 +544,86 @@ document.addEventListener('DOMContentLoaded', function() {
             batchBtn.disabled = false;
         }
         
-        // Start progress polling
-        pollBatchProgress(batchId);
+        // Start progress streaming
+        trackBatchProgress(batchId);
     }
     
-    function pollBatchProgress(batchId) {
+    function trackBatchProgress(batchId) {
+        // Prefer server-sent events, fall back to polling when unavailable
+        if (!window.EventSource) {
+            pollBatchProgress(batchId);
+            return;
+        }
+        
+        const batchInfo = {};
+        let finished = false;
+        const source = new EventSource(`/batch-events/${batchId}`);
+        
+        source.onmessage = function(event) {
+            Object.assign(batchInfo, JSON.parse(event.data));
+            finished = updateBatchProgress(batchId, batchInfo);
+            if (finished) {
+                source.close();
+            }
+        };
+        
+        source.addEventListener('end', function() {
+            finished = true;
+            source.close();
+        });
+        
+        source.onerror = function() {
+            source.close();
+            if (!finished) {
+                pollBatchProgress(batchId);
+            }
+        };
+    }
+    
+    function updateBatchProgress(batchId, batchInfo) {
+        // Update the batch card, returns true once the batch is finished
         const statusElement = document.getElementById(`batch-status-${batchId}`);
         const completedElement = document.getElementById(`batch-completed-${batchId}`);
         const totalElement = document.getElementById(`batch-total-${batchId}`);
         const failedElement = document.getElementById(`batch-failed-${batchId}`);
         const progressBar = document.getElementById(`batch-progress-bar-${batchId}`);
         
-        if (!statusElement || !completedElement || !totalElement || !failedElement || !progressBar) return;
+        if (!statusElement || !completedElement || !totalElement || !failedElement || !progressBar) return true;
+        if (!batchInfo.status) return false;
+        
+        // Update status
+        statusElement.textContent = batchInfo.status.charAt(0).toUpperCase() + batchInfo.status.slice(1);
+        
+        // Update stats
+        completedElement.textContent = batchInfo.completed;
+        totalElement.textContent = batchInfo.total;
+        failedElement.textContent = batchInfo.failed;
+        
+        // Update progress bar
+        const progress = batchInfo.total ? (batchInfo.completed / batchInfo.total) * 100 : 0;
+        progressBar.style.width = `${progress}%`;
+        
+        if (batchInfo.status === 'completed') {
+            statusElement.textContent = 'Completed';
+            showAlert('Batch download completed!', 'success');
+            return true;
+        } else if (batchInfo.status === 'error') {
+            statusElement.textContent = 'Error';
+            showAlert(`Batch download error: ${batchInfo.error || 'Unknown error'}`, 'danger');
+            return true;
+        }
         
+        return batchInfo.status === 'cancelled';
+    }
+    
+    function pollBatchProgress(batchId) {
         const checkProgress = () => {
             fetch(`/batch-status/${batchId}`)
                 .then(response => response.json())
                 .then(data => {
-                    if (data.success) {
-                        const batchInfo = data.batch_info;
-                        
-                        // Update status
-                        statusElement.textContent = batchInfo.status.charAt(0).toUpperCase() + batchInfo.status.slice(1);
-                        
-                        // Update stats
-                        completedElement.textContent = batchInfo.completed;
-                        totalElement.textContent = batchInfo.total;
-                        failedElement.textContent = batchInfo.failed;
-                        
-                        // Update progress bar
-                        const progress = (batchInfo.completed / batchInfo.total) * 100;
-                        progressBar.style.width = `${progress}%`;
-                        
-                        // Continue polling if not completed
-                        if (batchInfo.status !== 'completed') {
-                            setTimeout(checkProgress, 2000);
-                        } else {
-                            statusElement.textContent = 'Completed';
-                            showAlert('Batch download completed!', 'success');
-                        }
+                    // Continue polling if not completed
+                    if (data.success && !updateBatchProgress(batchId, data.batch_info)) {
+                        setTimeout(checkProgress, 2000);
                     }
                 })
                 .catch(error => {
@@ -583,6 +699,27 @@ function cancelDownload(downloadId) {
     });
 }
 
+function togglePauseDownload(downloadId) {
+    const pauseButton = document.getElementById(`pause-btn-${downloadId}`);
+    const action = pauseButton && pauseButton.textContent === 'Resume' ? 'resume' : 'pause';
+    
+    fetch(`/${action}-download/${downloadId}`, {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showAlert(data.message, 'info');
+        } else {
+            showAlert(data.message || `Failed to ${action} download`, 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showAlert(`An error occurred while trying to ${action} the download`, 'danger');
+    });
+}
+
 // Show alert function for global access
 function showAlert(message, type) {
     const alertContainer = document.getElementById('alert-container');
@@ -0,0 +1,91 @@
+# TasVID YouTube Downloader - Test Fixtures
+
+import os
+import re
+import time
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Serves files with byte ranges, records the ranges asked for and sends slowly when told to"""
+    requested = None
+    delay = 0
+    ranges = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        # Clients drop connections they no longer need
+        try:
+            super().handle()
+        except ConnectionError:
+            pass
+
+    def send_head(self):
+        path = self.translate_path(self.path.split('?')[0])
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if not os.path.isfile(path) or not match or not self.ranges:
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        self.requested.append((start, end))
+        if start >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self._remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, '_remaining', None)
+        while remaining is None or remaining > 0:
+            chunk = source.read(16 * 1024 if remaining is None else min(16 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+            if self.delay:
+                time.sleep(self.delay)
+
+
+@pytest.fixture
+def range_server(tmp_path):
+    """Serve tmp_path/'served' over HTTP with byte ranges, yields (base URL, handler class)"""
+    directory = tmp_path / 'served'
+    directory.mkdir()
+    handler = type('Handler', (RangeHandler,), {'requested': [], 'delay': 0, 'ranges': True})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), lambda *args: handler(*args, directory=str(directory)))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}', handler
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def wait_for(condition, timeout=5):
+    """Poll condition until it is true, failing the test after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached in time')
+        time.sleep(0.01)
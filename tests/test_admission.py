@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+import admission
+from admission import AdmissionController, TokenBucket
+from bandwidth import BandwidthShaper, parse_rate
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, 'monotonic', clock)
+    return clock
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.take() == 0
+    clock.now += 60
+    assert [bucket.take() for _ in range(4)][-1] == pytest.approx(0.5)
+
+
+def test_admission_limits_each_client_and_route_separately(clock):
+    controller = AdmissionController({'RATE_LIMIT_ENABLED': 'true', 'MAX_REQUESTS_PER_MINUTE': 2})
+    assert [controller.check('a', 'download') for _ in range(3)] == [0, 0, 30]
+    assert controller.check('a', 'analyze') == 0
+    assert controller.check('b', 'download') == 0
+
+    clock.now += 30
+    assert controller.check('a', 'download') == 0
+    assert controller.get_stats()['limited'] == 1
+
+
+def test_admission_is_thread_safe(clock):
+    controller = AdmissionController({'RATE_LIMIT_ENABLED': True, 'MAX_REQUESTS_PER_MINUTE': 50})
+    results = []
+    lock = threading.Lock()
+
+    def hammer():
+        for _ in range(20):
+            wait = controller.check('client', 'download')
+            with lock:
+                results.append(wait)
+
+    threads = [threading.Thread(target=hammer) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results.count(0) == 50
+    assert controller.get_stats()['admitted'] == 50
+
+
+def test_disabled_admission_admits_everything():
+    controller = AdmissionController({'RATE_LIMIT_ENABLED': 'false', 'MAX_REQUESTS_PER_MINUTE': 1})
+    assert all(controller.check('a', 'download') == 0 for _ in range(10))
+
+
+def test_bandwidth_is_shared_and_capped_downloads_give_up_their_rest():
+    shaper = BandwidthShaper('9M')
+    params = {name: {} for name in ('a', 'b', 'c')}
+    shaper.acquire('a', params['a'])
+    assert params['a']['ratelimit'] == parse_rate('9M')
+
+    shaper.acquire('b', params['b'], limit='1M')
+    shaper.acquire('c', params['c'])
+    assert params['b']['ratelimit'] == parse_rate('1M')
+    assert params['a']['ratelimit'] == params['c']['ratelimit'] == parse_rate('4M')
+
+    shaper.release('b')
+    assert params['a']['ratelimit'] == parse_rate('4.5M')
+
+
+def test_parse_rate():
+    assert parse_rate('2.5M') == 2.5 * 1024 ** 2
+    assert parse_rate('500KB/s') == 500 * 1024
+    assert parse_rate(0) is None
+    with pytest.raises(ValueError):
+        parse_rate('fast')
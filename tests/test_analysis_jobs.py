@@ -0,0 +1,93 @@
+import threading
+
+from analysis_jobs import AnalysisJobs
+from download_engine import EngineSaturated
+
+
+class Engine:
+    """Stand-in for the download engine, refuses the submits listed in refuse"""
+    def __init__(self, refuse=()):
+        self.refuse = set(refuse)
+        self.submits = 0
+
+    def submit(self, pool, fn, *args, **kwargs):
+        self.submits += 1
+        if self.submits in self.refuse:
+            raise EngineSaturated('analyze queue is full (0 jobs waiting)')
+        threading.Thread(target=fn, args=args).start()
+
+
+def _failing_first(failures):
+    calls = []
+
+    def attempt(url, cookies_file):
+        calls.append(url)
+        if len(calls) <= failures:
+            raise ValueError('extractor failed')
+        return {'title': 'video'}
+    return attempt, calls
+
+
+def _jobs(engine, attempt, max_attempts=3):
+    return AnalysisJobs(engine, attempt, lambda attempts, error: 0.01, max_attempts=max_attempts)
+
+
+def test_failed_attempts_are_retried_after_their_backoff():
+    attempt, calls = _failing_first(2)
+    jobs = _jobs(Engine(), attempt)
+    analysis_id = jobs.submit('https://youtu.be/aaaaaaaaaaa')['analysis_id']
+
+    status = jobs.get(analysis_id, wait=5)
+    assert status['status'] == 'completed'
+    assert status['attempts'] == 3 and len(calls) == 3
+    assert jobs.get_stats()['retried'] == 2
+
+
+def test_a_retry_refused_by_a_busy_engine_backs_off_again():
+    attempt, calls = _failing_first(1)
+    # The first retry finds the analyze queue full
+    jobs = _jobs(Engine(refuse={2}), attempt)
+    analysis_id = jobs.submit('https://youtu.be/aaaaaaaaaaa')['analysis_id']
+
+    status = jobs.get(analysis_id, wait=5)
+    assert status['status'] == 'completed'
+    assert status['attempts'] == 3 and len(calls) == 2
+
+
+def test_a_busy_engine_fails_the_job_once_its_attempts_are_used():
+    attempt, calls = _failing_first(1)
+    jobs = _jobs(Engine(refuse={2, 3}), attempt)
+    analysis_id = jobs.submit('https://youtu.be/aaaaaaaaaaa')['analysis_id']
+
+    status = jobs.get(analysis_id, wait=5)
+    assert status['status'] == 'error'
+    assert 'busy' in status['error']
+    assert status['attempts'] == 3 and len(calls) == 1
+
+
+def test_a_new_job_the_engine_has_no_room_for_fails_at_once():
+    attempt, calls = _failing_first(0)
+    jobs = _jobs(Engine(refuse={1}), attempt)
+
+    status = jobs.submit('https://youtu.be/aaaaaaaaaaa')
+    assert status['status'] == 'error'
+    assert not calls
+
+
+def test_analyses_of_the_same_video_share_one_job():
+    release = threading.Event()
+    calls = []
+
+    def attempt(url, cookies_file):
+        calls.append(url)
+        release.wait(5)
+        return {'title': 'video'}
+
+    jobs = _jobs(Engine(), attempt)
+    first = jobs.submit('https://youtu.be/aaaaaaaaaaa', key='youtube:aaaaaaaaaaa')
+    second = jobs.submit('https://youtu.be/aaaaaaaaaaa', key='youtube:aaaaaaaaaaa')
+    release.set()
+
+    assert first['analysis_id'] == second['analysis_id']
+    assert jobs.get(first['analysis_id'], wait=5)['result'] == {'title': 'video'}
+    assert len(calls) == 1
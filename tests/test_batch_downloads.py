@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+from additional_features import AdditionalFeatures
+from youtube_downloader import YouTubeDownloader
+from tests.conftest import wait_for
+
+
+@pytest.fixture
+def features(tmp_path):
+    config = {
+        'DOWNLOAD_HISTORY_FILE': str(tmp_path / 'history.json'),
+        'METADATA_CACHE_FILE': None,
+        'JOB_JOURNAL_FILE': str(tmp_path / 'journal.db'),
+        'JOB_JOURNAL_HEARTBEAT': 3600,
+        'BATCH_PARALLELISM': 2
+    }
+    downloader = YouTubeDownloader(config)
+    features = AdditionalFeatures(config, downloader)
+    yield features
+    features.scheduler.close()
+    downloader.journal.close()
+    downloader.engine.shutdown()
+
+
+@pytest.fixture
+def download_dir(tmp_path):
+    return {'videos': str(tmp_path), 'audio': str(tmp_path)}
+
+
+class Items:
+    """_batch_download_item stand-in whose items finish when the test releases them"""
+    def __init__(self):
+        self.started = []
+        self.releases = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, batch_id, url, *args):
+        with self._lock:
+            self.started.append(url)
+            release = self.releases.setdefault(url, threading.Event())
+        release.wait(5)
+
+    def release(self, url):
+        with self._lock:
+            self.releases.setdefault(url, threading.Event()).set()
+
+
+def _journaled_state(features, batch_id):
+    return next(job['state'] for job in features.downloader.journal.jobs() if job['id'] == batch_id)
+
+
+def test_cursor_skips_items_that_finish_out_of_order(features, download_dir):
+    items = Items()
+    features._batch_download_item = items
+    urls = [f'https://example.com/{number}' for number in range(1, 5)]
+    batch_id = features.batch_download(urls, 'mp4', '720p', 'none', download_dir)['batch_id']
+    batch = features.batch_downloads[batch_id]
+    wait_for(lambda: len(items.started) == 2)
+
+    # The second item finishes while the first is still running
+    items.release(urls[1])
+    wait_for(lambda: batch['finished_positions'] == [2])
+    assert batch['cursor'] == 1
+    assert _journaled_state(features, batch_id) == {'cursor': 1, 'finished': [2]}
+
+    # Once the first finishes the cursor moves past both
+    items.release(urls[0])
+    wait_for(lambda: len(items.started) == 4)
+    wait_for(lambda: batch['cursor'] == 3)
+    assert batch['finished_positions'] == []
+
+    items.release(urls[3])
+    wait_for(lambda: batch['finished_positions'] == [4])
+    items.release(urls[2])
+    wait_for(lambda: batch['status'] == 'completed')
+    assert batch['cursor'] == 5
+    assert not features.downloader.journal.jobs()
+
+
+def test_restored_batch_skips_finished_positions(features, download_dir):
+    items = Items()
+    features._batch_download_item = items
+    urls = [f'https://example.com/{number}' for number in range(1, 6)]
+    for url in urls:
+        items.release(url)
+
+    features._restore_batch({
+        'id': 'restored',
+        'kind': 'batch',
+        'spec': {'urls': urls, 'format_id': 'mp4', 'resolution': '720p', 'compression': 'none',
+                 'download_dir': download_dir, 'cookies_file': None, 'parallelism': 2},
+        'state': {'cursor': 2, 'finished': [4]}
+    })
+    wait_for(lambda: features.batch_downloads['restored']['status'] == 'completed')
+
+    assert sorted(items.started) == [urls[1], urls[2], urls[4]]
+    assert features.batch_downloads['restored']['cursor'] == 6
+
+
+def test_restored_playlist_skips_finished_positions(features, download_dir):
+    items = Items()
+    features._batch_download_item = items
+    urls = {position: f'https://example.com/{position}' for position in range(1, 8)}
+    for url in urls.values():
+        items.release(url)
+
+    def select(batch_id, playlist_url, start, end, step, cursor, cookies_file):
+        for position in range(cursor, 8, step):
+            yield position, urls[position]
+
+    features._select_playlist_entries = select
+    features._restore_batch({
+        'id': 'playlist',
+        'kind': 'batch',
+        'spec': {'playlist_url': 'https://example.com/list', 'selection': {'start': 1, 'end': None, 'step': 1},
+                 'skip_downloaded': False, 'format_id': 'mp4', 'resolution': '720p', 'compression': 'none',
+                 'download_dir': download_dir, 'cookies_file': None, 'parallelism': 2},
+        'state': {'cursor': 3, 'finished': [5, 6]}
+    })
+    batch = features.batch_downloads['playlist']
+    wait_for(lambda: batch['status'] == 'completed')
+
+    assert sorted(items.started) == [urls[3], urls[4], urls[7]]
+    assert batch['total'] == 3
+    assert batch['cursor'] == 8
+
+
+@pytest.mark.parametrize('parallelism', [0, -2, 'many'])
+def test_invalid_parallelism_is_refused(features, download_dir, parallelism):
+    result = features.batch_download(['https://example.com/1'], 'mp4', '720p', 'none', download_dir,
+                                     parallelism=parallelism)
+    assert not result['success']
+
+
+def test_parallelism_is_capped(features, download_dir):
+    items = Items()
+    features._batch_download_item = items
+    features.max_batch_parallelism = 3
+    urls = [f'https://example.com/{number}' for number in range(1, 11)]
+    batch_id = features.batch_download(urls, 'mp4', '720p', 'none', download_dir, parallelism=100)['batch_id']
+
+    wait_for(lambda: len(items.started) == 3)
+    assert len(items.started) == 3
+    for url in urls:
+        items.release(url)
+    wait_for(lambda: features.batch_downloads[batch_id]['status'] == 'completed')
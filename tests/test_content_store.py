@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from content_store import ContentStore
+
+
+@pytest.fixture
+def downloads(tmp_path):
+    directory = tmp_path / 'downloads'
+    directory.mkdir()
+    return directory
+
+
+def _download(directory, name, size):
+    path = directory / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def test_delivered_objects_are_outside_the_cap(tmp_path, downloads):
+    store = ContentStore(str(tmp_path / 'store'), max_bytes=1500, gc_interval=0)
+    first = _download(downloads, 'first.mp4', 1000)
+    second = _download(downloads, 'second.mp4', 1000)
+    store.put('first', first)
+    store.put('second', second)
+
+    # Both objects share their disk space with the delivered files
+    assert store.collect_garbage() == 0
+    assert store.exclusive_bytes == 0
+    assert store.lookup('first') and store.lookup('second')
+
+
+def test_objects_only_the_store_holds_are_evicted_least_recently_used_first(tmp_path, downloads):
+    store = ContentStore(str(tmp_path / 'store'), max_bytes=1500, gc_interval=0)
+    paths = [_download(downloads, f'{name}.mp4', 1000) for name in ('a', 'b', 'c')]
+    for name, path in zip(('a', 'b', 'c'), paths):
+        store.put(name, path)
+    store.lookup('a')
+    for path in paths:
+        os.remove(path)
+
+    assert store.collect_garbage() == 2
+    assert store.exclusive_bytes == 1000
+    assert store.lookup('b') is None and store.lookup('c') is None
+    assert store.lookup('a')['size'] == 1000
+    assert store.get_stats()['evictions'] == 2
+
+
+def test_collection_runs_at_most_once_per_interval(tmp_path, downloads):
+    store = ContentStore(str(tmp_path / 'store'), max_bytes=500, gc_interval=3600)
+    collections = []
+    collect = store.collect_garbage
+    store.collect_garbage = lambda: collections.append(1) or collect()
+
+    for name in ('a', 'b', 'c'):
+        store.put(name, _download(downloads, f'{name}.mp4', 1000))
+    assert len(collections) == 1
+
+
+def test_identical_downloads_share_one_object(tmp_path, downloads):
+    store = ContentStore(str(tmp_path / 'store'), gc_interval=0)
+    data = os.urandom(1000)
+    first, second = downloads / 'first.mp4', downloads / 'second.mp4'
+    first.write_bytes(data)
+    second.write_bytes(data)
+
+    assert store.put('first', str(first)) == store.put('second', str(second))
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    assert store.get_stats()['objects'] == 1
+
+    target = str(downloads / 'again' / 'third.mp4')
+    assert store.deliver(store.lookup('first')['hash'], target) == target
+    assert open(target, 'rb').read() == data
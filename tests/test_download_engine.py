@@ -0,0 +1,220 @@
+import threading
+
+import pytest
+
+from download_engine import DownloadEngine, EngineSaturated, HostLimiter, Job, SingleFlight, WorkerPool
+from tests.conftest import wait_for
+
+
+def _blocked_pool(**kwargs):
+    """Get a one-worker pool whose worker is held by a job until the returned event is set"""
+    pool = WorkerPool('test', 1, 100, **kwargs)
+    release = threading.Event()
+    blocker = pool.submit(Job('test', release.wait, (), {}))
+    wait_for(lambda: blocker.status == 'running')
+    return pool, release
+
+
+def test_lanes_run_in_priority_order():
+    pool, release = _blocked_pool()
+    order = []
+    jobs = [
+        pool.submit(Job('test', order.append, (priority,), {}, priority=priority))
+        for priority in ('scheduled', 'batch', 'interactive', 'batch')
+    ]
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+    assert order == ['interactive', 'batch', 'batch', 'scheduled']
+    pool.shutdown()
+
+
+def test_owners_are_interleaved_within_a_lane():
+    pool, release = _blocked_pool()
+    order = []
+    jobs = [pool.submit(Job('test', order.append, ('bulk',), {}, owner='bulk')) for _ in range(5)]
+    jobs.append(pool.submit(Job('test', order.append, ('single',), {}, owner='single')))
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+    # The single job does not wait behind all five bulk jobs
+    assert order.index('single') <= 1
+    pool.shutdown()
+
+
+def test_weights_give_owners_proportional_shares():
+    pool, release = _blocked_pool()
+    order = []
+    jobs = []
+    for _ in range(6):
+        jobs.append(pool.submit(Job('test', order.append, ('heavy',), {}, owner='heavy', weight=2.0)))
+        jobs.append(pool.submit(Job('test', order.append, ('light',), {}, owner='light', weight=1.0)))
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+    assert order[:6].count('heavy') == 4
+    pool.shutdown()
+
+
+def test_owner_limit_caps_concurrent_jobs():
+    pool = WorkerPool('test', 4, 100, owner_limit=2)
+    lock = threading.Lock()
+    running = {'now': 0, 'peak': 0}
+    release = threading.Event()
+
+    def work():
+        with lock:
+            running['now'] += 1
+            running['peak'] = max(running['peak'], running['now'])
+        release.wait(5)
+        with lock:
+            running['now'] -= 1
+
+    jobs = [pool.submit(Job('test', work, (), {}, owner='client')) for _ in range(6)]
+    wait_for(lambda: running['now'] == 2)
+    other = pool.submit(Job('test', lambda: None, (), {}, owner='other'))
+    assert other.wait(5)
+    release.set()
+    for job in jobs:
+        assert job.wait(5)
+    assert running['peak'] == 2
+    pool.shutdown()
+
+
+def test_reserved_workers_only_take_interactive_jobs():
+    pool = WorkerPool('test', 2, 100, reserved=1)
+    release = threading.Event()
+    batch = [pool.submit(Job('test', release.wait, (5,), {}, priority='batch')) for _ in range(2)]
+    wait_for(lambda: batch[0].status == 'running')
+    assert batch[1].status == 'queued'
+
+    interactive = pool.submit(Job('test', lambda: 'done', (), {}))
+    assert interactive.wait(5)
+    assert interactive.result == 'done'
+    assert batch[1].status == 'queued'
+    release.set()
+    assert batch[1].wait(5)
+    pool.shutdown()
+
+
+def test_full_queue_rejects_or_waits():
+    pool = WorkerPool('test', 1, 1)
+    release = threading.Event()
+    running = pool.submit(Job('test', release.wait, (5,), {}))
+    wait_for(lambda: running.status == 'running')
+    pool.submit(Job('test', lambda: None, (), {}))
+
+    with pytest.raises(EngineSaturated):
+        pool.submit(Job('test', lambda: None, (), {}))
+    with pytest.raises(EngineSaturated):
+        pool.submit(Job('test', lambda: None, (), {}), block=True, timeout=0.1)
+    assert pool.get_stats()['rejected'] == 2
+
+    # A waiting submitter gets in once the worker frees a queue slot
+    threading.Timer(0.1, release.set).start()
+    job = pool.submit(Job('test', lambda: 'late', (), {}), block=True, timeout=5)
+    assert job.wait(5)
+    assert job.result == 'late'
+    pool.shutdown()
+
+
+def test_failed_jobs_are_counted_and_keep_the_worker():
+    pool = WorkerPool('test', 1, 10)
+
+    def fail():
+        raise RuntimeError('boom')
+
+    failed = pool.submit(Job('test', fail, (), {}))
+    assert failed.wait(5)
+    assert failed.status == 'error'
+    assert failed.error == 'boom'
+
+    after = pool.submit(Job('test', lambda: 1, (), {}))
+    assert after.wait(5)
+    stats = pool.get_stats()
+    assert (stats['completed'], stats['failed'], stats['busy_workers']) == (1, 1, 0)
+    pool.shutdown()
+
+
+def test_engine_passes_arguments_and_rejects_unknown_pools():
+    engine = DownloadEngine({'DOWNLOAD_WORKERS': 2})
+    job = engine.submit('download', lambda a, b=0: a + b, 1, b=2, owner='client')
+    assert job.wait(5)
+    assert job.result == 3
+    with pytest.raises(ValueError):
+        engine.submit('nope', lambda: None)
+    engine.shutdown()
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch(value):
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', fetch, 21)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('key', fetch, 0))) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    wait_for(lambda: flight.get_stats()['coalesced'] == 5)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [21]
+    assert results == [42] * 6
+    assert flight.get_stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 5}
+
+    # The next call runs again
+    release.set()
+    assert flight.do('key', fetch, 1) == 2
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError('extraction failed')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    assert started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    wait_for(lambda: flight.get_stats()['coalesced'] == 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ['extraction failed'] * 2
+
+
+def test_host_limiter_caps_holders_per_host():
+    limiter = HostLimiter(1)
+    assert limiter.acquire('a.example')
+    assert limiter.acquire('b.example')
+    assert not limiter.acquire('a.example', timeout=0.05)
+
+    threading.Timer(0.05, limiter.release, ('a.example',)).start()
+    assert limiter.acquire('a.example', timeout=5)
+    assert limiter.get_stats()['waits'] == 2
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from download_engine import EngineSaturated
+from youtube_downloader import YouTubeDownloader
+from tests.conftest import wait_for
+
+URL = 'https://www.youtube.com/watch?v=aaaaaaaaaaa'
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    downloader = YouTubeDownloader({
+        'DOWNLOAD_HISTORY_FILE': str(tmp_path / 'history.json'),
+        'METADATA_CACHE_FILE': None,
+        'JOB_JOURNAL_FILE': None
+    })
+    yield downloader
+    downloader.engine.shutdown()
+
+
+@pytest.fixture
+def download_dir(tmp_path):
+    directory = tmp_path / 'downloads'
+    directory.mkdir()
+    return {'videos': str(directory), 'audio': str(directory)}
+
+
+def _download(downloader, download_dir, url=URL, **kwargs):
+    return downloader.download_video(url, 'mp4', '720p', 'none', download_dir, **kwargs)
+
+
+def test_identical_downloads_share_one_worker(downloader, download_dir):
+    release = threading.Event()
+    runs = []
+
+    def worker(download_id, *args, **kwargs):
+        runs.append(download_id)
+        release.wait(5)
+
+    downloader._download_thread = worker
+    first = _download(downloader, download_dir)
+    second = _download(downloader, download_dir)
+    other = _download(downloader, download_dir, url='https://www.youtube.com/watch?v=bbbbbbbbbbb')
+
+    assert second['message'] == 'Joined an identical download in progress'
+    assert downloader.active_downloads[second['download_id']] is downloader.active_downloads[first['download_id']]
+    assert downloader.active_downloads[other['download_id']] is not downloader.active_downloads[first['download_id']]
+    wait_for(lambda: len(runs) == 2)
+    release.set()
+    assert sorted(runs) == sorted([first['download_id'], other['download_id']])
+
+
+def test_joining_while_the_leader_is_still_being_set_up(downloader, download_dir):
+    # Hold the leader right after its flight was registered and let an
+    # identical request join in that window
+    joined = []
+    get_ydl_opts = downloader._get_ydl_opts
+
+    def slow_opts(*args, **kwargs):
+        if not joined:
+            thread = threading.Thread(target=lambda: joined.append(_download(downloader, download_dir)))
+            thread.start()
+            thread.join(5)
+        return get_ydl_opts(*args, **kwargs)
+
+    release = threading.Event()
+    downloader._get_ydl_opts = slow_opts
+    downloader._download_thread = lambda *args, **kwargs: release.wait(5)
+    leader = _download(downloader, download_dir)
+    release.set()
+
+    assert joined[0]['success']
+    assert joined[0]['message'] == 'Joined an identical download in progress'
+    assert downloader.active_downloads[joined[0]['download_id']] is downloader.active_downloads[leader['download_id']]
+
+
+def test_joined_callers_see_a_saturated_engine(downloader, download_dir):
+    joined = []
+
+    def saturated(*args, **kwargs):
+        # Another identical request joins before the queue turns the leader away
+        joined.append(_download(downloader, download_dir))
+        raise EngineSaturated('download queue is full')
+
+    downloader.engine.submit = saturated
+    leader = _download(downloader, download_dir)
+
+    assert not leader['success']
+    state = downloader.active_downloads[joined[0]['download_id']]
+    assert state['status'] == 'error'
+    assert 'Server is busy' in state['error']
+    assert not downloader._download_flights
+
+    # The next identical request starts a new download of its own
+    downloader.engine.submit = lambda *args, **kwargs: None
+    retry = _download(downloader, download_dir)
+    assert retry['message'] == 'Download queued'
+
+
+def test_leader_failure_alone_leaves_no_state(downloader, download_dir):
+    def saturated(*args, **kwargs):
+        raise EngineSaturated('download queue is full')
+
+    downloader.engine.submit = saturated
+    result = _download(downloader, download_dir, download_id='lonely')
+    assert not result['success']
+    assert 'lonely' not in downloader.active_downloads
+    assert not downloader._download_flights
@@ -0,0 +1,122 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from download_scheduler import MAX_START_ATTEMPTS, CronSchedule, DownloadScheduler, TimeWindow
+from tests.conftest import wait_for
+
+
+class Starter:
+    """start_download stand-in that records calls and answers from a script"""
+    def __init__(self, answer=True):
+        self.answer = answer
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, entry):
+        with self._lock:
+            self.calls.append(entry['url'])
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+@pytest.fixture
+def schedulers():
+    started = []
+
+    def make(path, start, **kwargs):
+        scheduler = DownloadScheduler(str(path), start, **kwargs)
+        started.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in started:
+        scheduler.close()
+
+
+def test_due_entries_start_once(tmp_path, schedulers):
+    start = Starter()
+    scheduler = schedulers(tmp_path / 'scheduled.db', start)
+    scheduler.add({'url': 'now'}, datetime.now())
+    scheduler.add({'url': 'later'}, datetime.now() + timedelta(hours=1))
+
+    wait_for(lambda: start.calls == ['now'])
+    assert [entry['url'] for entry in scheduler.entries().values()] == ['later']
+    assert scheduler.get_stats()['started'] == 1
+
+
+def test_processes_sharing_a_database_never_start_an_entry_twice(tmp_path, schedulers):
+    db = tmp_path / 'scheduled.db'
+    start = Starter()
+    first = schedulers(db, start, sync_interval=0.05)
+    for number in range(10):
+        first.add({'url': f'video-{number}'}, datetime.now() + timedelta(seconds=0.5))
+    others = [schedulers(db, start, sync_interval=0.05) for _ in range(3)]
+
+    wait_for(lambda: len(start.calls) >= 10)
+    wait_for(lambda: all(not scheduler.entries() for scheduler in [first] + others))
+    assert sorted(start.calls) == sorted(f'video-{number}' for number in range(10))
+
+
+def test_recurring_entries_move_on_to_their_next_run(tmp_path, schedulers):
+    start = Starter()
+    scheduler = schedulers(tmp_path / 'scheduled.db', start)
+    entry = scheduler.add({'url': 'daily'}, datetime.now(), recurrence='@daily')
+
+    wait_for(lambda: start.calls == ['daily'])
+    wait_for(lambda: scheduler.entries()[entry['id']]['runs'] == 1)
+    following = scheduler.entries()[entry['id']]
+    assert datetime.fromisoformat(following['next_run']) > datetime.now()
+    assert following['next_run'].endswith('T00:00:00')
+
+
+def test_busy_one_off_entries_are_retried(tmp_path, schedulers):
+    start = Starter(answer=False)
+    scheduler = schedulers(tmp_path / 'scheduled.db', start, retry_delay=0.05)
+    scheduler.add({'url': 'busy'}, datetime.now())
+
+    wait_for(lambda: len(start.calls) == 2)
+    start.answer = True
+    wait_for(lambda: not scheduler.entries())
+    assert start.calls == ['busy'] * 3
+
+
+def test_an_entry_whose_start_raises_is_kept_as_failed(tmp_path, schedulers):
+    db = tmp_path / 'scheduled.db'
+    start = Starter(answer=RuntimeError('engine exploded'))
+    scheduler = schedulers(db, start, retry_delay=0.05)
+    entry = scheduler.add({'url': 'boom'}, datetime.now())
+
+    wait_for(lambda: scheduler.entries().get(entry['id'], {}).get('status') == 'failed')
+    failed = scheduler.entries()[entry['id']]
+    assert failed['last_error'] == 'engine exploded'
+    assert failed['attempts'] == MAX_START_ATTEMPTS
+    assert len(start.calls) == MAX_START_ATTEMPTS
+
+    # Still failed after a restart, and never started again
+    reopened = schedulers(db, start)
+    assert reopened.entries()[entry['id']]['status'] == 'failed'
+    assert reopened.cancel(entry['id'])
+    assert not reopened.entries()
+    assert len(start.calls) == MAX_START_ATTEMPTS
+
+
+def test_cron_schedule_matches_fields():
+    cron = CronSchedule('*/30 9-17 * * 1-5')
+    friday_evening = datetime(2026, 10, 16, 17, 45)
+    assert cron.next_after(friday_evening) == datetime(2026, 10, 19, 9, 0)
+    assert cron.next_after(datetime(2026, 10, 19, 9, 0)) == datetime(2026, 10, 19, 9, 30)
+
+    # Day of month and weekday both restricted: either matches
+    assert CronSchedule('0 0 1 * 0').next_after(datetime(2026, 10, 2)) == datetime(2026, 10, 4)
+    with pytest.raises(ValueError):
+        CronSchedule('61 * * * *')
+
+
+def test_time_window_spanning_midnight():
+    window = TimeWindow('23:00-02:00')
+    assert window.contains(datetime(2026, 10, 18, 1, 30))
+    assert not window.contains(datetime(2026, 10, 18, 12, 0))
+    assert window.defer(datetime(2026, 10, 18, 12, 0)) == datetime(2026, 10, 18, 23, 0)
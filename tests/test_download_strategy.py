@@ -0,0 +1,111 @@
+import os
+import json
+
+import pytest
+
+from download_strategy import RangeDownloader, RangeNotSupported, split_connections
+
+SIZE = 2 * 1024 * 1024
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _serve(tmp_path, data, name='video.mp4'):
+    with open(tmp_path / 'served' / name, 'wb') as f:
+        f.write(data)
+
+
+def _interrupt_midway(downloaded, total, speed):
+    if downloaded:
+        raise Interrupted()
+
+
+def test_split_download_writes_the_whole_file(tmp_path, range_server):
+    base_url, handler = range_server
+    data = os.urandom(SIZE)
+    _serve(tmp_path, data)
+    target = str(tmp_path / 'out.mp4')
+
+    downloader = RangeDownloader(f'{base_url}/video.mp4', target, connections=4)
+    assert downloader.download() == SIZE
+
+    with open(target, 'rb') as f:
+        assert f.read() == data
+    assert not os.path.exists(downloader.part_path)
+    assert not os.path.exists(downloader.state_path)
+    # One probe, then one request per range
+    assert sorted(handler.requested[1:]) == [(start, min(start + SIZE // 4, SIZE) - 1)
+                                            for start in range(0, SIZE, SIZE // 4)]
+
+
+def test_interrupted_download_resumes_where_its_ranges_stopped(tmp_path, range_server):
+    base_url, handler = range_server
+    data = os.urandom(SIZE)
+    _serve(tmp_path, data)
+    target = str(tmp_path / 'out.mp4')
+    url = f'{base_url}/video.mp4'
+
+    handler.delay = 0.02
+    first = RangeDownloader(url, target, connections=4, chunk_size=16 * 1024)
+    with pytest.raises(Interrupted):
+        first.download(_interrupt_midway)
+
+    with open(first.state_path) as f:
+        saved = json.load(f)
+    assert saved['total'] == SIZE
+    done = [range_done - start for start, range_done, _ in saved['ranges']]
+    assert 0 < sum(done) < SIZE
+
+    handler.delay = 0
+    handler.requested.clear()
+    progress = []
+    second = RangeDownloader(url, target, connections=4)
+    assert second.download(lambda *args: progress.append(args)) == SIZE
+
+    with open(target, 'rb') as f:
+        assert f.read() == data
+    # Every range continued from the bytes it already had
+    starts = sorted(start for start, _ in handler.requested[1:])
+    assert starts == sorted(start for _, start, end in saved['ranges'] if start <= end)
+    assert progress[-1][:2] == (SIZE, SIZE)
+
+
+def test_saved_ranges_of_another_size_start_over(tmp_path, range_server):
+    base_url, handler = range_server
+    target = str(tmp_path / 'out.mp4')
+    downloader = RangeDownloader(f'{base_url}/video.mp4', target, connections=2)
+    with open(downloader.part_path, 'wb') as f:
+        f.write(b'x' * 10)
+    with open(downloader.state_path, 'w') as f:
+        json.dump({'total': 10, 'ranges': [[0, 10, 9]]}, f)
+
+    data = os.urandom(SIZE)
+    _serve(tmp_path, data)
+    downloader.download()
+    with open(target, 'rb') as f:
+        assert f.read() == data
+
+
+def test_servers_without_ranges_are_refused(tmp_path, range_server):
+    base_url, handler = range_server
+    handler.ranges = False
+    _serve(tmp_path, os.urandom(1024))
+
+    with pytest.raises(RangeNotSupported):
+        RangeDownloader(f'{base_url}/video.mp4', str(tmp_path / 'out.mp4')).download()
+
+
+def test_small_files_are_not_split(tmp_path, range_server):
+    base_url, handler = range_server
+    _serve(tmp_path, os.urandom(1024))
+
+    with pytest.raises(RangeNotSupported):
+        RangeDownloader(f'{base_url}/video.mp4', str(tmp_path / 'out.mp4'), min_bytes=4096).download()
+
+
+def test_connections_grow_with_size():
+    assert split_connections(1) == 2
+    assert split_connections(64 * 1024 * 1024) > split_connections(8 * 1024 * 1024) > 1
+    assert split_connections(10 ** 12, 16) == 16
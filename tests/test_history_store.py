@@ -0,0 +1,129 @@
+import json
+import sqlite3
+
+import pytest
+
+from history_store import HistoryStore
+
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryStore(str(tmp_path / 'history.db'))
+
+
+def _fill(history, count=25):
+    # Several entries share a date so the id has to break ties
+    for number in range(count):
+        history.add({
+            'id': f'entry-{number:02d}',
+            'title': f'Video {number % 7}',
+            'format': 'mp4' if number % 2 else 'MP3',
+            'resolution': '720p' if number % 3 else 'audio',
+            'size': '1 MB',
+            'path': f'/downloads/{number}.mp4',
+            'date': f'2026-10-{1 + number // 3:02d} 12:00:00'
+        })
+
+
+def _pages(history, **kwargs):
+    """Follow the cursors from the first page to the last, returns the ids in order"""
+    ids = []
+    cursor = None
+    while True:
+        page = history.query(cursor=cursor, **kwargs)
+        ids.extend(item['id'] for item in page['items'])
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            return ids
+        cursor = page['next_cursor']
+
+
+@pytest.mark.parametrize('sort', ['date', 'title'])
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_pages_cover_every_entry_once_in_order(history, sort, order):
+    _fill(history)
+    ids = _pages(history, limit=4, sort=sort, order=order)
+
+    entries = {entry['id']: entry for entry in history.export_all()}
+    expected = sorted(entries, key=lambda entry_id: (entries[entry_id][sort], entry_id), reverse=order == 'desc')
+    assert ids == expected
+
+
+def test_filters_apply_across_pages(history):
+    _fill(history)
+    ids = _pages(history, limit=3, format='mp4', resolution='720p', date_from='2026-10-02', date_to='2026-10-06')
+    entries = [history.get(entry_id) for entry_id in ids]
+
+    assert ids
+    assert all(entry['format'] == 'mp4' and entry['resolution'] == '720p' for entry in entries)
+    assert all('2026-10-02' <= entry['date'] <= '2026-10-06 23:59:59' for entry in entries)
+    assert len(ids) == len(set(ids))
+
+
+def test_search_escapes_like_wildcards(history):
+    history.add({'id': 'a', 'title': '100% real', 'date': '2026-10-01 00:00:00'})
+    history.add({'id': 'b', 'title': '1000 real', 'date': '2026-10-02 00:00:00'})
+    history.add({'id': 'c', 'title': 'under_score', 'date': '2026-10-03 00:00:00'})
+    history.add({'id': 'd', 'title': 'underXscore', 'date': '2026-10-04 00:00:00'})
+
+    assert [item['id'] for item in history.query(search='100%')['items']] == ['a']
+    assert [item['id'] for item in history.query(search='under_')['items']] == ['c']
+
+
+def test_invalid_cursors_start_from_the_first_page(history):
+    _fill(history, 5)
+    first = history.query(limit=2)
+    assert history.query(cursor='not a cursor', limit=2)['items'] == first['items']
+
+
+def test_extra_fields_round_trip(history):
+    history.add({'id': 'x', 'title': 't', 'video_id': 'youtube:aaaaaaaaaaa', 'shared': True})
+    assert history.get('x') == {
+        'id': 'x', 'title': 't', 'format': None, 'resolution': None, 'size': None, 'path': None, 'date': '',
+        'video_id': 'youtube:aaaaaaaaaaa', 'shared': True
+    }
+    assert history.downloaded_video_ids(['youtube:aaaaaaaaaaa', 'youtube:bbbbbbbbbbb']) == {'youtube:aaaaaaaaaaa'}
+
+
+def test_databases_without_the_video_id_column_are_migrated(tmp_path):
+    db = str(tmp_path / 'history.db')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE history (id TEXT PRIMARY KEY, title TEXT, format TEXT, resolution TEXT, '
+                 'size TEXT, path TEXT, date TEXT, extra TEXT)')
+    conn.execute("INSERT INTO history (id, extra) VALUES ('old', ?)", (json.dumps({'video_id': 'youtube:old'}),))
+    conn.execute("INSERT INTO history (id) VALUES ('plain')")
+    conn.commit()
+    conn.close()
+
+    history = HistoryStore(db)
+    assert history.downloaded_video_ids(['youtube:old', 'youtube:new']) == {'youtube:old'}
+    assert history.count() == 2
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / 'history.json'
+    legacy.write_text(json.dumps([{'id': 'a', 'title': 'old'}, {'title': 'no id'}]))
+
+    history = HistoryStore(str(tmp_path / 'history.db'), legacy_json_path=str(legacy))
+    assert history.get('a')['title'] == 'old'
+    assert not legacy.exists()
+    assert (tmp_path / 'history.json.migrated').exists()
+
+    HistoryStore(str(tmp_path / 'history.db'), legacy_json_path=str(legacy))
+    assert history.count() == 1
+
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_entries_without_a_title_are_paged(tmp_path, order):
+    db_path = str(tmp_path / 'history.db')
+    history = HistoryStore(db_path)
+    _fill(history, 6)
+    history.add({'id': 'untitled-new', 'date': '2026-10-09 12:00:00'})
+    # Older versions stored a missing title as NULL
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO history (id, title, date) VALUES ('untitled-old', NULL, '2026-10-08 12:00:00')")
+
+    history = HistoryStore(db_path)
+    ids = _pages(history, limit=2, sort='title', order=order)
+    assert sorted(ids) == sorted(entry['id'] for entry in history.export_all())
+    assert set(ids[-2:] if order == 'desc' else ids[:2]) == {'untitled-new', 'untitled-old'}
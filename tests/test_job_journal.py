@@ -0,0 +1,106 @@
+import time
+import threading
+
+from job_journal import JobJournal
+
+
+def _journal(path, **kwargs):
+    # The heartbeat thread stays asleep, tests drive heartbeat() and adopt()
+    return JobJournal(str(path), heartbeat_interval=3600, **kwargs)
+
+
+def test_jobs_of_a_dead_owner_are_replayed_in_kind_order(tmp_path):
+    db = tmp_path / 'journal.db'
+    dead = _journal(db)
+    dead.record('batch-1', 'batch', 'processing', spec={'urls': ['u']}, state={'cursor': 3})
+    dead.record('dl-1', 'download', 'downloading', spec={'url': 'u'})
+    dead.record('dl-1', 'download', 'paused', state={'filename': 'video'})
+    dead.record('done', 'download', 'downloading', spec={'url': 'x'})
+    dead.finish('done')
+    dead.close()
+    time.sleep(0.3)
+
+    live = _journal(db, owner_timeout=0.2)
+    replayed = []
+    live.register('download', lambda job: replayed.append(job))
+    live.register('batch', lambda job: replayed.append(job))
+    assert live.adopt() == 2
+
+    assert [job['id'] for job in replayed] == ['dl-1', 'batch-1']
+    # Later records keep the spec and state they did not repeat
+    assert replayed[0]['status'] == 'paused'
+    assert replayed[0]['spec'] == {'url': 'u'}
+    assert replayed[0]['state'] == {'filename': 'video'}
+    assert replayed[1]['state'] == {'cursor': 3}
+
+    # Adopted jobs now belong to the live owner and are not adopted again
+    assert live.adopt() == 0
+    assert {job['id'] for job in live.jobs()} == {'dl-1', 'batch-1'}
+
+
+def test_jobs_of_a_live_owner_are_left_alone(tmp_path):
+    db = tmp_path / 'journal.db'
+    busy = _journal(db)
+    busy.record('dl-1', 'download', 'downloading', spec={'url': 'u'})
+
+    other = _journal(db, owner_timeout=60)
+    other.register('download', lambda job: None)
+    assert other.adopt() == 0
+
+
+def test_unregistered_kinds_wait_for_their_handler(tmp_path):
+    db = tmp_path / 'journal.db'
+    dead = _journal(db)
+    dead.record('batch-1', 'batch', 'processing', spec={})
+    time.sleep(0.3)
+
+    live = _journal(db, owner_timeout=0.2)
+    live.register('download', lambda job: None)
+    assert live.adopt() == 0
+    replayed = []
+    live.register('batch', replayed.append)
+    assert live.adopt() == 1
+    assert replayed[0]['id'] == 'batch-1'
+
+
+def test_concurrent_adopters_replay_each_job_once(tmp_path):
+    db = tmp_path / 'journal.db'
+    dead = _journal(db)
+    for number in range(20):
+        dead.record(f'dl-{number}', 'download', 'downloading', spec={'url': number})
+    time.sleep(0.3)
+
+    replayed = []
+    lock = threading.Lock()
+
+    def replay(job):
+        with lock:
+            replayed.append(job['id'])
+
+    adopters = [_journal(db, owner_timeout=0.2) for _ in range(4)]
+    for journal in adopters:
+        journal.register('download', replay)
+    threads = [threading.Thread(target=journal.adopt) for journal in adopters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert sorted(replayed) == sorted(f'dl-{number}' for number in range(20))
+
+
+def test_a_failing_handler_drops_only_its_job(tmp_path):
+    db = tmp_path / 'journal.db'
+    dead = _journal(db)
+    dead.record('bad', 'download', 'downloading', spec={'url': 'bad'})
+    dead.record('good', 'download', 'downloading', spec={'url': 'good'})
+    time.sleep(0.3)
+
+    def replay(job):
+        if job['id'] == 'bad':
+            raise RuntimeError('cannot restore')
+
+    live = _journal(db, owner_timeout=0.2)
+    live.register('download', replay)
+    assert live.adopt() == 2
+    assert [job['id'] for job in live.jobs()] == ['good']
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from metadata_cache import MetadataCache, normalize_video_id
+
+
+def _rows(cache):
+    return cache._db.execute('SELECT key, expires_at FROM metadata ORDER BY key').fetchall()
+
+
+@pytest.fixture
+def disk_path(tmp_path):
+    return str(tmp_path / 'metadata_cache.db')
+
+
+def test_entries_survive_a_restart_through_the_disk_tier(disk_path):
+    MetadataCache(disk_path=disk_path).put('https://youtu.be/aaaaaaaaaaa', {'title': 'a'})
+
+    cache = MetadataCache(disk_path=disk_path)
+    assert cache.get('https://www.youtube.com/watch?v=aaaaaaaaaaa') == {'title': 'a'}
+    assert cache.get_stats()['disk_hits'] == 1
+
+
+def test_expired_rows_are_deleted_when_read(disk_path):
+    cache = MetadataCache(disk_path=disk_path)
+    cache.put('https://youtu.be/aaaaaaaaaaa', {'title': 'a'})
+    cache._db.execute('UPDATE metadata SET expires_at = ?', (time.time() - 1,))
+    cache._db.commit()
+    cache._entries.clear()
+
+    assert cache.get('https://youtu.be/aaaaaaaaaaa') is None
+    assert _rows(cache) == []
+
+
+def test_writes_purge_expired_rows_and_cap_the_disk_tier(disk_path):
+    cache = MetadataCache(disk_path=disk_path, disk_max_rows=3, purge_interval=5)
+    cache.put('https://youtu.be/expired0000', {'title': 'old'})
+    cache._db.execute('UPDATE metadata SET expires_at = ?', (time.time() - 1,))
+    cache._db.commit()
+
+    for number in range(4):
+        cache.put(f'https://youtu.be/video{number:06d}', {'title': number})
+    # Purged on the fifth write, the expired row and the one expiring soonest go
+    assert [key for key, _ in _rows(cache)] == [normalize_video_id(f'https://youtu.be/video{number:06d}')
+                                                for number in (1, 2, 3)]
+    assert cache.get_stats()['disk_evictions'] == 1
+
+
+def test_unsigned_and_signed_entries_get_their_ttl():
+    cache = MetadataCache(default_ttl=3600, expiry_margin=300)
+    assert cache._ttl_for({'formats': [{'url': 'https://example.com/a.mp4'}]}) == 3600
+
+    expire = int(time.time()) + 1300
+    ttl = cache._ttl_for({'formats': [{'url': f'https://example.com/a.mp4?expire={expire}'}]})
+    assert 990 < ttl <= 1000
@@ -0,0 +1,71 @@
+import sys
+import threading
+
+import pytest
+
+from transcode_executor import TranscodeExecutor
+
+
+class Command:
+    """Stand-in for an ffmpeg-python stream that runs a Python snippet"""
+    def __init__(self, code):
+        self.code = code
+
+    def compile(self):
+        return [sys.executable, '-c', self.code]
+
+
+PROGRESS = Command('import time\nfor i in range(1000):\n    print(i, flush=True)\n    time.sleep(0.01)')
+
+
+def test_finished_jobs_report_exit_code_and_output():
+    executor = TranscodeExecutor(max_jobs=1, threads_per_job=1)
+    lines = []
+    job = executor.run(Command('print("a"); print("b")'), on_output=lines.append)
+
+    assert job.returncode == 0
+    assert lines == [b'a\n', b'b\n']
+    assert executor.get_stats()['completed'] == 1
+    assert executor.running == 0
+
+
+def test_a_failing_output_callback_kills_and_reaps_the_process():
+    executor = TranscodeExecutor(max_jobs=1, threads_per_job=1)
+    processes = []
+
+    def on_output(line):
+        raise ValueError('bad progress line')
+
+    with pytest.raises(ValueError):
+        executor.run(PROGRESS, on_start=processes.append, on_output=on_output)
+
+    process = processes[0]
+    assert process.returncode is not None and process.returncode != 0
+    assert executor.running == 0
+    assert executor.get_stats()['failed'] == 1
+
+    # The slot is free for the next encode
+    assert executor.run(Command('pass')).returncode == 0
+
+
+def test_jobs_cancelled_while_queued_never_start():
+    executor = TranscodeExecutor(max_jobs=1, threads_per_job=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def on_output(line):
+        started.set()
+        release.wait(5)
+
+    blocker = threading.Thread(target=executor.run, args=(Command('print(1)'),), kwargs={'on_output': on_output})
+    blocker.start()
+    started.wait(5)
+
+    cancel = []
+    queued = threading.Thread(target=lambda: cancel.append(executor.run(Command('pass'), cancelled=lambda: True)))
+    queued.start()
+    release.set()
+    blocker.join(5)
+    queued.join(5)
+
+    assert cancel[0].cancelled and cancel[0].returncode == -1
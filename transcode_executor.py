@@ -0,0 +1,172 @@
+# TasVID YouTube Downloader - Transcode Executor Module
+
+import os
+import time
+import heapq
+import itertools
+import threading
+import subprocess
+from collections import deque
+
+from download_engine import PRIORITY_LANES
+
+
+class TranscodeJob:
+    """One ffmpeg run and what it cost"""
+    def __init__(self, name, cmd, priority='interactive', threads=None):
+        self.name = name
+        self.cmd = cmd
+        self.priority = priority
+        self.threads = threads
+        self.returncode = None
+        self.stderr = b''
+        self.cpu_seconds = 0.0
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+
+    def wait_seconds(self):
+        """Get the time spent waiting for a free encoder slot"""
+        return (self.started_at or self.finished_at or time.time()) - self.queued_at
+
+    def to_dict(self):
+        """Summary used in the executor statistics"""
+        return {
+            'name': self.name,
+            'priority': self.priority,
+            'threads': self.threads,
+            'returncode': self.returncode,
+            'cancelled': self.cancelled,
+            'cpu_seconds': round(self.cpu_seconds, 2),
+            'wall_seconds': round(self.finished_at - self.started_at, 2) if self.started_at and self.finished_at else None,
+            'wait_seconds': round(self.wait_seconds(), 2)
+        }
+
+
+class TranscodeExecutor:
+    """Run ffmpeg processes with a cap on concurrent encodes
+
+    Callers block in run() until one of max_jobs slots is free, slots go to
+    the highest priority lane first. Each encode is given threads_per_job
+    encoder threads so that running encodes together use about all cores
+    instead of each one starting a thread per core.
+    """
+    def __init__(self, max_jobs=None, threads_per_job=None):
+        cores = os.cpu_count() or 1
+        self.max_jobs = max(1, int(max_jobs or max(1, cores // 2)))
+        self.threads_per_job = max(1, int(threads_per_job or max(1, cores // self.max_jobs)))
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self.running = 0
+
+        # Statistics
+        self.completed = 0
+        self.failed = 0
+        self.cpu_seconds = 0.0
+        self.recent = deque(maxlen=50)
+
+    def _acquire(self, job):
+        """Wait for a free slot, highest priority lane and oldest job first"""
+        lane = PRIORITY_LANES.get(job.priority, PRIORITY_LANES['interactive'])
+        entry = (lane, next(self._counter), job)
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            while self.running >= self.max_jobs or self._waiting[0] is not entry:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self.running += 1
+            # The next waiter may be able to start too
+            self._cond.notify_all()
+
+    def _release(self, job):
+        """Free a slot and record the finished job"""
+        with self._cond:
+            self.running -= 1
+            self.cpu_seconds += job.cpu_seconds
+            if job.returncode == 0:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.recent.append(job.to_dict())
+            self._cond.notify_all()
+
+    def run(self, stream, name='ffmpeg', priority='interactive', on_start=None, on_output=None, cancelled=None):
+        """Run an ffmpeg-python stream and return the finished TranscodeJob
+
+        on_start receives the Popen object, e.g. so a cancel can kill it.
+        on_output receives each stdout line (for -progress pipe:1), without
+        it stdout is discarded. cancelled is checked once a slot is free so
+        work cancelled while queued never starts.
+        """
+        job = TranscodeJob(name, stream.compile(), priority, self.threads_per_job)
+        self._acquire(job)
+        try:
+            job.started_at = time.time()
+            if cancelled and cancelled():
+                job.cancelled = True
+                job.returncode = -1
+                return job
+
+            process = subprocess.Popen(
+                job.cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE if on_output else subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+            try:
+                if on_start:
+                    on_start(process)
+
+                if on_output:
+                    for line in process.stdout:
+                        on_output(line)
+                job.stderr = process.stderr.read()
+            except BaseException:
+                # A failing callback must not leave the encode running or unreaped
+                process.kill()
+                self._wait(process, job)
+                raise
+            finally:
+                for pipe in (process.stdout, process.stderr):
+                    if pipe:
+                        pipe.close()
+
+            self._wait(process, job)
+            return job
+        finally:
+            job.finished_at = time.time()
+            self._release(job)
+
+    def _wait(self, process, job):
+        """Reap the ffmpeg process and record its exit code and CPU time"""
+        # wait4 also reports the CPU time the encode used
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            job.cpu_seconds = usage.ru_utime + usage.ru_stime
+        except ChildProcessError:
+            # Already reaped through the Popen object
+            process.wait()
+        job.returncode = process.returncode
+
+    def load(self):
+        """Get running plus waiting jobs per slot"""
+        with self._cond:
+            return (self.running + len(self._waiting)) / self.max_jobs
+
+    def get_stats(self):
+        """Get slot usage, queue depth and CPU time of recent encodes"""
+        with self._cond:
+            return {
+                'max_jobs': self.max_jobs,
+                'threads_per_job': self.threads_per_job,
+                'running': self.running,
+                'queued': len(self._waiting),
+                'completed': self.completed,
+                'failed': self.failed,
+                'cpu_seconds': round(self.cpu_seconds, 2),
+                'recent_jobs': list(self.recent)
+            }
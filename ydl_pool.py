@@ -0,0 +1,183 @@
+# TasVID YouTube Downloader - YoutubeDL Pool Module
+
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.utils.networking import HTTPHeaderDict, std_headers
+
+# Options applied to a pooled instance at every checkout, instances whose
+# other options differ belong to different profiles
+CHECKOUT_OPTIONS = (
+    'http_headers', 'format', 'outtmpl', 'progress_hooks', 'skip_download', 'ratelimit',
+    'external_downloader', 'external_downloader_args', 'concurrent_fragment_downloads'
+)
+
+
+def _fingerprint(value):
+    """Get a hashable form of an option value, functions compare by name"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _fingerprint(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_fingerprint(item) for item in value)
+    if callable(value):
+        return f"{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', type(value).__name__)}"
+    return repr(value)
+
+
+class YoutubeDLPool:
+    """Reusable YoutubeDL instances keyed by option profile
+
+    Building a YoutubeDL sets up its extractors, HTTP handlers and cookie
+    jar, and its first request opens a new TLS connection. A pooled
+    instance keeps its initialised extractors (with YouTube's player
+    cache), its keep-alive connections and the session cookies the site
+    set between uses, so the origin sees at most max_idle connections per
+    profile instead of one per request. The options in CHECKOUT_OPTIONS
+    are applied on each checkout; any other difference, such as the
+    proxy, makes a separate profile. Instances with a cookies file are
+    never pooled, the file belongs to one user and is written back when
+    the instance closes.
+    """
+    def __init__(self, max_idle=4, max_total=32, max_age=600, max_uses=500):
+        self.max_idle = max_idle
+        self.max_total = max_total
+        self.max_age = max_age
+        self.max_uses = max_uses
+
+        # profile -> [(ydl, created, uses)], least recently used profile first
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+
+    def _profile(self, opts):
+        """Get the pool key for a set of options, None when they must not be pooled"""
+        if opts.get('cookiefile'):
+            return None
+        return _fingerprint({key: value for key, value in opts.items() if key not in CHECKOUT_OPTIONS})
+
+    @contextmanager
+    def acquire(self, opts):
+        """Check out a YoutubeDL configured with opts
+
+        The instance goes back to the pool when the block finishes and is
+        closed when it raises, since yt-dlp may have been left midway.
+        """
+        profile = self._profile(opts)
+        entry = self._take(profile) if profile is not None else None
+        if entry is None:
+            entry = (yt_dlp.YoutubeDL(dict(opts)), time.monotonic(), 0)
+            with self._lock:
+                self.created += 1
+        else:
+            self._configure(entry[0], opts)
+
+        ydl, created, uses = entry
+        try:
+            yield ydl
+        except BaseException:
+            self._close(ydl)
+            raise
+        if profile is None:
+            self._close(ydl)
+        else:
+            self._give_back(profile, (ydl, created, uses + 1))
+
+    def _take(self, profile):
+        """Get a fresh idle instance of a profile, closing expired ones"""
+        expired = []
+        entry = None
+        with self._lock:
+            entries = self._idle.get(profile)
+            while entries:
+                candidate = entries.pop()
+                self._idle_count -= 1
+                if time.monotonic() - candidate[1] < self.max_age:
+                    entry = candidate
+                    self.reused += 1
+                    break
+                expired.append(candidate[0])
+            if entries is not None and not entries:
+                del self._idle[profile]
+        for ydl in expired:
+            self._close(ydl)
+        return entry
+
+    def _configure(self, ydl, opts):
+        """Apply the per-request options to a pooled instance, as YoutubeDL.__init__ would"""
+        params = ydl.params
+        for key in CHECKOUT_OPTIONS:
+            if key in opts:
+                params[key] = opts[key]
+            else:
+                params.pop(key, None)
+
+        params['http_headers'] = HTTPHeaderDict(std_headers, opts.get('http_headers'))
+        outtmpl = opts.get('outtmpl')
+        params['outtmpl'] = dict(outtmpl) if isinstance(outtmpl, dict) else outtmpl
+        ydl._parse_outtmpl()
+
+        format_spec = params.get('format')
+        ydl.format_selector = (
+            format_spec if format_spec in (None, '-') or callable(format_spec)
+            else ydl.build_format_selector(format_spec)
+        )
+
+        ydl._progress_hooks = []
+        for hook in opts.get('progress_hooks', []):
+            ydl.add_progress_hook(hook)
+
+    def _give_back(self, profile, entry):
+        """Return an instance to its profile, closing what no longer fits in the pool"""
+        ydl, created, uses = entry
+        # Hooks hold on to the finished request's state
+        ydl._progress_hooks = []
+        ydl.params.pop('progress_hooks', None)
+
+        closing = []
+        with self._lock:
+            if uses >= self.max_uses or time.monotonic() - created >= self.max_age:
+                closing.append(ydl)
+            else:
+                entries = self._idle.setdefault(profile, [])
+                self._idle.move_to_end(profile)
+                entries.append(entry)
+                self._idle_count += 1
+                if len(entries) > self.max_idle:
+                    closing.append(entries.pop(0)[0])
+                    self._idle_count -= 1
+                while self._idle_count > self.max_total:
+                    oldest, entries = next(iter(self._idle.items()))
+                    closing.append(entries.pop(0)[0])
+                    self._idle_count -= 1
+                    if not entries:
+                        del self._idle[oldest]
+        for ydl in closing:
+            self._close(ydl)
+
+    def _close(self, ydl):
+        """Close an instance and its connections"""
+        try:
+            ydl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL: {str(e)}")
+        with self._lock:
+            self.closed += 1
+
+    def get_stats(self):
+        """Get how many instances were created, reused and are idle"""
+        with self._lock:
+            return {
+                'profiles': len(self._idle),
+                'idle': self._idle_count,
+                'created': self.created,
+                'reused': self.reused,
+                'closed': self.closed
+            }
@@ -7,13 +7,40 @@ import time
 import shutil
 import subprocess
 import random
+import copy
+import threading
 import re
+import glob
+import signal
 import base64
 import requests
 from datetime import datetime
 from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash, Response, stream_with_context
-import yt_dlp
 import ffmpeg
+from download_engine import DownloadEngine, EngineSaturated, SingleFlight, Job
+from metadata_cache import MetadataCache, normalize_video_id
+from content_store import ContentStore, link_or_copy
+from history_store import HistoryStore
+from progress_stream import ProgressBroker, TERMINAL_STATUSES
+from download_state import DownloadState, DownloadInterrupted, format_size, format_eta
+from compression_planner import plan_compression, probe_source, source_from_formats
+from transcode_executor import TranscodeExecutor
+from compression_profiles import CompressionProfiles
+from job_journal import JobJournal
+from bandwidth import BandwidthShaper, parse_rate
+from ydl_pool import YoutubeDLPool
+from analysis_jobs import AnalysisJobs
+from download_strategy import DownloadStrategies, RangeDownloader, RangeNotSupported, SEGMENT_MIN_BYTES, MAX_CONNECTIONS
+
+# Format protocols ffmpeg can read directly when compressing while downloading
+STREAMABLE_PROTOCOLS = ('http', 'https', 'm3u8', 'm3u8_native')
+
+# Leftovers of an interrupted download: yt-dlp partial and fragment files,
+# split downloads and their saved ranges, unmerged formats, compression
+# output and two-pass stats
+PARTIAL_FILE_PATTERN = re.compile(
+    r'\.(part(-Frag\d+|-Ranges(\.json(\.tmp)?)?)?|ytdl|temp\.\w+|f\d+\.\w+)$|_compressed\.\w+$|\.passlog'
+)
 
 # Helper function to detect device type
 def is_mobile_device(user_agent):
@@ -66,6 +93,122 @@ class YouTubeDownloader:
         self.active_downloads = {}
         self.proxy_list = []
         self.load_proxies()
+        
+        # Download history, the old JSON file is imported on first start
+        history_file = app_config['DOWNLOAD_HISTORY_FILE']
+        self.history = HistoryStore(
+            app_config.get('DOWNLOAD_HISTORY_DB', os.path.splitext(history_file)[0] + '.db'),
+            legacy_json_path=history_file
+        )
+        
+        # Server-sent progress events, coalesced to one per interval
+        self.progress = ProgressBroker(min_interval=app_config.get('PROGRESS_STREAM_INTERVAL', 0.5))
+        self.progress_publish_interval = app_config.get('PROGRESS_PUBLISH_INTERVAL', 0.25)
+        
+        # Bounded worker pools shared by downloads, compression and batches
+        self.engine = DownloadEngine(app_config)
+        
+        # Extracted info cache shared by analyze and download, set
+        # METADATA_CACHE_FILE to None to keep it in memory only
+        self.metadata_cache = MetadataCache(
+            max_bytes=app_config.get('METADATA_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            default_ttl=app_config.get('METADATA_CACHE_TTL', 3600),
+            disk_path=app_config.get(
+                'METADATA_CACHE_FILE',
+                os.path.join(os.path.dirname(app_config['DOWNLOAD_HISTORY_FILE']), 'metadata_cache.db')
+            ),
+            disk_max_rows=app_config.get('METADATA_CACHE_MAX_ROWS', 10000)
+        )
+        
+        # Compress while downloading by letting ffmpeg read the media URLs
+        self.streaming_compression = app_config.get('STREAMING_COMPRESSION', True)
+        
+        # Download bandwidth shared by running downloads, with an optional
+        # cap per download and time-of-day limits
+        self.bandwidth = BandwidthShaper(
+            app_config.get('BANDWIDTH_LIMIT') or os.environ.get('BANDWIDTH_LIMIT'),
+            per_download_limit=app_config.get('DOWNLOAD_BANDWIDTH_LIMIT') or os.environ.get('DOWNLOAD_BANDWIDTH_LIMIT'),
+            profiles=app_config.get('BANDWIDTH_PROFILES')
+        )
+        
+        # YoutubeDL instances reused across requests with their extractors,
+        # keep-alive connections and session cookies
+        self.ydl_pool = YoutubeDLPool(
+            max_idle=app_config.get('YDL_POOL_SIZE', 4),
+            max_age=app_config.get('YDL_POOL_MAX_AGE', 600)
+        )
+        
+        # Analyses run in the background behind a job handle, so requests
+        # return at once and retries do not hold a request thread
+        self.analyses = AnalysisJobs(
+            self.engine,
+            self._analyze_attempt,
+            self._extraction_retry_delay,
+            result_ttl=app_config.get('ANALYSIS_RESULT_TTL', 300),
+            max_waiters=app_config.get('ANALYSIS_MAX_WAITERS', 16)
+        )
+        self.analysis_max_wait = app_config.get('ANALYSIS_MAX_WAIT', 25)
+        
+        # How each download is fetched, chosen from its protocol, size and
+        # the throughput past downloads reached from the same host
+        self.download_strategies = DownloadStrategies(
+            min_split_bytes=app_config.get('SPLIT_MIN_SIZE', SEGMENT_MIN_BYTES),
+            max_connections=app_config.get('SPLIT_MAX_CONNECTIONS', MAX_CONNECTIONS)
+        )
+        
+        # All ffmpeg work shares a limited number of encoder slots sized to the CPU
+        self.transcoder = TranscodeExecutor(
+            max_jobs=app_config.get('TRANSCODE_MAX_JOBS'),
+            threads_per_job=app_config.get('TRANSCODE_THREADS')
+        )
+        self.compression_profiles = CompressionProfiles(
+            profiles=app_config.get('COMPRESSION_PROFILES'),
+            benchmark_file=app_config.get(
+                'COMPRESSION_BENCHMARK_FILE',
+                os.path.join(os.path.dirname(app_config['DOWNLOAD_HISTORY_FILE']), 'compression_benchmark.json')
+            )
+        )
+        
+        # Concurrent extractions of the same video share one yt-dlp run, and
+        # identical downloads share one physical download
+        self._extract_flight = SingleFlight()
+        self._flight_lock = threading.Lock()
+        # Serializes cancel, pause and resume against workers settling
+        self._control_lock = threading.Lock()
+        # Notified whenever a download reaches a final status
+        self._finished_cond = threading.Condition()
+        self._download_flights = {}
+        self._flight_keys = {}
+        self._detached_downloads = set()
+        
+        # Finished outputs keyed by video, format and compression so repeat
+        # requests are served without downloading again
+        self.content_store = ContentStore(
+            app_config.get(
+                'CONTENT_STORE_DIR',
+                os.path.join(os.path.dirname(app_config['DOWNLOAD_HISTORY_FILE']), 'store')
+            ),
+            max_bytes=app_config.get('CONTENT_STORE_MAX_BYTES', 20 * 1024 * 1024 * 1024),
+            gc_interval=app_config.get('CONTENT_STORE_GC_INTERVAL', 60)
+        )
+        
+        # Unfinished downloads survive a restart or crash through the job
+        # journal and continue from their partial files, set JOB_JOURNAL_FILE
+        # to None to keep them in memory only
+        journal_file = app_config.get(
+            'JOB_JOURNAL_FILE',
+            os.path.join(os.path.dirname(app_config['DOWNLOAD_HISTORY_FILE']), 'job_journal.db')
+        )
+        self.journal = JobJournal(
+            journal_file,
+            heartbeat_interval=app_config.get('JOB_JOURNAL_HEARTBEAT', 10),
+            owner_timeout=app_config.get('JOB_JOURNAL_OWNER_TIMEOUT', 60)
+        ) if journal_file else None
+        self.orphan_min_age = app_config.get('ORPHAN_FILE_MIN_AGE', 600)
+        self._journaled = {}
+        if self.journal:
+            self.journal.register('download', self._restore_download)
+            self.resume_journaled_jobs()
     
     def load_proxies(self):
         """Load proxy list from file or initialize empty"""
@@ -126,12 +269,11 @@ class YouTubeDownloader:
             'allow_unplayable_formats': True,
             'youtube_include_dash_manifest': True,
             'youtube_include_hls_manifest': True,
-            
-            # Bypass throttling
-            'external_downloader': 'aria2c',
-            'external_downloader_args': ['--min-split-size=1M', '--max-connection-per-server=16', '--max-concurrent-downloads=16', '--split=16'],
         }
         
+        # Downloaders and connection counts are chosen per download once the
+        # formats are known, see DownloadStrategies
+        
         # Add proxy if available
         if proxy:
             ydl_opts['proxy'] = proxy
@@ -144,109 +286,174 @@ class YouTubeDownloader:
     
     def extract_video_info(self, url, cookies_file=None):
         """Extract video information with advanced error handling and retries"""
+        # Extractions made with a cookies file may contain private formats,
+        # so they are never cached or shared with other callers
+        if cookies_file:
+            info = self._extract_with_retries(url, cookies_file)
+        else:
+            # Repeat lookups are served from the cache, concurrent lookups
+            # of the same video wait for a single extraction
+            info = self.metadata_cache.get(url)
+            if not info:
+                info = self._extract_flight.do(
+                    normalize_video_id(url),
+                    self._extract_with_retries,
+                    url
+                )
+        
+        if not info:
+            return {
+                'success': False,
+                'message': 'Failed to extract video information after multiple attempts'
+            }
+        
+        return self._summarize_info(info)
+    
+    def _extract_with_retries(self, url, cookies_file=None):
+        """Run yt-dlp extraction with retries, returns a sanitized info dict or None"""
         max_retries = 3
-        retry_count = 0
         
-        while retry_count < max_retries:
+        for attempt in range(1, max_retries + 1):
+            error = None
             try:
-                ydl_opts = self._get_ydl_opts(cookies_file=cookies_file)
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    
-                    if not info:
-                        retry_count += 1
-                        time.sleep(2)  # Wait before retry
-                        continue
-                    
-                    # Process formats
-                    formats = []
-                    seen_resolutions = set()
-                    
-                    # Add audio-only option
-                    formats.append({
-                        'resolution': 'audio',
-                        'format': 'mp3',
-                        'format_id': 'bestaudio/best',
-                        'ext': 'mp3',
-                        'size': self._format_size(self._estimate_size(info, 'bestaudio/best'))
-                    })
-                    
-                    # Process video formats
-                    for f in info.get('formats', []):
-                        # Skip formats without video
-                        if f.get('vcodec') == 'none':
-                            continue
-                            
-                        # Get resolution
-                        height = f.get('height')
-                        if not height:
-                            continue
-                            
-                        # Normalize resolution
-                        if height >= 2160:
-                            resolution = '4K'
-                        elif height >= 1440:
-                            resolution = '1440p'
-                        elif height >= 1080:
-                            resolution = '1080p'
-                        elif height >= 720:
-                            resolution = '720p'
-                        elif height >= 480:
-                            resolution = '480p'
-                        elif height >= 360:
-                            resolution = '360p'
-                        elif height >= 240:
-                            resolution = '240p'
-                        else:
-                            resolution = '144p'
-                            
-                        # Skip duplicates
-                        if resolution in seen_resolutions:
-                            continue
-                            
-                        seen_resolutions.add(resolution)
-                        
-                        # Add format
-                        formats.append({
-                            'resolution': resolution,
-                            'format': 'mp4',
-                            'format_id': f.get('format_id'),
-                            'ext': 'mp4',
-                            'size': self._format_size(self._estimate_size(info, f.get('format_id')))
-                        })
-                    
-                    # Sort formats by resolution (highest first)
-                    formats.sort(key=lambda x: self._resolution_to_number(x['resolution']), reverse=True)
-                    
-                    return {
-                        'success': True,
-                        'video_info': {
-                            'title': info.get('title', 'Unknown Title'),
-                            'thumbnail': info.get('thumbnail', ''),
-                            'duration': self._format_duration(info.get('duration', 0)),
-                            'formats': formats
-                        }
-                    }
+                # Every attempt gets a different user agent and proxy
+                info = self._extract_once(url, self._get_ydl_opts(cookies_file=cookies_file))
+                if info:
+                    return info
             except Exception as e:
-                retry_count += 1
-                print(f"Error extracting video info (attempt {retry_count}): {str(e)}")
-                
-                # If we're getting rate limited or CAPTCHA, try a different approach
-                if "429" in str(e) or "CAPTCHA" in str(e):
-                    print("Rate limiting or CAPTCHA detected, trying alternative approach...")
-                    try:
-                        # Try with a different user agent and proxy
-                        ydl_opts = self._get_ydl_opts(cookies_file=cookies_file)
-                        # Add a delay to avoid triggering rate limits
-                        time.sleep(5)
-                    except:
-                        pass
-                
-                time.sleep(2)  # Wait before retry
+                error = str(e)
+                print(f"Error extracting video info (attempt {attempt}): {error}")
+            
+            if attempt < max_retries:
+                time.sleep(self._extraction_retry_delay(attempt, error))
+        
+        return None
+    
+    def _extraction_retry_delay(self, attempt, error=None):
+        """Seconds to wait before another extraction attempt, longer when rate limited"""
+        if error and ("429" in error or "CAPTCHA" in error):
+            return 7
+        return 2
+    
+    def analyze_video(self, url, cookies_file=None, owner=None):
+        """Start analysing a video in the background, returns an analysis_id to fetch the result with
+        
+        Cached videos complete at once. Attempts run on the engine's analyze
+        pool and are retried after a backoff without holding a thread.
+        """
+        if cookies_file:
+            analysis = self.analyses.submit(url, cookies_file=cookies_file, owner=owner)
+        else:
+            info = self.metadata_cache.get(url)
+            analysis = self.analyses.submit(
+                url,
+                key=normalize_video_id(url),
+                owner=owner,
+                result=self._summarize_info(info)['video_info'] if info else None
+            )
+        return self._analysis_response(analysis)
+    
+    def get_analysis(self, analysis_id, wait=0):
+        """Get an analysis started by analyze_video, waiting up to wait seconds for it to finish"""
+        analysis = self.analyses.get(analysis_id, wait=min(wait, self.analysis_max_wait))
+        if analysis is None:
+            return {
+                'success': False,
+                'message': 'Analysis not found'
+            }
+        return self._analysis_response(analysis)
+    
+    def _analysis_response(self, analysis):
+        """Build the API response for an analysis status dict"""
+        response = {
+            'success': analysis['status'] != 'error',
+            'analysis_id': analysis['analysis_id'],
+            'status': analysis['status'],
+            'attempts': analysis['attempts']
+        }
+        if analysis['status'] == 'completed':
+            response['video_info'] = analysis['result']
+        elif analysis['status'] == 'error':
+            response['message'] = analysis['error'] or 'Failed to extract video information after multiple attempts'
+        else:
+            response['retry_after'] = analysis['retry_after']
+        return response
+    
+    def _analyze_attempt(self, url, cookies_file=None):
+        """Make one extraction attempt for an analysis, returns the video info summary or None"""
+        info = self._extract_once(url, self._get_ydl_opts(cookies_file=cookies_file))
+        return self._summarize_info(info)['video_info'] if info else None
+    
+    def _summarize_info(self, info):
+        """Build the analyze response from an extracted info dict"""
+        # Process formats
+        formats = []
+        seen_resolutions = set()
+        
+        # Add audio-only option
+        formats.append({
+            'resolution': 'audio',
+            'format': 'mp3',
+            'format_id': 'bestaudio/best',
+            'ext': 'mp3',
+            'size': self._format_size(self._estimate_size(info, 'bestaudio/best'))
+        })
+        
+        # Process video formats
+        for f in info.get('formats', []):
+            # Skip formats without video
+            if f.get('vcodec') == 'none':
+                continue
+        
+            # Get resolution
+            height = f.get('height')
+            if not height:
+                continue
+        
+            # Normalize resolution
+            if height >= 2160:
+                resolution = '4K'
+            elif height >= 1440:
+                resolution = '1440p'
+            elif height >= 1080:
+                resolution = '1080p'
+            elif height >= 720:
+                resolution = '720p'
+            elif height >= 480:
+                resolution = '480p'
+            elif height >= 360:
+                resolution = '360p'
+            elif height >= 240:
+                resolution = '240p'
+            else:
+                resolution = '144p'
+        
+            # Skip duplicates
+            if resolution in seen_resolutions:
+                continue
+        
+            seen_resolutions.add(resolution)
+        
+            # Add format
+            formats.append({
+                'resolution': resolution,
+                'format': 'mp4',
+                'format_id': f.get('format_id'),
+                'ext': 'mp4',
+                'size': self._format_size(self._estimate_size(info, f.get('format_id')))
+            })
+        
+        # Sort formats by resolution (highest first)
+        formats.sort(key=lambda x: self._resolution_to_number(x['resolution']), reverse=True)
         
         return {
-            'success': False,
-            'message': 'Failed to extract video information after multiple attempts'
+            'success': True,
+            'video_info': {
+                'title': info.get('title', 'Unknown Title'),
+                'thumbnail': info.get('thumbnail', ''),
+                'duration': self._format_duration(info.get('duration', 0)),
+                'formats': formats
+            }
         }
     
     def _resolution_to_number(self, resolution):
@@ -334,62 +541,78 @@ class YouTubeDownloader:
     
     def _format_size(self, size_bytes):
         """Format size in bytes to human-readable string"""
-        if not size_bytes:
-            return "Unknown"
-            
-        # Convert to MB for easier reading
-        size_mb = size_bytes / (1024 * 1024)
-        
-        if size_mb < 1:
-            return f"{size_bytes / 1024:.1f} KB"
-        elif size_mb < 1024:
-            return f"{size_mb:.1f} MB"
-        else:
-            return f"{size_mb / 1024:.2f} GB"
+        return format_size(size_bytes)
     
-    def download_video(self, url, format_id, resolution, compression, download_dir, cookies_file=None):
-        """Download video with progress tracking and advanced bypass mechanisms"""
-        download_id = str(uuid.uuid4())
+    def download_video(self, url, format_id, resolution, compression, download_dir, cookies_file=None,
+                       priority='interactive', owner=None, bandwidth_limit=None, download_id=None, filename=None,
+                       paused=False):
+        """Download video with progress tracking and advanced bypass mechanisms
+        
+        owner identifies the client for the engine's fair sharing and
+        bandwidth_limit (bytes per second or e.g. '2M') caps this download
+        below its share of the global bandwidth. download_id,
+        filename and paused restore a journaled download, which keeps its id
+        and continues its partial file.
+        """
+        download_id = download_id or str(uuid.uuid4())
         is_audio_only = resolution == 'audio'
         
+        try:
+            parse_rate(bandwidth_limit)
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+        
         # Set up download directories
         output_dir = download_dir['audio'] if is_audio_only else download_dir['videos']
         
-        # Generate safe filename
-        try:
-            # Try to extract video info to get title
-            ydl_opts = self._get_ydl_opts(cookies_file=cookies_file)
-            ydl_opts['skip_download'] = True
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', '')
-                if title:
-                    safe_title = ''.join(c if c.isalnum() or c in ' ._-' else '_' for c in title)
-                    if len(safe_title) > 50:
-                        safe_title = safe_title[:50]
-                else:
-                    safe_title = ''.join(c if c.isalnum() or c in ' ._-' else '_' for c in url.split('/')[-1])
-                    if len(safe_title) > 50:
-                        safe_title = safe_title[:50]
-        except:
-            # Fallback to URL-based filename
-            safe_title = ''.join(c if c.isalnum() or c in ' ._-' else '_' for c in url.split('/')[-1])
-            if len(safe_title) > 50:
-                safe_title = safe_title[:50]
+        flight_key = (
+            normalize_video_id(url),
+            'audio' if is_audio_only else format_id,
+            'none' if is_audio_only else compression,
+            cookies_file
+        )
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f"{safe_title}_{timestamp}"
+        # Serve a previously finished identical download straight from the store
+        if not cookies_file:
+            stored = self.content_store.lookup(flight_key[:3])
+            if stored:
+                return self._serve_stored_output(download_id, stored, output_dir, flight_key[0])
         
-        # Set up output template
-        output_template = os.path.join(output_dir, output_filename)
+        # Join an identical download that is already in flight instead of
+        # fetching and writing the same file again
+        with self._flight_lock:
+            flight = self._download_flights.get(flight_key)
+            if flight:
+                flight['subscribers'][download_id] = output_dir
+                self.active_downloads[download_id] = self.active_downloads[flight['leader']]
+                return {
+                    'success': True,
+                    'download_id': download_id,
+                    'message': 'Joined an identical download in progress'
+                }
+            
+            # The state exists before the flight does, so a caller joining
+            # right away always finds it
+            state = DownloadState()
+            if bandwidth_limit:
+                state['bandwidth_limit'] = bandwidth_limit
+            self.active_downloads[download_id] = state
+            self._download_flights[flight_key] = {
+                'leader': download_id,
+                'subscribers': {download_id: output_dir}
+            }
+            self._flight_keys[download_id] = flight_key
         
-        # Configure yt-dlp options
+        # Configure yt-dlp options, the output template is filled in once
+        # the worker has extracted the title
         ydl_opts = self._get_ydl_opts(format_id, is_audio_only, cookies_file)
         
         # Update options for actual download
         ydl_opts.update({
             'skip_download': False,
-            'outtmpl': output_template + '.%(ext)s',
             'progress_hooks': [lambda d: self._progress_hook(d, download_id)],
         })
         
@@ -404,41 +627,194 @@ class YouTubeDownloader:
                 }],
             })
         
-        # Initialize progress tracking
-        self.active_downloads[download_id] = {
-            'status': 'starting',
-            'progress': 0,
-            'filename': output_filename,
-            'speed': '0 KB/s',
-            'eta': 'Unknown',
-            'size': 'Calculating...',
-            'downloaded_bytes': 0,
-            'total_bytes': 0,
-            'start_time': time.time(),
-            'output_path': None
-        }
+        args = (download_id, url, ydl_opts, output_dir, compression, is_audio_only, priority)
+        if filename:
+            state.filename = filename
+            state.output_template = os.path.join(output_dir, filename)
         
-        # Start download in a separate thread
-        import threading
-        thread = threading.Thread(
-            target=self._download_thread,
-            args=(download_id, url, ydl_opts, output_template, compression, is_audio_only)
-        )
-        thread.daemon = True
-        thread.start()
+        self._journal_download(download_id, spec={
+            'url': url,
+            'format_id': format_id,
+            'resolution': resolution,
+            'compression': compression,
+            'download_dir': download_dir,
+            'cookies_file': cookies_file,
+            'priority': priority,
+            'owner': owner,
+            'bandwidth_limit': bandwidth_limit,
+            'output_dir': output_dir
+        })
+        
+        if paused:
+            # Restored as paused, the job is only queued on resume
+            state.status = 'paused'
+            state.interrupt = 'paused'
+            state.job = Job('download', self._download_thread, args, {'resumed': bool(filename)},
+                            priority=priority, job_id=download_id, owner=owner)
+            self._journal_download(download_id)
+            return {
+                'success': True,
+                'download_id': download_id,
+                'message': 'Download paused'
+            }
+        
+        # Queue the download on the engine's download pool, the job is kept
+        # so a paused download can be queued again
+        try:
+            state.job = self.engine.submit(
+                'download',
+                self._download_thread,
+                *args,
+                priority=priority,
+                job_id=download_id,
+                owner=owner,
+                resumed=bool(filename)
+            )
+        except EngineSaturated as e:
+            message = f'Server is busy, please try again shortly ({str(e)})'
+            # Callers that joined meanwhile share this state and see the failure
+            subscribers = self._close_flight(download_id)
+            state['status'] = 'error'
+            state['error'] = message
+            self._publish(download_id, finished=True)
+            if len(subscribers) <= 1:
+                del self.active_downloads[download_id]
+            return {
+                'success': False,
+                'message': message
+            }
         
         return {
             'success': True,
             'download_id': download_id,
-            'message': 'Download started'
+            'message': 'Download queued'
+        }
+    
+    def get_cache_stats(self):
+        """Get hit/miss counters of the metadata cache"""
+        return {
+            'success': True,
+            'cache': self.metadata_cache.get_stats()
+        }
+    
+    def get_engine_stats(self):
+        """Get queue depth and worker utilisation of the download engine"""
+        return {
+            'success': True,
+            'engine': self.engine.get_stats(),
+            'transcode': self.transcoder.get_stats(),
+            'bandwidth': self.bandwidth.get_stats(),
+            'strategies': self.download_strategies.get_stats(),
+            'ydl_pool': self.ydl_pool.get_stats(),
+            'analyses': self.analyses.get_stats(),
+            'journal': self.journal.get_stats() if self.journal else None
         }
     
-    def _download_thread(self, download_id, url, ydl_opts, output_template, compression, is_audio_only):
-        """Thread function to handle download and post-processing"""
+    def _extract_once(self, url, ydl_opts):
+        """Extract info with the download options, returns a sanitized info dict or None"""
+        with self.ydl_pool.acquire(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if not info:
+                return None
+            
+            info = ydl.sanitize_info(info)
+            if not ydl_opts.get('cookiefile'):
+                self.metadata_cache.put(url, info)
+            return info
+    
+    def _build_output_filename(self, info, url):
+        """Build a safe, timestamped output filename from extracted video info"""
+        title = info.get('title', '') if info else ''
+        if not title:
+            # Fallback to URL-based filename
+            title = url.split('/')[-1]
+        
+        safe_title = ''.join(c if c.isalnum() or c in ' ._-' else '_' for c in title)
+        if len(safe_title) > 50:
+            safe_title = safe_title[:50]
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f"{safe_title}_{timestamp}"
+    
+    def _download_thread(self, download_id, url, ydl_opts, output_dir, compression, is_audio_only,
+                         priority='interactive', retried=False, resumed=False):
+        """Worker function to handle the download, post-processing runs on its own pool
+        
+        resumed is True when the download continues a partial file of an
+        earlier run, its throughput then says nothing about the strategy.
+        """
+        state = self.active_downloads[download_id]
         try:
-            # Download the video
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+            # Cancelled or paused while still waiting in the queue
+            if state.interrupt:
+                raise DownloadInterrupted(state.interrupt)
+            
+            self.active_downloads[download_id]['status'] = 'starting'
+            self._publish(download_id)
+            
+            # Extract metadata once, the same info dict feeds the download below.
+            # A recent /analyze of the same video usually leaves it in the cache
+            if ydl_opts.get('cookiefile'):
+                info = self._extract_once(url, ydl_opts)
+            else:
+                info = self.metadata_cache.get(url)
+                if not info:
+                    info = self._extract_flight.do(normalize_video_id(url), self._extract_once, url, ydl_opts)
+                    # The shared result is mutated by the download below
+                    info = copy.deepcopy(info)
+            
+            if not info:
+                self.active_downloads[download_id]['status'] = 'error'
+                self.active_downloads[download_id]['error'] = 'Failed to extract video information'
+                return
+            
+            # Derive the filename from the extracted info, a resumed or
+            # retried download keeps its name so yt-dlp continues the
+            # existing .part file
+            output_filename = state.filename or self._build_output_filename(info, url)
+            output_template = os.path.join(output_dir, output_filename)
+            self.active_downloads[download_id]['filename'] = output_filename
+            state.output_template = output_template
+            self._journal_download(download_id)
+            
+            download_opts = dict(ydl_opts)
+            download_opts['outtmpl'] = output_template + '.%(ext)s'
+            
+            # Fragments in parallel, one file split over several connections,
+            # or a single connection
+            strategy = self.download_strategies.choose(
+                info, download_opts.get('format'), output_template,
+                shaped=self.bandwidth.enabled, cookies=bool(download_opts.get('cookiefile'))
+            )
+            download_opts.update(strategy['opts'])
+            state['download_strategy'] = {key: strategy[key] for key in ('name', 'connections', 'reason')}
+            
+            # Download the video from the already extracted info without
+            # fetching and parsing the page a second time
+            with self.ydl_pool.acquire(download_opts) as ydl:
+                # ffmpeg reading the media URLs would bypass the bandwidth limits
+                if (not is_audio_only and compression != 'none' and self.streaming_compression
+                        and not self.bandwidth.enabled):
+                    streamed = self._stream_transcode(download_id, ydl, info, output_template, compression, priority)
+                    if streamed:
+                        self._finish_download(download_id, streamed[0], streamed[1], False)
+                        return
+                
+                # A split download leaves the finished file where yt-dlp
+                # expects it, yt-dlp then only post-processes it
+                started = time.monotonic()
+                if strategy['name'] == 'ranges':
+                    self._download_ranges(download_id, strategy, download_opts.get('proxy'))
+                
+                self.bandwidth.acquire(download_id, ydl.params, state.get('bandwidth_limit'))
+                try:
+                    info = ydl.process_ie_result(info, download=True)
+                finally:
+                    self.bandwidth.release(download_id)
+                
+                # A killed external downloader only surfaces as a failed download
+                if state.interrupt:
+                    raise DownloadInterrupted(state.interrupt)
                 
                 if not info:
                     self.active_downloads[download_id]['status'] = 'error'
@@ -454,101 +830,64 @@ class YouTubeDownloader:
                     downloaded_file = f"{output_template}.{ext}"
                 
                 self.active_downloads[download_id]['output_path'] = downloaded_file
+                if not resumed and os.path.exists(downloaded_file):
+                    self.download_strategies.record(
+                        strategy, os.path.getsize(downloaded_file), time.monotonic() - started
+                    )
                 
-                # Apply compression if needed and not audio
+                # Hand compression over to the post-processing pool so this
+                # download worker is free for the next job
                 if not is_audio_only and compression != 'none':
                     self.active_downloads[download_id]['status'] = 'compressing'
-                    
-                    # Apply compression using ffmpeg
-                    compressed_file = f"{output_template}_compressed.mp4"
-                    
-                    # Determine CRF value
-                    crf_value = 23  # Default balanced value
-                    if compression == 'auto':
-                        crf_value = 23
-                    elif compression == 'high':
-                        crf_value = 18
-                    elif compression == 'medium':
-                        crf_value = 23
-                    elif compression == 'low':
-                        crf_value = 28
-                    else:
-                        try:
-                            crf_value = int(compression)
-                            if crf_value < 0:
-                                crf_value = 0
-                            elif crf_value > 51:
-                                crf_value = 51
-                        except:
-                            crf_value = 23
-                    
-                    # Run ffmpeg compression
+                    self._publish(download_id)
                     try:
-                        (
-                            ffmpeg
-                            .input(downloaded_file)
-                            .output(compressed_file, vcodec='libx264', crf=crf_value, preset='medium')
-                            .run(quiet=True, overwrite_output=True)
+                        self.engine.submit(
+                            'postprocess',
+                            self._postprocess_thread,
+                            download_id, info, downloaded_file, output_template, compression, priority,
+                            priority=priority,
+                            owner=state.job.owner if state.job else None
                         )
-                        
-                        # Replace original with compressed version
-                        if os.path.exists(compressed_file):
-                            os.remove(downloaded_file)
-                            os.rename(compressed_file, downloaded_file)
-                    except Exception as e:
-                        print(f"Compression error: {str(e)}")
-                        # Continue with original file if compression fails
-                
-                # Update download status
-                self.active_downloads[download_id]['status'] = 'completed'
-                
-                # Add to download history
-                file_info = {
-                    'id': download_id,
-                    'title': info.get('title', 'Unknown Title'),
-                    'format': 'mp3' if is_audio_only else 'mp4',
-                    'resolution': 'audio' if is_audio_only else self._get_resolution_from_info(info),
-                    'size': self._get_file_size(downloaded_file),
-                    'path': downloaded_file,
-                    'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
+                    except EngineSaturated:
+                        # Post-processing queue is full, compress on this worker instead
+                        self._postprocess_thread(download_id, info, downloaded_file, output_template, compression,
+                                                 priority)
+                    return
                 
-                # Add to history file
-                self._add_to_history(file_info)
+                self._finish_download(download_id, info, downloaded_file, is_audio_only)
                 
+        except DownloadInterrupted:
+            self._settle_interrupt(download_id)
+        
         except Exception as e:
             print(f"Download error: {str(e)}")
             
             # Handle specific errors
             error_message = str(e).lower()
             
-            if "429" in error_message or "too many requests" in error_message:
+            if ("429" in error_message or "too many requests" in error_message) and not retried:
                 # Rate limiting - try with a different proxy/user agent
                 print("Rate limiting detected, retrying with different proxy...")
-                try:
-                    # Create new options with different proxy/user agent
-                    new_opts = self._get_ydl_opts(
-                        format_id=ydl_opts.get('format', 'best'),
-                        audio_only=is_audio_only,
-                        cookies_file=ydl_opts.get('cookiefile')
-                    )
-                    new_opts.update({
-                        'skip_download': False,
-                        'outtmpl': output_template + '.%(ext)s',
-                        'progress_hooks': [lambda d: self._progress_hook(d, download_id)],
-                    })
-                    
-                    # Wait before retry
-                    time.sleep(10)
-                    
-                    # Retry download
-                    with yt_dlp.YoutubeDL(new_opts) as ydl:
-                        info = ydl.extract_info(url, download=True)
-                        # Continue with normal processing if successful
-                        # (This is simplified - in a real implementation, we would avoid code duplication)
-                        return
-                except Exception as retry_error:
-                    print(f"Retry failed: {str(retry_error)}")
+                
+                # Create new options with different proxy/user agent
+                new_opts = self._get_ydl_opts(
+                    format_id=ydl_opts.get('format', 'best'),
+                    audio_only=is_audio_only,
+                    cookies_file=ydl_opts.get('cookiefile')
+                )
+                new_opts.update({
+                    'skip_download': False,
+                    'progress_hooks': ydl_opts['progress_hooks'],
+                })
+                if 'postprocessors' in ydl_opts:
+                    new_opts['postprocessors'] = ydl_opts['postprocessors']
+                
+                # Wait before retry
+                time.sleep(10)
+                
+                # Retry the whole pipeline once
+                return self._download_thread(download_id, url, new_opts, output_dir, compression,
+                                             is_audio_only, priority, retried=True, resumed=resumed)
             
             elif "captcha" in error_message:
                 # CAPTCHA challenge - this is harder to bypass automatically
@@ -565,58 +904,620 @@ class YouTubeDownloader:
             # Generic error handling
             self.active_downloads[download_id]['status'] = 'error'
             self.active_downloads[download_id]['error'] = str(e)
+        
+        finally:
+            # Failed downloads release their subscribers, completed ones are
+            # released once post-processing has delivered the file
+            if self.active_downloads[download_id]['status'] in ('error', 'cancelled'):
+                self._close_flight(download_id)
+                self._publish(download_id, finished=True)
+    
+    def _download_ranges(self, download_id, strategy, proxy=None):
+        """Download a progressive format over several range requests, falling back
+        to yt-dlp's own downloader when the server does not serve ranges"""
+        state = self.active_downloads[download_id]
+        strategies = self.download_strategies
+        downloader = RangeDownloader(
+            strategy['url'], strategy['path'], strategy['connections'], min_bytes=strategies.min_split_bytes,
+            max_connections=strategies.max_connections, headers=strategy['headers'], proxy=proxy
+        )
+        
+        def progress(downloaded, total, speed):
+            strategy['connections'] = state['download_strategy']['connections'] = len(downloader.ranges)
+            self._progress_hook({
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': total,
+                'speed': speed,
+                'eta': (total - downloaded) / speed if speed else None,
+                '_filename': strategy['path']
+            }, download_id)
+        
+        try:
+            downloader.download(progress)
+        except RangeNotSupported as e:
+            print(f"Split download not possible, using a single connection: {str(e)}")
+            for path in (downloader.part_path, downloader.state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            strategy['name'] = 'native'
+            state['download_strategy'] = {'name': 'native', 'connections': 1, 'reason': str(e)}
+    
+    def _postprocess_thread(self, download_id, info, downloaded_file, output_template, compression,
+                            priority='interactive'):
+        """Worker function to compress a finished download"""
+        try:
+            self._postprocess(download_id, info, downloaded_file, output_template, compression, priority)
+        except Exception as e:
+            print(f"Post-processing error: {str(e)}")
+            # A download that was already delivered stays completed
+            state = self.active_downloads[download_id]
+            if state['status'] != 'completed':
+                state['status'] = 'error'
+                state['error'] = str(e)
+            self._close_flight(download_id)
+            self._publish(download_id, finished=True)
+    
+    def _postprocess(self, download_id, info, downloaded_file, output_template, compression, priority):
+        """Compress a finished download and deliver it"""
+        state = self.active_downloads[download_id]
+        if state.interrupt == 'cancelled':
+            self._settle_interrupt(download_id)
+            return
+        
+        # Apply compression using ffmpeg
+        compressed_file = f"{output_template}_compressed.mp4"
+        
+        profile = self._resolve_compression(compression)
+        duration = info.get('duration')
+        
+        # Look at what was actually delivered before spending CPU on it
+        try:
+            source = probe_source(downloaded_file)
+            plan = self._plan_compression(profile, source, duration or source.get('duration'))
+        except Exception as e:
+            plan = self._plan_compression(profile, {'video': True}, duration)
+            plan['reason'] = f'probe failed: {str(e)}'
+        state['compression_plan'] = plan
+        self._publish(download_id)
+        
+        if plan['action'] == 'skip':
+            self._finish_download(download_id, info, downloaded_file, False)
+            return
+        
+        if plan['action'] == 'remux':
+            streams = [ffmpeg.input(downloaded_file).output(compressed_file, c='copy', format='mp4')]
+        else:
+            # Two-pass profiles first write a stats file and no output
+            passlog = f"{output_template}.passlog"
+            streams = []
+            for args in self.compression_profiles.output_args(
+                    profile, self.transcoder.threads_per_job, plan.get('encode_bitrate')):
+                if 'pass' in args:
+                    args['passlogfile'] = passlog
+                target = os.devnull if args.get('f') == 'null' else compressed_file
+                streams.append(ffmpeg.input(downloaded_file).output(target, **args))
+        
+        # Run ffmpeg compression, the process is kept so a cancel can kill it
+        try:
+            cpu_seconds = 0.0
+            for number, stream in enumerate(streams, 1):
+                job = self.transcoder.run(
+                    stream.overwrite_output(),
+                    name=f"{plan['action']} {os.path.basename(downloaded_file)}"
+                         + (f' (pass {number})' if len(streams) > 1 else ''),
+                    priority=priority,
+                    on_start=lambda process: setattr(state, 'process', process),
+                    cancelled=lambda: state.interrupt == 'cancelled'
+                )
+                state.process = None
+                cpu_seconds += job.cpu_seconds
+                if job.returncode:
+                    break
+            state['transcode_cpu_seconds'] = round(cpu_seconds, 2)
+            
+            if state.interrupt == 'cancelled':
+                self._settle_interrupt(download_id)
+                return
+            if job.returncode:
+                raise ffmpeg.Error('ffmpeg', b'', job.stderr)
+            
+            # Replace original with compressed version, which is always mp4
+            if os.path.exists(compressed_file):
+                os.remove(downloaded_file)
+                downloaded_file = f"{output_template}.mp4"
+                os.rename(compressed_file, downloaded_file)
+                state.output_path = downloaded_file
+        except Exception as e:
+            print(f"Compression error: {str(e)}")
+            # Continue with original file if compression fails
+        finally:
+            for path in glob.glob(glob.escape(output_template) + '.passlog*'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        
+        self._finish_download(download_id, info, downloaded_file, False)
+    
+    def _resolve_compression(self, compression):
+        """Get the compression profile for a request, 'auto' follows the transcode load"""
+        return self.compression_profiles.resolve(compression, load=self.transcoder.load())
+    
+    def _plan_compression(self, profile, source, duration):
+        """Plan a compression with a profile and note the profile in the plan"""
+        profiles = self.compression_profiles
+        target_kbps = profiles.target_bitrate(profile, duration)
+        plan = plan_compression(source, profiles.x264_crf(profile), profiles.efficiency(profile), target_kbps)
+        
+        # Two-pass encodes aim at the bitrate the CRF estimate gave
+        if profile['mode'] == 'two_pass':
+            plan['encode_bitrate'] = plan['target_bitrate']
+        elif profile['mode'] == 'target_size':
+            plan['encode_bitrate'] = target_kbps
+        
+        plan['profile'] = {
+            key: profile[key] for key in ('name', 'encoder', 'preset', 'crf', 'mode', 'tune', 'fallback_from')
+            if profile.get(key) is not None
+        }
+        return plan
+    
+    def _stream_transcode(self, download_id, ydl, info, output_template, compression, priority='interactive'):
+        """Download and compress in a single ffmpeg pass reading the media URLs
+        
+        Encoding overlaps with the transfer and only the compressed file is
+        ever written. Returns (info, output file), or None when the selected
+        formats cannot be read by ffmpeg and the regular download should run.
+        """
+        if ydl.params.get('cookiefile'):
+            return None
+        proxy = ydl.params.get('proxy')
+        if proxy and not proxy.startswith('http'):
+            return None
+        
+        # Select formats with the download options without downloading
+        selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        if not selected:
+            return None
+        formats = selected.get('requested_formats') or [selected]
+        if any(f.get('protocol') not in STREAMABLE_PROTOCOLS or not f.get('url') for f in formats):
+            return None
+        
+        # Multi-pass profiles need the whole file first
+        profile = self._resolve_compression(compression)
+        if profile['mode'] != 'crf':
+            return None
+        
+        # Sources that are not worth re-encoding are downloaded as they are,
+        # the post-processing step then skips or remuxes them
+        plan = self._plan_compression(profile, source_from_formats(formats), selected.get('duration'))
+        if plan['action'] != 'encode':
+            return None
+        
+        inputs = []
+        for f in formats:
+            input_args = {}
+            headers = f.get('http_headers') or {}
+            if headers:
+                input_args['headers'] = ''.join(f'{key}: {value}\r\n' for key, value in headers.items())
+            if proxy:
+                input_args['http_proxy'] = proxy
+            inputs.append(ffmpeg.input(f['url'], **input_args))
+        
+        # Written as .part and renamed once complete, like yt-dlp does
+        output_file = output_template + '.mp4'
+        partial_file = output_file + '.part'
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        stream = (
+            ffmpeg
+            .output(*inputs, partial_file, format='mp4', acodec='aac',
+                    **self.compression_profiles.output_args(profile, self.transcoder.threads_per_job)[0])
+            .global_args('-progress', 'pipe:1', '-nostats', '-loglevel', 'error')
+            .overwrite_output()
+        )
+        
+        state = self.active_downloads[download_id]
+        state['compression_plan'] = plan
+        state.status = 'transcoding'
+        state.output_path = partial_file
+        self._publish(download_id)
+        
+        try:
+            job = self.transcoder.run(
+                stream,
+                name=f'stream {os.path.basename(output_file)}',
+                priority=priority,
+                on_start=lambda process: setattr(state, 'process', process),
+                on_output=self._transcode_progress_handler(download_id, selected.get('duration')),
+                cancelled=lambda: bool(state.interrupt)
+            )
+        finally:
+            state.process = None
+        state['transcode_cpu_seconds'] = round(job.cpu_seconds, 2)
+        
+        if state.interrupt:
+            raise DownloadInterrupted(state.interrupt)
+        
+        if job.returncode or not os.path.exists(partial_file):
+            print(f"Streaming compression failed, downloading first: {job.stderr.decode(errors='replace').strip()}")
+            try:
+                os.remove(partial_file)
+            except OSError:
+                pass
+            state.progress_override = None
+            return None
+        
+        os.replace(partial_file, output_file)
+        state.output_path = output_file
+        state.downloaded_bytes = state.total_bytes = os.path.getsize(output_file)
+        state.progress_override = 100
+        return selected, output_file
+    
+    def _transcode_progress_handler(self, download_id, duration):
+        """Get a handler turning ffmpeg -progress lines into download progress"""
+        state = self.active_downloads[download_id]
+        # Timing starts with the first line, not while waiting for a slot
+        started = []
+        
+        def handle(line):
+            if not started:
+                started.append(time.monotonic())
+            elapsed = time.monotonic() - started[0]
+            
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if key == 'total_size' and value.isdigit():
+                state.downloaded_bytes = int(value)
+                if elapsed > 0:
+                    state.speed = state.downloaded_bytes / elapsed
+            elif key == 'out_time_us' and value.isdigit() and duration:
+                done = int(value) / 1000000
+                state.progress_override = min(done / duration * 100, 99.9)
+                if done > 0:
+                    state.eta = max((duration - done) * elapsed / done, 0)
+            elif key == 'progress':
+                # One block of key=value lines ends with progress=continue|end
+                self._publish(download_id)
+        
+        return handle
+    
+    def _finish_download(self, download_id, info, downloaded_file, is_audio_only):
+        """Mark a download as completed and record it in history"""
+        state = self.active_downloads[download_id]
+        flight_key = self._flight_keys.get(download_id)
+        subscribers = self._close_flight(download_id)
+        
+        title = info.get('title', 'Unknown Title')
+        file_format = 'mp3' if is_audio_only else 'mp4'
+        resolution = 'audio' if is_audio_only else self._get_resolution_from_info(info)
+        
+        # Keep anonymous downloads in the content store for later requests
+        object_hash = None
+        if flight_key and not flight_key[3]:
+            try:
+                object_hash = self.content_store.put(flight_key[:3], downloaded_file, metadata={
+                    'filename': os.path.basename(downloaded_file),
+                    'title': title,
+                    'format': file_format,
+                    'resolution': resolution
+                })
+            except Exception as e:
+                print(f"Error adding download to content store: {str(e)}")
+        
+        # Deliver the shared file to callers that joined this download
+        shared_outputs = {}
+        for subscriber_id, output_dir in subscribers.items():
+            if subscriber_id != download_id:
+                shared_outputs[subscriber_id] = self._deliver_shared_output(downloaded_file, output_dir, object_hash)
+        if shared_outputs:
+            state['shared_outputs'] = shared_outputs
+        
+        # Update download status
+        state['status'] = 'completed'
+        self._publish(download_id, finished=True)
+        
+        # Add to download history, once per caller
+        outputs = {}
+        if download_id not in self._detached_downloads:
+            outputs[download_id] = downloaded_file
+        outputs.update(shared_outputs)
+        for output_id, output_path in outputs.items():
+            self._record_history(output_id, title, file_format, resolution, output_path,
+                                 flight_key[0] if flight_key else None)
+    
+    def _record_history(self, download_id, title, file_format, resolution, output_path, video_id=None):
+        """Add a finished download to history"""
+        file_info = {
+            'id': download_id,
+            'title': title,
+            'format': file_format,
+            'resolution': resolution,
+            'size': self._get_file_size(output_path),
+            'path': output_path,
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        # Lets playlist downloads skip videos that were downloaded before
+        if video_id:
+            file_info['video_id'] = video_id
+        
+        # Add to history file
+        self._add_to_history(file_info)
+    
+    def _serve_stored_output(self, download_id, stored, output_dir, video_id=None):
+        """Complete a download instantly from a content store object"""
+        metadata = stored['metadata']
+        filename = metadata.get('filename') or os.path.basename(stored['path'])
+        output_path = self.content_store.deliver(stored['hash'], os.path.join(output_dir, filename))
+        if not output_path:
+            return {
+                'success': False,
+                'message': 'Stored download is no longer available'
+            }
+        
+        state = DownloadState(
+            status='completed',
+            filename=os.path.splitext(filename)[0],
+            output_path=output_path,
+            served_from_store=True
+        )
+        state.downloaded_bytes = stored['size']
+        state.total_bytes = stored['size']
+        state.progress_override = 100
+        self.active_downloads[download_id] = state
+        
+        self._record_history(
+            download_id,
+            metadata.get('title', 'Unknown Title'),
+            metadata.get('format', 'mp4'),
+            metadata.get('resolution', 'Unknown'),
+            output_path,
+            video_id
+        )
+        
+        return {
+            'success': True,
+            'download_id': download_id,
+            'message': 'Served from a previous identical download'
+        }
+    
+    def get_compression_profiles(self):
+        """Get the compression profiles with their measured speed and size"""
+        return {
+            'success': True,
+            'profiles': self.compression_profiles.describe(),
+            'auto_preset': self._resolve_compression('auto')['preset']
+        }
+    
+    def get_store_stats(self):
+        """Get size and hit/miss counters of the content store"""
+        return {
+            'success': True,
+            'store': self.content_store.get_stats()
+        }
+    
+    def _close_flight(self, download_id):
+        """Stop accepting new subscribers for a download, returns its subscribers"""
+        with self._flight_lock:
+            flight_key = self._flight_keys.pop(download_id, None)
+            flight = self._download_flights.pop(flight_key, None) if flight_key else None
+            return flight['subscribers'] if flight else {}
+    
+    def _deliver_shared_output(self, downloaded_file, output_dir, object_hash=None):
+        """Make a shared download available in another caller's directory"""
+        if os.path.dirname(downloaded_file) == output_dir:
+            return downloaded_file
+        
+        target = os.path.join(output_dir, os.path.basename(downloaded_file))
+        if object_hash:
+            delivered = self.content_store.deliver(object_hash, target)
+            if delivered:
+                return delivered
+        
+        if not os.path.exists(target):
+            link_or_copy(downloaded_file, target)
+        return target
     
     def _progress_hook(self, d, download_id):
-        """Progress hook for yt-dlp"""
-        if d['status'] == 'downloading':
+        """Progress hook for yt-dlp, stores raw numbers only"""
+        state = self.active_downloads[download_id]
+        if state.interrupt:
+            # Unwinds yt-dlp out of the download, the .part file is left as is
+            raise DownloadInterrupted(state.interrupt)
+        
+        status = d['status']
+        
+        if status == 'downloading':
             # Update progress information
-            self.active_downloads[download_id]['status'] = 'downloading'
-            
-            if 'total_bytes' in d:
-                total_bytes = d['total_bytes']
-                self.active_downloads[download_id]['total_bytes'] = total_bytes
-                self.active_downloads[download_id]['size'] = self._format_size(total_bytes)
-            elif 'total_bytes_estimate' in d:
-                total_bytes = d['total_bytes_estimate']
-                self.active_downloads[download_id]['total_bytes'] = total_bytes
-                self.active_downloads[download_id]['size'] = self._format_size(total_bytes) + ' (est.)'
-            
-            if 'downloaded_bytes' in d:
-                downloaded_bytes = d['downloaded_bytes']
-                self.active_downloads[download_id]['downloaded_bytes'] = downloaded_bytes
-                
-                # Calculate progress percentage
-                total = self.active_downloads[download_id]['total_bytes']
-                if total > 0:
-                    progress = (downloaded_bytes / total) * 100
-                    self.active_downloads[download_id]['progress'] = progress
+            state.status = 'downloading'
             
-            if 'speed' in d and d['speed']:
-                speed = self._format_size(d['speed']) + '/s'
-                self.active_downloads[download_id]['speed'] = speed
+            total_bytes = d.get('total_bytes')
+            if total_bytes:
+                state.total_bytes = total_bytes
+                state.total_is_estimate = False
+            else:
+                total_bytes = d.get('total_bytes_estimate')
+                if total_bytes:
+                    state.total_bytes = total_bytes
+                    state.total_is_estimate = True
+            
+            downloaded_bytes = d.get('downloaded_bytes')
+            if downloaded_bytes is not None:
+                state.downloaded_bytes = downloaded_bytes
+            
+            speed = d.get('speed')
+            if speed:
+                state.speed = speed
             
-            if 'eta' in d and d['eta']:
-                eta = self._format_eta(d['eta'])
-                self.active_downloads[download_id]['eta'] = eta
+            eta = d.get('eta')
+            if eta:
+                state.eta = eta
             
-            if '_filename' in d:
-                self.active_downloads[download_id]['output_path'] = d['_filename']
+            filename = d.get('_filename')
+            if filename:
+                state.output_path = filename
+            
+            # Only wake stream subscribers a few times per second
+            now = time.monotonic()
+            if now - state.last_publish < self.progress_publish_interval:
+                return
+            state.last_publish = now
+        
+        elif status == 'finished':
+            state.status = 'processing'
+            state.progress_override = 100
+        
+        self.progress.publish(id(state))
+    
+    def _publish(self, download_id, finished=False):
+        """Notify progress stream subscribers that a download changed"""
+        state = self.active_downloads.get(download_id)
+        if state is None:
+            return
+        
+        if finished:
+            # Wakes subscribers one last time and drops the channel
+            self.progress.forget(id(state))
+            self._journal_finish(download_id)
+            with self._finished_cond:
+                self._finished_cond.notify_all()
+        else:
+            self.progress.publish(id(state))
+            self._journal_download(download_id)
+    
+    def _journal_download(self, download_id, spec=None):
+        """Journal a download when its status or filename changed since the last write"""
+        if not self.journal:
+            return
+        state = self.active_downloads[download_id]
+        if spec is None and download_id not in self._journaled:
+            # Callers joined to another download are not journaled themselves
+            return
+        
+        current = (state.status, state.filename)
+        if spec is None and self._journaled.get(download_id) == current:
+            return
+        self._journaled[download_id] = current
+        try:
+            self.journal.record(download_id, 'download', state.status, spec=spec,
+                                state={'filename': state.filename},
+                                directory=spec['output_dir'] if spec else None)
+        except Exception as e:
+            print(f"Error writing job journal: {str(e)}")
+    
+    def _journal_finish(self, download_id):
+        """Remove a download that reached a final status from the journal"""
+        if self.journal and self._journaled.pop(download_id, None) is not None:
+            try:
+                self.journal.finish(download_id)
+            except Exception as e:
+                print(f"Error writing job journal: {str(e)}")
+    
+    def resume_journaled_jobs(self):
+        """Replay jobs left behind by processes that stopped, then remove orphaned partial files"""
+        if not self.journal:
+            return 0
+        try:
+            count = self.journal.adopt()
+            self.collect_orphans()
+        except Exception as e:
+            print(f"Error resuming journaled jobs: {str(e)}")
+            return 0
+        return count
+    
+    def _restore_download(self, job):
+        """Restart a journaled download under its old id, continuing its partial file"""
+        spec = job['spec']
+        cookies_file = spec.get('cookies_file')
+        if cookies_file and not os.path.exists(cookies_file):
+            # The uploaded cookies were temporary, the download cannot run again
+            self.journal.finish(job['id'])
+            return
+        
+        self.download_video(
+            spec['url'], spec['format_id'], spec['resolution'], spec['compression'], spec['download_dir'],
+            cookies_file,
+            priority=spec.get('priority', 'interactive'),
+            owner=spec.get('owner'),
+            bandwidth_limit=spec.get('bandwidth_limit'),
+            download_id=job['id'],
+            filename=job['state'].get('filename'),
+            paused=job['status'] == 'paused'
+        )
+        # Served from the store or joined to another download
+        if job['id'] not in self._journaled:
+            self.journal.finish(job['id'])
+    
+    def collect_orphans(self):
+        """Delete partial files no journaled download will continue, returns the number removed
+        
+        Only directories downloads were journaled in are searched, and files
+        changed within ORPHAN_FILE_MIN_AGE seconds are left alone.
+        """
+        if not self.journal:
+            return 0
+        
+        keep = {}
+        for job in self.journal.jobs():
+            filename = job['state'].get('filename')
+            output_dir = job['spec'].get('output_dir')
+            if filename and output_dir:
+                keep.setdefault(os.path.abspath(output_dir), []).append(filename)
+        
+        removed = 0
+        cutoff = time.time() - self.orphan_min_age
+        for directory in self.journal.directories():
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            prefixes = tuple(keep.get(os.path.abspath(directory), ()))
+            for name in names:
+                if not PARTIAL_FILE_PATTERN.search(name) or (prefixes and name.startswith(prefixes)):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError as e:
+                    print(f"Error removing orphaned file {path}: {str(e)}")
+        return removed
+    
+    def wait_for_download(self, download_id, timeout=None):
+        """Block until a download reaches a final status
+        
+        Returns the final status, or None on timeout or for an unknown
+        download. A paused download is not final.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._finished_cond:
+            while True:
+                state = self.active_downloads.get(download_id)
+                if state is None:
+                    return None
+                if download_id in self._detached_downloads:
+                    return 'cancelled'
+                if state.status in TERMINAL_STATUSES:
+                    return state.status
+                
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._finished_cond.wait(remaining)
+    
+    def stream_download_progress(self, download_id):
+        """Get a server-sent event generator for a download, or None if unknown"""
+        if download_id not in self.active_downloads:
+            return None
+        
+        def get_state():
+            status = self.get_download_status(download_id)
+            return status['download_info'] if status['success'] else None
         
-        elif d['status'] == 'finished':
-            self.active_downloads[download_id]['status'] = 'processing'
-            self.active_downloads[download_id]['progress'] = 100
+        return self.progress.stream(id(self.active_downloads[download_id]), get_state)
     
     def _format_eta(self, seconds):
         """Format ETA in seconds to human-readable string"""
-        if seconds < 60:
-            return f"{seconds} seconds"
-        elif seconds < 3600:
-            minutes = seconds // 60
-            return f"{minutes} minute{'s' if minutes != 1 else ''}"
-        else:
-            hours = seconds // 3600
-            minutes = (seconds % 3600) // 60
-            return f"{hours}h {minutes}m"
+        return format_eta(seconds)
     
     def _get_file_size(self, file_path):
         """Get file size in human-readable format"""
@@ -651,31 +1552,28 @@ class YouTubeDownloader:
             return 'Unknown'
     
     def _add_to_history(self, file_info):
-        """Add download to history file"""
-        history_file = self.app_config['DOWNLOAD_HISTORY_FILE']
-        
-        # Load existing history
-        history = []
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, 'r') as f:
-                    history = json.load(f)
-            except:
-                history = []
-        
-        # Add new entry
-        history.append(file_info)
-        
-        # Save updated history
-        with open(history_file, 'w') as f:
-            json.dump(history, f)
+        """Add download to history"""
+        self.history.add(file_info)
     
     def get_download_status(self, download_id):
         """Get current status of a download"""
         if download_id in self.active_downloads:
+            # Human-readable fields are only formatted here, on read
+            download_info = self.active_downloads[download_id].to_dict()
+            if download_id in self._detached_downloads:
+                download_info.update(status='cancelled', output_path=None)
+            
+            # Callers that joined a shared download see their own copy of the file
+            shared_outputs = download_info.pop('shared_outputs', None)
+            if shared_outputs and download_id in shared_outputs:
+                download_info['output_path'] = shared_outputs[download_id]
+            
+            # Bytes per second this download is given right now, None when unlimited
+            download_info['bandwidth_allocated'] = self.bandwidth.allocation(self._flight_leader(download_id))
+            
             return {
                 'success': True,
-                'download_info': self.active_downloads[download_id]
+                'download_info': download_info
             }
         else:
             return {
@@ -684,14 +1582,52 @@ class YouTubeDownloader:
             }
     
     def cancel_download(self, download_id):
-        """Cancel an active download"""
+        """Cancel an active download, stopping its worker and removing partial files"""
         if download_id in self.active_downloads:
-            # Mark as cancelled
-            self.active_downloads[download_id]['status'] = 'cancelled'
+            # Other callers still want a shared download, so only detach this one
+            with self._flight_lock:
+                for flight in self._download_flights.values():
+                    subscribers = flight['subscribers']
+                    if download_id in subscribers and len(subscribers) > 1:
+                        del subscribers[download_id]
+                        if flight['leader'] == download_id:
+                            # The worker keeps writing to the leader's entry,
+                            # so it is only reported as cancelled
+                            self._detached_downloads.add(download_id)
+                        else:
+                            detached = self.active_downloads[download_id].copy()
+                            detached.status = 'cancelled'
+                            self.active_downloads[download_id] = detached
+                        with self._finished_cond:
+                            self._finished_cond.notify_all()
+                        return {
+                            'success': True,
+                            'message': 'Download cancelled'
+                        }
             
-            # TODO: Implement actual process termination
-            # This is complex as yt-dlp doesn't provide a direct way to cancel downloads
-            # For now, we just mark it as cancelled and let the thread finish
+            state = self.active_downloads[download_id]
+            with self._control_lock:
+                if state.status in ('completed', 'error', 'cancelled'):
+                    return {
+                        'success': False,
+                        'message': 'Download already finished'
+                    }
+                
+                state.interrupt = 'cancelled'
+                
+                # Nothing is running for a paused or still queued download
+                idle = state.status in ('paused', 'queued')
+                if idle:
+                    state.status = 'cancelled'
+            
+            if idle:
+                self._remove_partial_files(state)
+                self._close_flight(download_id)
+                self._publish(download_id, finished=True)
+            else:
+                # The progress hook raises on its next call, external
+                # downloaders and ffmpeg do not call it so they are killed
+                self._terminate_processes(state)
             
             return {
                 'success': True,
@@ -703,6 +1639,199 @@ class YouTubeDownloader:
                 'message': 'Download not found'
             }
     
+    def pause_download(self, download_id):
+        """Pause a download, keeping its partial file so it can be resumed"""
+        state = self.active_downloads.get(download_id)
+        if state is None:
+            return {
+                'success': False,
+                'message': 'Download not found'
+            }
+        
+        with self._flight_lock:
+            flight_key = self._flight_keys.get(self._flight_leader(download_id))
+            flight = self._download_flights.get(flight_key) if flight_key else None
+            if flight and len(flight['subscribers']) > 1:
+                return {
+                    'success': False,
+                    'message': 'Download is shared with other requests and cannot be paused'
+                }
+        
+        with self._control_lock:
+            if state.status not in ('queued', 'starting', 'downloading') or state.interrupt:
+                return {
+                    'success': False,
+                    'message': f'Download cannot be paused while {state.status}'
+                }
+            state.interrupt = 'paused'
+        
+        # External downloaders do not call the progress hook, their .part
+        # file survives the kill and is continued on resume
+        self._terminate_processes(state)
+        
+        return {
+            'success': True,
+            'message': 'Download paused'
+        }
+    
+    def resume_download(self, download_id):
+        """Resume a paused download from the end of its partial file"""
+        state = self.active_downloads.get(download_id)
+        if state is None:
+            return {
+                'success': False,
+                'message': 'Download not found'
+            }
+        
+        with self._control_lock:
+            if state.interrupt != 'paused':
+                return {
+                    'success': False,
+                    'message': 'Download is not paused'
+                }
+            state.interrupt = None
+            
+            # Still running or queued, the worker simply carries on
+            if state.status != 'paused':
+                return {
+                    'success': True,
+                    'message': 'Download resumed'
+                }
+            state.status = 'queued'
+        
+        return self._requeue(download_id)
+    
+    def _requeue(self, download_id):
+        """Queue a paused download's job again"""
+        state = self.active_downloads[download_id]
+        job = state.job
+        # A download paused after it was named continues its partial file
+        kwargs = dict(job.kwargs, resumed=job.kwargs.get('resumed') or bool(state.filename))
+        try:
+            state.job = self.engine.submit(
+                'download', job.fn, *job.args,
+                priority=job.priority,
+                job_id=download_id,
+                owner=job.owner,
+                **kwargs
+            )
+        except EngineSaturated as e:
+            state.status = 'paused'
+            state.interrupt = 'paused'
+            self._publish(download_id)
+            return {
+                'success': False,
+                'message': f'Server is busy, please try again shortly ({str(e)})'
+            }
+        
+        self._publish(download_id)
+        return {
+            'success': True,
+            'message': 'Download resumed'
+        }
+    
+    def _settle_interrupt(self, download_id):
+        """Record the outcome of a worker that stopped on a cancel or pause request"""
+        state = self.active_downloads[download_id]
+        state.speed = None
+        state.eta = None
+        
+        with self._control_lock:
+            reason = state.interrupt
+            if reason == 'paused':
+                state.status = 'paused'
+            elif reason == 'cancelled':
+                state.status = 'cancelled'
+            else:
+                # Resumed before the worker got here
+                state.status = 'queued'
+        
+        if reason == 'paused':
+            self._publish(download_id)
+        elif reason == 'cancelled':
+            self._remove_partial_files(state)
+            self._close_flight(download_id)
+            self._publish(download_id, finished=True)
+        else:
+            self._requeue(download_id)
+    
+    def _flight_leader(self, download_id):
+        """Get the id whose worker runs a download, which differs for joined callers"""
+        for flight in self._download_flights.values():
+            if download_id in flight['subscribers']:
+                return flight['leader']
+        return download_id
+    
+    def _remove_partial_files(self, state):
+        """Delete the partial, fragment and intermediate files of a download"""
+        if not state.output_template:
+            return
+        
+        prefix = glob.escape(state.output_template)
+        for path in glob.glob(prefix + '.*') + glob.glob(prefix + '_compressed.*'):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error removing partial file {path}: {str(e)}")
+        state.output_path = None
+    
+    def _terminate_processes(self, state):
+        """Kill the ffmpeg and external downloader processes of a download"""
+        # Signalled by pid, polling the Popen object would race the
+        # transcoder's wait4 for the exit status
+        process = state.process
+        if process and process.returncode is None:
+            try:
+                os.kill(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        
+        # aria2c and the ffmpeg post-processors of yt-dlp are started by the
+        # worker thread, find them among our direct children by the files
+        # they write, which all start with this download's output template
+        if not state.output_template or not os.path.isdir('/proc'):
+            return
+        
+        parent = str(os.getpid())
+        prefixes = tuple(os.path.abspath(state.output_template) + suffix for suffix in ('.', '_compressed.'))
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f'/proc/{pid}/stat', 'rb') as f:
+                    # The parent pid follows the parenthesised command name
+                    ppid = f.read().rsplit(b')', 1)[1].split()[1].decode()
+                if ppid != parent:
+                    continue
+                with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                    args = os.fsdecode(f.read()).split('\0')
+                if any(path.startswith(prefixes) for path in self._command_paths(args)):
+                    os.kill(int(pid), signal.SIGTERM)
+            except (OSError, IndexError):
+                continue
+    
+    def _command_paths(self, args):
+        """Get the absolute paths of the files named in a command line
+        
+        ffmpeg arguments may carry a 'file:' prefix, aria2c is given the
+        directory and the file name separately.
+        """
+        paths = []
+        options = {}
+        for index, arg in enumerate(args):
+            if arg.startswith('file:'):
+                arg = arg[len('file:'):]
+            if os.path.isabs(arg):
+                paths.append(arg)
+            for option in ('--dir', '--out'):
+                if arg == option and index + 1 < len(args):
+                    options[option] = args[index + 1]
+                elif arg.startswith(option + '='):
+                    options[option] = arg[len(option) + 1:]
+        if '--out' in options:
+            paths.append(os.path.join(options.get('--dir', ''), options['--out']))
+        return [os.path.abspath(path) for path in paths]
+    
     # Advanced bypass methods
     
     def extract_js_player(self, html_content):
@@ -736,7 +1865,7 @@ class YouTubeDownloader:
         try:
             # Simplified approach: just ensure we're using the latest URL
             ydl_opts = self._get_ydl_opts()
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.ydl_pool.acquire(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 if info and 'url' in info:
                     return info['url']  # Return the fresh URL with valid tokens
@@ -752,7 +1881,7 @@ class YouTubeDownloader:
         # For now, we'll just check if the video is private/login-required
         try:
             ydl_opts = self._get_ydl_opts()
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.ydl_pool.acquire(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 if not info:
                     return {'success': False, 'message': 'Video requires login or is private'}